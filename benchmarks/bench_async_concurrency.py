@@ -0,0 +1,121 @@
+"""Compare how /process throughput scales on the sync (gunicorn) and async (ASGI) apps.
+
+Both apps are driven in-process against a fake provider that sleeps for a fixed
+latency instead of calling a real LLM, so the numbers only reflect how many
+provider calls one process can keep in flight.
+
+    python -m benchmarks.bench_async_concurrency --latency 0.5 --sync-workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src import asgi, main  # noqa: E402
+from src.llm_interface import AsyncBaseAIProvider, BaseAIProvider  # noqa: E402
+
+FAKE_REPORT = (
+    "<!DOCTYPE html><html><head><title>Report</title></head>"
+    "<body><main><section><h2>Summary</h2><p>Benchmark report.</p></section>"
+    "</main></body></html>"
+)
+
+
+class FakeProvider(BaseAIProvider):
+    latency = 0.5
+
+    def _create_client(self):
+        return None
+
+    def _send_request(self, messages):
+        time.sleep(self.latency)
+        return FAKE_REPORT
+
+    def _stream_request(self, messages):
+        time.sleep(self.latency)
+        yield FAKE_REPORT
+
+
+class FakeAsyncProvider(AsyncBaseAIProvider):
+    latency = 0.5
+
+    def _create_client(self):
+        return None
+
+    async def _send_request(self, messages):
+        await asyncio.sleep(self.latency)
+        return FAKE_REPORT
+
+    async def _stream_request(self, messages):
+        await asyncio.sleep(self.latency)
+        yield FAKE_REPORT
+
+
+def run_sync(payload, requests, workers):
+    client = main.app.test_client()
+
+    def call(_):
+        return client.post("/process", json=payload).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(call, range(requests)))
+    return time.perf_counter() - start, statuses
+
+
+async def run_async(payload, requests):
+    client = asgi.app.test_client()
+
+    async def call():
+        response = await client.post("/process", json=payload)
+        return response.status_code
+
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(call() for _ in range(requests)))
+    return time.perf_counter() - start, statuses
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="src/client-exports/hall_munster.json")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64, 256, 512]
+    )
+    args = parser.parse_args()
+
+    with open(args.input, "r") as f:
+        payload = json.load(f)
+
+    FakeProvider.latency = args.latency
+    FakeAsyncProvider.latency = args.latency
+    main.llm = FakeProvider(main.config_manager)
+    asgi.llm = FakeAsyncProvider(asgi.config_manager)
+    # every request posts the same export, so with the cache on all but the first
+    # would be served without a provider call
+    main.report_cache = None
+    asgi.report_cache = None
+
+    print(f"fake provider latency: {args.latency:.3f}s")
+    print(f"{'in-flight':>9} {'mode':>16} {'wall s':>8} {'req/s':>8} {'ok':>5}")
+    for concurrency in args.concurrency:
+        elapsed, statuses = run_sync(payload, concurrency, args.sync_workers)
+        print(
+            f"{concurrency:>9} {f'sync x{args.sync_workers}':>16} {elapsed:>8.2f} "
+            f"{concurrency / elapsed:>8.1f} {statuses.count(200):>5}"
+        )
+        elapsed, statuses = asyncio.run(run_async(payload, concurrency))
+        print(
+            f"{concurrency:>9} {'async x1':>16} {elapsed:>8.2f} "
+            f"{concurrency / elapsed:>8.1f} {statuses.count(200):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
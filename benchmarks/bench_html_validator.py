@@ -0,0 +1,107 @@
+"""Compare the html5lib and single-pass HTML validators on generated 20-100 KB reports.
+
+python -m benchmarks.bench_html_validator --sizes 20 50 100 --repeat 20
+"""
+
+import argparse
+import timeit
+
+from src.html_cleaner import strip_newlines_from_html
+from src.valid_html import NotValidHTMLException, get_validator
+
+SECTION = """
+        <section>
+            <h2>{index}. Estimated Social Security Benefits Analysis</h2>
+            <p>At their full retirement age (FRA) of 67, the estimated monthly benefit is
+            $390.60, based on the <a href="https://www.ssa.gov/oact/cola/piaformula.html">PIA
+            formula</a> applied to their average indexed monthly earnings.</p>
+            <table>
+                <thead>
+                    <tr><th>Claim age</th><th>Monthly benefit</th><th>Lifetime total</th></tr>
+                </thead>
+                <tbody>
+{rows}
+                </tbody>
+            </table>
+            <ul>
+                <li><strong>Delay claiming:</strong> each year past FRA adds delayed retirement credits.</li>
+                <li><strong>Spousal benefits:</strong> up to half of the worker's PIA at FRA.</li>
+            </ul>
+            <img src="chart-{index}.png" alt="Benefit by claim age">
+        </section>
+"""
+ROW = (
+    "                    "
+    "<tr><td>{age}</td><td>${benefit:,.2f}</td><td>${total:,.2f}</td></tr>"
+)
+
+
+def generate_raw_report(target_kb: int) -> str:
+    """An LLM-style report, newlines and indentation included, of ~target_kb cleaned."""
+    head = (
+        "<!DOCTYPE html>\n<html>\n<head>\n    <title>Social Security Analysis</title>\n"
+        "</head>\n<body>\n"
+        "    <header><h1>Social Security Analysis</h1></header>\n    <main>"
+    )
+    tail = "    </main>\n</body>\n</html>"
+    rows = "\n".join(
+        ROW.format(age=age, benefit=1800 * (1 + (age - 62) * 0.07), total=age * 21600)
+        for age in range(62, 71)
+    )
+    section_kb = (
+        len(strip_newlines_from_html(SECTION.format(index=1, rows=rows))) / 1024
+    )
+    sections = [
+        SECTION.format(index=index + 1, rows=rows)
+        for index in range(max(1, round(target_kb / section_kb)))
+    ]
+    # sized by the cleaned output, which is what the validator sees
+    return head + "".join(sections) + tail
+
+
+def generate_report(target_kb: int) -> str:
+    return strip_newlines_from_html(generate_raw_report(target_kb))
+
+
+def run_validator(validate, html):
+    try:
+        return validate(html)
+    except NotValidHTMLException as e:
+        return False, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    html5lib_validator = get_validator("html5lib")
+    fast_validator = get_validator("fast")
+    print(
+        f"{'size KB':>8} {'html5lib ms':>12} {'fast ms':>9} {'speedup':>8} "
+        f"{'same result':>12}"
+    )
+    for size in args.sizes:
+        html = generate_report(size)
+        timings = {}
+        for name, validate in (
+            ("html5lib", html5lib_validator),
+            ("fast", fast_validator),
+        ):
+            runs = timeit.repeat(
+                lambda: run_validator(validate, html), number=args.repeat, repeat=3
+            )
+            timings[name] = min(runs) / args.repeat * 1000
+        same = run_validator(html5lib_validator, html) == run_validator(
+            fast_validator, html
+        )
+        print(
+            f"{len(html) / 1024:>8.0f} {timings['html5lib']:>12.2f} "
+            f"{timings['fast']:>9.2f} "
+            f"{timings['html5lib'] / timings['fast']:>7.1f}x {str(same):>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Micro-benchmark the roadmap ingestor and benefit engine over the bundled client exports.
+
+python -m benchmarks.bench_ingestor --repeat 2000
+"""
+
+import argparse
+import glob
+import json
+import os
+import timeit
+
+from src.benefit_engine import compute_benefit_figures
+from src.context_encoding import estimate_tokens
+from src.roadmap_output_ingestor import parse_roadmap_output, preprocess_roadmap_output
+
+
+def time_per_call(func, arg, repeat):
+    # best of 5 runs keeps noise from other processes out of the number
+    runs = timeit.repeat(lambda: func(arg), number=repeat, repeat=5)
+    return min(runs) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exports", default="src/client-exports/*.json")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'export':<24} {'earnings':>8} {'parse us':>9} {'preprocess us':>14} "
+        f"{'figures us':>10} {'verbose tok':>11} {'compact tok':>11}"
+    )
+    for path in sorted(glob.glob(args.exports)):
+        with open(path, "r") as f:
+            raw_data = json.load(f)
+        earnings = len(raw_data["data"]["SSCalData"]["SSCalEarnings"])
+        parse_us = time_per_call(parse_roadmap_output, raw_data, args.repeat)
+        preprocess_us = time_per_call(preprocess_roadmap_output, raw_data, args.repeat)
+        figures_us = time_per_call(
+            compute_benefit_figures, parse_roadmap_output(raw_data), args.repeat
+        )
+        verbose_tokens = estimate_tokens(preprocess_roadmap_output(raw_data))
+        compact_tokens = estimate_tokens(
+            preprocess_roadmap_output(raw_data, encoding="compact")
+        )
+        print(
+            f"{os.path.basename(path):<24} {earnings:>8} {parse_us:>9.1f} {preprocess_us:>14.1f} "
+            f"{figures_us:>10.1f} {verbose_tokens:>11} {compact_tokens:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
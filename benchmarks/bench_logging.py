@@ -0,0 +1,112 @@
+"""Measure the logging cost a /process request pays on its own thread, per logging mode.
+
+Replays the records one request logs (the raw export, the prompt and the response
+at DEBUG, plus the INFO progress lines) against the real handlers, writing to a
+temporary directory with the console sent to /dev/null. "before" logs the
+payloads whole on the synchronous handlers, the way every request did before the
+queue mode and truncate_payload.
+
+    python -m benchmarks.bench_logging --requests 2000
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from src import logging_config
+from src.config_manager import ConfigManager
+from src.logging_config import get_logger, setup_logging, truncate_payload
+from src.report_pipeline import build_report_context
+
+MODES = {
+    "before": ({"mode": "sync"}, False),
+    "sync + truncation": ({"mode": "sync", "max_message_chars": 4000}, True),
+    "queue + truncation": ({"mode": "queue", "max_message_chars": 4000}, True),
+    "queue + sampling 0.1": (
+        {"mode": "queue", "max_message_chars": 4000, "sampling": {"src": 0.1}},
+        True,
+    ),
+}
+
+
+def log_request(logger, raw_export, prompt, response, truncate):
+    payload = truncate_payload if truncate else str
+    logger.debug(f":Received request data: {payload(raw_export)}")
+    logger.info("Performing LLM analysis now...")
+    logger.debug(f"User messages: {payload(prompt)}")
+    logger.debug(f"Received response from Anthropic API: {payload(response)}")
+    logger.info("Performing HTML validation now...")
+    logger.info("HTML was validated!")
+
+
+def run_mode(name, config, truncate, requests, raw_export, prompt, response, log_dir):
+    setup_logging(os.path.join(log_dir, f"{name.split()[0]}.log"), config)
+    logger = get_logger("src.main")
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        log_request(logger, raw_export, prompt, response, truncate)
+        timings.append(time.perf_counter() - started)
+    stats = logging_config.logging_stats()
+    started = time.perf_counter()
+    # the writer drains the queue before it stops
+    logging_config._stop_listener()
+    drain = time.perf_counter() - started
+    timings.sort()
+    return (
+        statistics.median(timings) * 1e6,
+        timings[int(len(timings) * 0.99) - 1] * 1e6,
+        drain,
+        stats.get("dropped", 0),
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="src/client-exports/hall_munster.json")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--response-kb", type=int, default=30)
+    args = parser.parse_args()
+
+    with open(args.input, "rb") as f:
+        raw_export = f.read()
+    context, _ = build_report_context(
+        json.loads(raw_export), ConfigManager().context_config
+    )
+    prompt = [{"role": "user", "content": context}]
+    response = "<p>" + "x" * (args.response_kb * 1024) + "</p>"
+
+    print(
+        f"export {len(raw_export)} bytes, prompt {len(str(prompt))} chars, "
+        f"response {len(response)} chars, {args.requests} requests"
+    )
+    print(f"{'mode':<22} {'p50 us':>9} {'p99 us':>9} {'drain s':>8} {'dropped':>8}")
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        for name, (config, truncate) in MODES.items():
+            sys.stdout = devnull
+            try:
+                p50, p99, drain, dropped = run_mode(
+                    name,
+                    config,
+                    truncate,
+                    args.requests,
+                    raw_export,
+                    prompt,
+                    response,
+                    log_dir,
+                )
+            finally:
+                sys.stdout = stdout
+            print(f"{name:<22} {p50:>9.1f} {p99:>9.1f} {drain:>8.3f} {dropped:>8}")
+        for handler in logging.getLogger().handlers:
+            handler.close()
+
+
+if __name__ == "__main__":
+    main_cli()
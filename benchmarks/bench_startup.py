@@ -0,0 +1,120 @@
+"""Measure cold start: SDK and app import time, worker boot, and preforked worker start.
+
+Every measurement runs in a fresh interpreter so nothing is imported already.
+"boot" is what each gunicorn worker pays without --preload (import the app, then
+start_worker); "forked worker" is what it pays when forked from a preloaded master.
+Warm-up requests are off unless --warm-up is given, since they need the network.
+
+    python -m benchmarks.bench_startup --runs 5 --workers 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SDKS = ("openai", "anthropic", "cohere")
+
+IMPORT_SDK = """
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - started}}))
+"""
+
+BOOT = """
+import json, sys, time
+started = time.perf_counter()
+import src.llm_interface
+interface = time.perf_counter()
+from src import main
+imported = time.perf_counter()
+main.config_manager.startup_config["warm_up"] = {warm_up}
+main.start_worker()
+booted = time.perf_counter()
+print(json.dumps({{
+    "llm_interface import": interface - started,
+    "app import": imported - started,
+    "boot": booted - started,
+    "sdks": sorted(m for m in {sdks} if m in sys.modules),
+}}))
+"""
+
+PREFORK = """
+import json, os, time
+started = time.perf_counter()
+from src import main
+main.config_manager.startup_config["warm_up"] = {warm_up}
+master = time.perf_counter() - started
+providers = getattr(main.llm, "providers", {{"": main.llm}})
+ready = []
+for _ in range({workers}):
+    read_fd, write_fd = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        main.start_worker()
+        for provider in providers.values():
+            provider.client
+        os.write(write_fd, str(time.perf_counter() - forked).encode())
+        os._exit(0)
+    os.close(write_fd)
+    ready.append(float(os.read(read_fd, 64)))
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+print(json.dumps({{"preloaded master": master, "forked worker": max(ready)}}))
+"""
+
+
+def run(code: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    # keeps the import from starting the worker, so start_worker can be timed apart
+    env["PRELOAD_APP"] = "1"
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def median_of(runs: list, key: str) -> float:
+    return statistics.median(result[key] for result in runs)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--warm-up", action="store_true")
+    args = parser.parse_args()
+
+    print(f"median of {args.runs} fresh interpreters")
+    print(f"{'stage':<28} {'seconds':>8}")
+    for module in SDKS:
+        runs = [run(IMPORT_SDK.format(module=module)) for _ in range(args.runs)]
+        print(f"{f'import {module}':<28} {median_of(runs, 'seconds'):>8.3f}")
+
+    boot = BOOT.format(warm_up=args.warm_up, sdks=SDKS)
+    runs = [run(boot) for _ in range(args.runs)]
+    for key in ("llm_interface import", "app import", "boot"):
+        print(f"{key:<28} {median_of(runs, key):>8.3f}")
+    sdks = runs[0]["sdks"]
+
+    prefork = PREFORK.format(warm_up=args.warm_up, workers=args.workers)
+    runs = [run(prefork) for _ in range(args.runs)]
+    print(f"{'preloaded master':<28} {median_of(runs, 'preloaded master'):>8.3f}")
+    print(
+        f"{f'forked worker (max of {args.workers})':<28} "
+        f"{median_of(runs, 'forked worker'):>8.3f}"
+    )
+    print(f"SDKs imported by a booted worker: {', '.join(sdks) or 'none'}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,289 @@
+"""Offline benchmarks of export preprocessing and report cleaning and validation.
+
+Times preprocess_roadmap_output on every bundled client export and on synthetic
+exports scaled up from one of them (longer earnings histories, more children and
+pensions), and strip_newlines_from_html plus both HTML validators on generated
+reports of increasing size. No network or LLM is involved. Results are saved as
+JSON baselines.
+
+    python -m benchmarks.suite run --output benchmarks/baselines/baseline.json
+    python -m benchmarks.suite run --baseline benchmarks/baselines/baseline.json
+    python -m benchmarks.suite run --output current.json
+    python -m benchmarks.suite compare benchmarks/baselines/baseline.json current.json
+
+compare (and run with --baseline) exits with status 1 when any case got slower than
+the baseline by more than --threshold (0.25 by default). Timings are only comparable
+on the same machine, so record a baseline wherever the comparison will run.
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from benchmarks.bench_html_validator import generate_raw_report
+from src.html_cleaner import strip_newlines_from_html
+from src.roadmap_output_ingestor import preprocess_roadmap_output
+from src.valid_html import (
+    NotValidHTMLException,
+    validate_llm_html,
+    validate_llm_html_fast,
+)
+
+# has a spouse, children and a pension, so every section of the export gets scaled
+SCALE_TEMPLATE = "src/client-exports/daniels_uphill.json"
+
+
+def scale_export(raw_data: dict, factor: int) -> dict:
+    """A copy of the export with factor times the earnings, children and pensions."""
+    raw_data = copy.deepcopy(raw_data)
+    ss_data = raw_data["data"]["SSCalData"]
+    last_year = max(entry["YearID"] for entry in ss_data["SSCalEarnings"])
+    template = ss_data["SSCalEarnings"][-1]
+    earnings = []
+    for is_primary in (True, False):
+        for offset in range(45 * factor):
+            earnings.append(
+                {
+                    **template,
+                    "YearID": last_year - offset,
+                    "IsPrimary": is_primary,
+                    "Earning": float(20000 + (offset * 1637) % 90000),
+                }
+            )
+    ss_data["SSCalEarnings"] = earnings
+    children = ss_data["SSCalChildren"]
+    ss_data["SSCalChildren"] = [
+        {**children[index % len(children)], "Name": f"Child {index + 1}"}
+        for index in range(2 * factor)
+    ]
+    pensions = ss_data["SSCalPensions"]
+    ss_data["SSCalPensions"] = [
+        {**pensions[index % len(pensions)], "Title": f"Pension {index + 1}"}
+        for index in range(factor)
+    ]
+    return raw_data
+
+
+def run_validator(validate, html):
+    try:
+        return validate(html)
+    except NotValidHTMLException as e:
+        return False, str(e)
+
+
+def build_cases(export_glob: str, scales: list, sizes: list) -> list:
+    """(name, function, input description) for every benchmark case."""
+    cases = []
+    for path in sorted(glob.glob(export_glob)):
+        with open(path, "r") as f:
+            raw_data = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        earnings = len(raw_data["data"]["SSCalData"]["SSCalEarnings"])
+        cases.append(
+            (
+                f"preprocess/{name}",
+                lambda raw_data=raw_data: preprocess_roadmap_output(raw_data),
+                f"{earnings} earnings rows",
+            )
+        )
+    with open(SCALE_TEMPLATE, "r") as f:
+        template = json.load(f)
+    for factor in scales:
+        raw_data = scale_export(template, factor)
+        ss_data = raw_data["data"]["SSCalData"]
+        cases.append(
+            (
+                f"preprocess/synthetic_x{factor}",
+                lambda raw_data=raw_data: preprocess_roadmap_output(raw_data),
+                f"{len(ss_data['SSCalEarnings'])} earnings rows, "
+                f"{len(ss_data['SSCalChildren'])} children, "
+                f"{len(ss_data['SSCalPensions'])} pensions",
+            )
+        )
+    for size in sizes:
+        raw_html = generate_raw_report(size)
+        html = strip_newlines_from_html(raw_html)
+        description = f"{len(raw_html) // 1024} KB raw, {len(html) // 1024} KB cleaned"
+        cases.append(
+            (
+                f"strip_newlines/{size}kb",
+                lambda raw_html=raw_html: strip_newlines_from_html(raw_html),
+                description,
+            )
+        )
+        cases.append(
+            (
+                f"validate_html5lib/{size}kb",
+                lambda html=html: run_validator(validate_llm_html, html),
+                description,
+            )
+        )
+        cases.append(
+            (
+                f"validate_fast/{size}kb",
+                lambda html=html: run_validator(validate_llm_html_fast, html),
+                description,
+            )
+        )
+    return cases
+
+
+def calls_per_round(timer, min_time: float) -> int:
+    # enough calls per round to run for min_time, so fast cases aren't all timer noise
+    number, elapsed = timer.autorange()
+    return max(1, round(number * min_time / max(elapsed, 1e-9)))
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args) -> dict:
+    cases = build_cases(args.exports, args.scales, args.sizes)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+    timers = {name: timeit.Timer(func) for name, func, _ in cases}
+    numbers = {
+        name: calls_per_round(timer, args.min_time) for name, timer in timers.items()
+    }
+    per_call = {name: [] for name in timers}
+    # round robin over the cases, so a slow stretch on the machine (another process,
+    # throttling) costs every case one round instead of costing one case all of them
+    for _ in range(args.rounds):
+        for name, timer in timers.items():
+            per_call[name].append(timer.timeit(numbers[name]) / numbers[name] * 1e6)
+
+    results = {}
+    print(f"{'case':<32} {'best us':>12} {'median us':>12}  input")
+    for name, _, description in cases:
+        results[name] = {
+            "best_us": round(min(per_call[name]), 2),
+            "median_us": round(statistics.median(per_call[name]), 2),
+            "calls_per_round": numbers[name],
+            "rounds": args.rounds,
+            "input": description,
+        }
+        print(
+            f"{name:<32} {results[name]['best_us']:>12.1f} "
+            f"{results[name]['median_us']:>12.1f}  {description}"
+        )
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": (
+                f"{platform.system()} {platform.machine()} {platform.processor()}"
+            ).strip(),
+            "metric": "best_us",
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Print each case's change against the baseline; return the ones that regressed."""
+    regressions = []
+    print(f"{'case':<32} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>12} {result['best_us']:>12.1f}      new")
+            continue
+        change = result["best_us"] / before["best_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<32} {before['best_us']:>12.1f} {result['best_us']:>12.1f} "
+            f"{change:>+7.0%}{flag}"
+        )
+    missing = baseline["results"].keys() - current["results"].keys()
+    if missing:
+        # expected after run --filter
+        print(f"{len(missing)} baseline case(s) not in the current run")
+    if regressions:
+        print(
+            f"{len(regressions)} case(s) slower than the baseline "
+            f"by over {threshold:.0%}"
+        )
+    else:
+        print(f"No case slower than the baseline by over {threshold:.0%}")
+    return regressions
+
+
+def _load(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run", help="time every case, optionally saving a baseline"
+    )
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+    run_parser.add_argument(
+        "--baseline", help="compare against this JSON file when done"
+    )
+    run_parser.add_argument("--threshold", type=float, default=0.25)
+    run_parser.add_argument("--exports", default="src/client-exports/*.json")
+    run_parser.add_argument("--scales", type=int, nargs="+", default=[2, 5, 10])
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100, 200])
+    run_parser.add_argument("--rounds", type=int, default=7)
+    run_parser.add_argument(
+        "--min-time", type=float, default=0.1, help="seconds per case per round"
+    )
+    run_parser.add_argument("--filter", help="only run cases whose name contains this")
+
+    compare_parser = commands.add_parser(
+        "compare", help="flag regressions between two runs"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fractional slowdown of a case's best time that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressions = compare(_load(args.baseline), _load(args.current), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    report = run_suite(args)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        print()
+        regressions = compare(_load(args.baseline), report, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import requests
 import json
 import argparse
+import time
 
 
 def get_sample_data(path_to_client_data: str):
@@ -20,6 +21,71 @@ def send_request(url, data):
         return None
 
 
+def send_stream_request(url, data):
+    """Send a POST request to a streaming endpoint and print events as they arrive."""
+    try:
+        with requests.post(url, json=data, stream=True) as response:
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: ") :]
+                elif line.startswith("data: "):
+                    payload = json.loads(line[len("data: ") :])
+                    if event == "delta":
+                        print(payload["text"], end="", flush=True)
+                    else:
+                        print()
+                        return payload
+    except requests.RequestException as e:
+        print(f"Error sending request: {e}")
+    return None
+
+
+def send_batch_request(url, exports):
+    """POST many exports to /process/batch and print each result as it completes."""
+    results = []
+    try:
+        with requests.post(url, json={"exports": exports}, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                result = json.loads(line)
+                if "summary" in result:
+                    print(f"Batch summary: {result['summary']}")
+                else:
+                    print(f"Export {result['id']} finished: {result['status']}")
+                results.append(result)
+    except requests.RequestException as e:
+        print(f"Error sending request: {e}")
+        return None
+    return results
+
+
+def submit_job(url, data, poll_interval=2.0):
+    """POST to /jobs, then poll the returned job until it finishes."""
+    try:
+        response = requests.post(url, json=data)
+        response.raise_for_status()
+        job = response.json()
+        print(f"Queued job {job['job_id']}")
+        status_url = url.rstrip("/") + "/" + job["job_id"]
+        while job["status"] in ("queued", "running"):
+            time.sleep(poll_interval)
+            response = requests.get(status_url)
+            response.raise_for_status()
+            job = response.json()
+            print(
+                f"Job {job['job_id']} is {job['status']} "
+                f"(waited {job['wait_seconds']}s, ran {job['run_seconds']}s)"
+            )
+        return job
+    except requests.RequestException as e:
+        print(f"Error sending request: {e}")
+        return None
+
+
 def check_health(url):
     """Send a GET request to the /healthz endpoint."""
     try:
@@ -71,12 +137,29 @@ def main():
     parser.add_argument(
         "--url", default="http://localhost:5050/process", help="URL of the API endpoint"
     )
-    parser.add_argument("--input", help="RSSA Roadmap json data")
+    parser.add_argument(
+        "--input", nargs="+", help="RSSA Roadmap json data (several files with --batch)"
+    )
     parser.add_argument("--output", help="File to save the response")
     parser.add_argument("--healthz", action="store_true", help="Perform a health check")
     parser.add_argument(
         "--ready", action="store_true", help="Perform a readiness check"
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Send every --input file in one request (use with the /process/batch url)",
+    )
+    parser.add_argument(
+        "--job",
+        action="store_true",
+        help="Submit as a background job and poll for the result (use with the /jobs url)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the report as it is generated (use with the /process/stream url)",
+    )
     args = parser.parse_args()
 
     if args.healthz:
@@ -88,9 +171,19 @@ def main():
             print("Error: --input is required to process data")
             return
 
-        sample_data = get_sample_data(args.input)
         print(f"Sending request to {args.url}")
-        response = send_request(args.url, sample_data)
+        if args.batch:
+            exports = [get_sample_data(path) for path in args.input]
+            response = send_batch_request(args.url, exports)
+        elif args.job:
+            sample_data = get_sample_data(args.input[0])
+            response = submit_job(args.url, sample_data)
+        elif args.stream:
+            sample_data = get_sample_data(args.input[0])
+            response = send_stream_request(args.url, sample_data)
+        else:
+            sample_data = get_sample_data(args.input[0])
+            response = send_request(args.url, sample_data)
 
         if response:
             print("Response received:")
@@ -0,0 +1,463 @@
+import asyncio
+
+from quart import Quart, Response, request, jsonify
+from src.logging_config import logging_stats, setup_logging
+from src.llm_interface import (
+    AsyncOpenAIProvider,
+    AsyncCohereAIProvider,
+    AsyncAnthropicAIProvider,
+)
+from src.html_repair import repair_stats
+from src.report_pipeline import (
+    REPORT_QUERY,
+    StreamingReportCheck,
+    build_report_context,
+    build_report_payload,
+    complete_report,
+    format_report_sse,
+    format_sse,
+    invalid_export_payload,
+    lookup_cached_report,
+    prepare_report,
+    provider_unavailable_payload,
+    reject_leaked_draft,
+    score_exports,
+    store_cached_report,
+)
+from src.report_renderer import structured_output_enabled
+from src.provider_router import AsyncProviderRouter, build_provider_router
+from src.roadmap_output_ingestor import RoadmapValidationError
+from src.report_cache import build_report_cache, make_cache_key
+from src.report_reuse import build_report_reuse
+from src.request_profiler import build_request_profiler, request_calls_profile
+from src.health_monitor import (
+    AsyncHealthMonitor,
+    CircuitOpenError,
+    build_health_monitor,
+)
+from src.logging_config import get_logger
+from src.metrics import render_metrics, time_stage
+
+from src.config_manager import ConfigManager
+from dotenv import load_dotenv
+
+# set environment vars
+load_dotenv()
+
+# set global configuration
+config_manager = ConfigManager()
+
+# set up logger
+setup_logging(logging_config=config_manager.logging_config)
+
+app = Quart(__name__)
+# LLM calls routinely run longer than quart's 60 second default response timeout
+app.config["RESPONSE_TIMEOUT"] = None
+logger = get_logger(__name__)
+
+
+async_llm_strategy = {
+    "openai": AsyncOpenAIProvider,
+    "anthropic": AsyncAnthropicAIProvider,
+    "cohere": AsyncCohereAIProvider,
+}
+llm = build_provider_router(
+    config_manager.router_config,
+    config_manager,
+    async_llm_strategy,
+    router_class=AsyncProviderRouter,
+)
+if llm is None:
+    llm_provider = async_llm_strategy[config_manager.llm_provider_name]
+    logger.debug(f"Using async LLM provider: {llm_provider}")
+    llm = llm_provider(config_manager)
+report_cache = build_report_cache(config_manager.cache_config)
+report_reuse = build_report_reuse(
+    config_manager.reuse_config, config_manager.output_config.get("format", "html")
+)
+request_profiler = build_request_profiler(config_manager.profiling_config)
+health_monitor = build_health_monitor(
+    config_manager.health_config, llm, monitor_class=AsyncHealthMonitor
+)
+
+
+@app.before_serving
+async def warm_up_providers():
+    # on the serving loop, since async clients' connections belong to the loop that opened them
+    if config_manager.startup_config.get("warm_up", False):
+        await llm.warm_up(
+            config_manager.startup_config.get("warm_up_timeout_seconds", 5)
+        )
+    if health_monitor is not None:
+        health_monitor.start()
+
+
+@app.after_serving
+async def stop_health_monitor():
+    if health_monitor is not None:
+        health_monitor.stop()
+
+
+async def in_thread(profile, func, *args):
+    """asyncio.to_thread, with the call profiled when the request is."""
+    if profile is None:
+        return await asyncio.to_thread(func, *args)
+    return await asyncio.to_thread(profile.run, func, *args)
+
+
+async def process_report(user_data, headers, profile=None):
+    """Async counterpart of report_pipeline.process_report; returns (payload, status code).
+
+    profile is the request's ProfiledCalls, if it is profiled: only the
+    preprocessing and the cleaning and validation are, not the LLM calls.
+    """
+    # preprocessing is CPU bound and the cache and reuse lookups are blocking sqlite,
+    # keep them off the event loop
+    cached, report = await in_thread(
+        profile,
+        prepare_report,
+        user_data,
+        config_manager,
+        report_cache,
+        headers,
+        report_reuse,
+    )
+    if cached is not None:
+        return cached, 200
+
+    logger.info("Performing LLM analysis now...")
+    with time_stage("llm"):
+        analysis = await llm.analyze(
+            report["query"], report["context"], report["structured"]
+        )
+    if reject_leaked_draft(report, analysis[0], config_manager, report_reuse):
+        with time_stage("llm"):
+            analysis = await llm.analyze(
+                report["query"], report["context"], report["structured"]
+            )
+    # html5lib parsing, template rendering and the stores, likewise
+    return await in_thread(
+        profile,
+        complete_report,
+        report,
+        analysis,
+        llm,
+        user_data,
+        config_manager,
+        report_cache,
+        report_reuse,
+    )
+
+
+@app.route("/process", methods=["POST"])
+async def process_data():
+    try:
+        with time_stage("parse"):
+            user_data = await request.get_json()
+        if not user_data:
+            return jsonify({"error": "No data provided"}), 400
+
+        with request_calls_profile(request_profiler, request.headers) as profile:
+            payload, status_code = await process_report(
+                user_data, request.headers, profile
+            )
+        if profile is not None and profile.result["mode"] == "inline":
+            payload["profile"] = profile.result
+        return jsonify(payload), status_code
+
+    except CircuitOpenError as e:
+        return jsonify(provider_unavailable_payload(e)), 503
+    except RoadmapValidationError as e:
+        return jsonify(invalid_export_payload(e)), 400
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "An error occurred while processing the request",
+                    "details": str(e),
+                }
+            ),
+            500,
+        )
+
+
+@app.route("/process/stream", methods=["POST"])
+async def process_data_stream():
+    with time_stage("parse"):
+        user_data = await request.get_json()
+    if not user_data:
+        return jsonify({"error": "No data provided"}), 400
+
+    if structured_output_enabled(config_manager.output_config):
+        # a structured report can only be rendered once all of its JSON is in, so
+        # it goes out the way a cached one does: the whole report, then done
+        try:
+            payload, status_code = await process_report(user_data, request.headers)
+        except CircuitOpenError as e:
+            return jsonify(provider_unavailable_payload(e)), 503
+        except RoadmapValidationError as e:
+            return jsonify(invalid_export_payload(e)), 400
+        except Exception as e:
+            logger.error(f"Error processing streaming request: {str(e)}")
+            return (
+                jsonify(
+                    {
+                        "status": "error",
+                        "message": "An error occurred while processing the request",
+                        "details": str(e),
+                    }
+                ),
+                500,
+            )
+        return (
+            format_report_sse(payload, status_code),
+            200,
+            {"Content-Type": "text/event-stream"},
+        )
+
+    try:
+        context, token_counts = await asyncio.to_thread(
+            build_report_context, user_data, config_manager.context_config
+        )
+    except RoadmapValidationError as e:
+        return jsonify(invalid_export_payload(e)), 400
+    except Exception as e:
+        logger.error(f"Error preprocessing streaming request: {str(e)}")
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "An error occurred while processing the request",
+                    "details": str(e),
+                }
+            ),
+            500,
+        )
+
+    cache_key = make_cache_key(
+        context,
+        REPORT_QUERY,
+        config_manager.llm_provider_name,
+        config_manager.model,
+    )
+    cached, cache_status = await asyncio.to_thread(
+        lookup_cached_report, report_cache, cache_key, request.headers
+    )
+    if cached is not None:
+        logger.info(f"Serving streamed report from cache ({cache_status})")
+        payload = {**cached, "cache": cache_status}
+        return (
+            format_sse("delta", {"text": cached["html_report"]})
+            + format_sse("done", payload),
+            200,
+            {"Content-Type": "text/event-stream"},
+        )
+
+    try:
+        deltas, len_of_input = llm.stream_analyze(REPORT_QUERY, context)
+    except CircuitOpenError as e:
+        return jsonify(provider_unavailable_payload(e)), 503
+
+    async def generate():
+        check = StreamingReportCheck(config_manager.validation_config)
+        abort_on_error = config_manager.validation_config.get(
+            "abort_stream_on_error", True
+        )
+        len_of_output = 0
+        try:
+            logger.info("Streaming LLM analysis now...")
+            async for delta in deltas:
+                len_of_output += len(delta)
+                cleaned, error = check.feed(delta)
+                if cleaned:
+                    yield format_sse("delta", {"text": cleaned})
+                if error and abort_on_error:
+                    # the report can no longer pass validation, so stop paying
+                    # for the rest of the generation
+                    logger.error(f"Aborting stream, HTML validation failed: {error}")
+                    yield format_sse(
+                        "error",
+                        {
+                            "status": "error",
+                            "message": "HTML validation failed",
+                            "details": error,
+                        },
+                    )
+                    return
+
+            cleaned, cleaned_results, validated, validation_message = (
+                await asyncio.to_thread(check.close)
+            )
+            if cleaned:
+                yield format_sse("delta", {"text": cleaned})
+            if validated:
+                logger.info("HTML was validated!")
+                served_provider, served_model = llm.served_by()
+                payload = build_report_payload(
+                    cleaned_results,
+                    served_provider,
+                    served_model,
+                    len_of_input,
+                    len_of_output,
+                    token_counts,
+                )
+                await asyncio.to_thread(
+                    store_cached_report,
+                    report_cache,
+                    cache_key,
+                    payload,
+                    config_manager,
+                )
+                yield format_sse("done", {**payload, "cache": cache_status})
+            else:
+                logger.error(f"HTML Validation failed: {validation_message}")
+                yield format_sse(
+                    "error",
+                    {
+                        "status": "error",
+                        "message": "HTML validation failed",
+                        "details": validation_message,
+                    },
+                )
+        except Exception as e:
+            logger.error(f"Error streaming request: {str(e)}")
+            yield format_sse(
+                "error",
+                {
+                    "status": "error",
+                    "message": "An error occurred while processing the request",
+                    "details": str(e),
+                },
+            )
+        finally:
+            await deltas.aclose()
+
+    return (
+        generate(),
+        200,
+        {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.route("/strategies", methods=["POST"])
+async def claiming_strategies():
+    body = await request.get_json()
+    exports = body.get("exports") if isinstance(body, dict) else body
+    if not exports or not isinstance(exports, list):
+        return jsonify({"error": "Expected a list of exports"}), 400
+
+    max_items = config_manager.batch_config.get("max_items", 500)
+    if len(exports) > max_items:
+        return jsonify({"error": f"Batch is limited to {max_items} exports"}), 413
+
+    top_n = body.get("top_n", 3) if isinstance(body, dict) else 3
+    if not isinstance(top_n, int) or top_n < 1:
+        return jsonify({"error": "top_n must be a positive integer"}), 400
+
+    # scored locally, no LLM call, so a whole portfolio comes back in one response
+    logger.info(f"Scoring claiming strategies for {len(exports)} exports")
+    results = await asyncio.to_thread(score_exports, exports, top_n)
+    return jsonify({"results": results})
+
+
+@app.route("/cache/stats", methods=["GET"])
+async def cache_stats():
+    if report_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **report_cache.stats()})
+
+
+@app.route("/router/stats", methods=["GET"])
+async def router_stats():
+    if not isinstance(llm, AsyncProviderRouter):
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "providers": llm.router_stats()})
+
+
+@app.route("/hedge/stats", methods=["GET"])
+async def hedge_stats():
+    providers = (
+        llm.providers
+        if isinstance(llm, AsyncProviderRouter)
+        else {llm.llm_provider: llm}
+    )
+    return jsonify(
+        {
+            name: provider.hedge_policy.stats()
+            for name, provider in providers.items()
+            if provider.hedge_policy is not None
+        }
+    )
+
+
+@app.route("/repair/stats", methods=["GET"])
+async def repair_stats_endpoint():
+    return jsonify(repair_stats.stats())
+
+
+@app.route("/reuse/stats", methods=["GET"])
+async def reuse_stats():
+    if report_reuse is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **report_reuse.stats()})
+
+
+@app.route("/logging/stats", methods=["GET"])
+async def logging_stats_endpoint():
+    return jsonify(logging_stats())
+
+
+@app.route("/health/stats", methods=["GET"])
+async def health_stats():
+    if health_monitor is None:
+        return jsonify({"enabled": False})
+    return jsonify(
+        {
+            "enabled": True,
+            "ready": health_monitor.ready(),
+            "providers": health_monitor.stats(),
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@app.route("/healthz", methods=["GET"])
+async def health_check():
+    logger.info("Health check requested")
+    return "", 200
+
+
+@app.route("/ready", methods=["GET"])
+async def readiness_check():
+    logger.info("Readiness check requested")
+    if health_monitor is not None:
+        # the monitor and real traffic keep the breakers current, so no LLM call here
+        if health_monitor.ready():
+            return "", 200
+        logger.error(f"Readiness check failed: {health_monitor.stats()}")
+        return "Service is not ready", 503
+    try:
+        # Perform a simple request to the LLM provider
+        await llm.analyze("Test", "This is a test.")
+        logger.info("Readiness check passed")
+        return "", 200
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return "Service is not ready", 503
+
+
+if __name__ == "__main__":
+    app.run(host=config_manager.host, port=int(config_manager.port), debug=False)
+    # In production, serve with hypercorn (installed with quart) from cmd line:
+    # hypercorn --bind 0.0.0.0:8000 --workers 1 src.asgi:app
@@ -0,0 +1,267 @@
+"""Social Security figures computed locally, so the LLM only has to write the narrative.
+
+Everything is plain NumPy over the SSCalEarnings history: earnings are capped at
+the taxable maximum, wage-indexed to the year the worker turns 60, the top 35
+years give the AIME, and the PIA formula's bend points come from the same wage
+index. Benefits for every claim month from 62 to 70 apply the early-claiming
+reductions and delayed retirement credits to the export's PIA, plus the spousal
+top-up for married couples.
+
+Years past the last published wage index are indexed to that year, so figures
+for younger clients are in today's wage levels rather than a projection.
+"""
+
+import functools
+import math
+from datetime import timedelta
+
+import numpy as np
+
+# National Average Wage Index, 1951 onwards
+AWI_FIRST_YEAR = 1951
+AWI = np.array(
+    [
+        2799.16, 2973.32, 3139.44, 3155.64, 3301.44, 3532.36, 3641.72, 3673.80,
+        3855.80, 4007.12, 4086.76, 4291.40, 4396.64, 4576.32, 4658.72, 4938.36,
+        5213.44, 5571.76, 5893.76, 6186.24, 6497.08, 7133.80, 7580.16, 8030.76,
+        8630.92, 9226.48, 9779.44, 10556.03, 11479.46, 12513.46, 13773.10,
+        14531.34, 15239.24, 16135.07, 16822.51, 17321.82, 18426.51, 19334.04,
+        20099.55, 21027.98, 21811.60, 22935.42, 23132.67, 23753.53, 24705.66,
+        25913.90, 27426.00, 28861.44, 30469.84, 32154.82, 32921.92, 33252.09,
+        34064.95, 35648.55, 36952.94, 38651.41, 40405.48, 41334.97, 40711.61,
+        41673.83, 42979.61, 44321.67, 44888.16, 46481.52, 48098.63, 48642.15,
+        50321.89, 52145.80, 54099.99, 55628.60, 60575.07, 63795.13, 66621.80,
+    ]
+)  # fmt: skip
+AWI_LAST_YEAR = AWI_FIRST_YEAR + len(AWI) - 1
+
+# Contribution and benefit base (taxable maximum), 1951 onwards
+TAXABLE_MAX = np.array(
+    [3600] * 4 + [4200] * 4 + [4800] * 7 + [6600] * 2 + [7800] * 4
+    + [
+        9000, 10800, 13200, 14100, 15300, 16500, 17700, 22900, 25900, 29700,
+        32400, 35700, 37800, 39600, 42000, 43800, 45000, 48000, 51300, 53400,
+        55500, 57600, 60600, 61200, 62700, 65400, 68400, 72600, 76200, 80400,
+        84900, 87000, 87900, 90000, 94200, 97500, 102000, 106800, 106800,
+        106800, 110100, 113700, 117000, 118500, 118500, 127200, 128400, 132900,
+        137700, 142800, 147000, 160200, 168600, 176100,
+    ],
+    dtype=float,
+)  # fmt: skip
+
+COMPUTATION_YEARS = 35
+# 1979 bend points, scaled by the wage index two years before eligibility
+BEND_POINT_BASES = (180, 1085)
+BEND_POINT_BASE_AWI = 9779.44
+PIA_RATES = (0.90, 0.32, 0.15)
+
+MIN_CLAIM_MONTHS = 62 * 12
+MAX_CLAIM_MONTHS = 70 * 12
+# every claim month from 62y0m to 70y0m
+CLAIM_MONTHS = np.arange(MIN_CLAIM_MONTHS, MAX_CLAIM_MONTHS + 1)
+CLAIM_AGES = np.arange(62, 71)
+SPOUSAL_SHARE = 0.5
+
+
+def _attained_year(birth_date) -> int:
+    # SSA treats people as attaining an age the day before their birthday
+    return (birth_date - timedelta(days=1)).year
+
+
+def fra_months(birth_date) -> int:
+    """Full retirement age in months, from the birth year."""
+    year = _attained_year(birth_date)
+    if year <= 1937:
+        return 65 * 12
+    if year <= 1942:
+        return 65 * 12 + 2 * (year - 1937)
+    if year <= 1954:
+        return 66 * 12
+    if year <= 1959:
+        return 66 * 12 + 2 * (year - 1954)
+    return 67 * 12
+
+
+def _clip_years(years: np.ndarray, last_year: int) -> np.ndarray:
+    # np.minimum/np.maximum rather than np.clip, which costs several times more on
+    # arrays this small
+    return np.minimum(np.maximum(years, AWI_FIRST_YEAR), last_year) - AWI_FIRST_YEAR
+
+
+def _earnings_arrays(earnings: dict):
+    years = np.fromiter(earnings.keys(), dtype=np.int64, count=len(earnings))
+    amounts = np.fromiter(earnings.values(), dtype=float, count=len(earnings))
+    return years, amounts
+
+
+def compute_aime_pia(earnings: dict, birth_date):
+    """Return (AIME, PIA) from a {year: earnings} history."""
+    return _aime_pia(*_earnings_arrays(earnings), birth_date)
+
+
+def _aime_pia(years: np.ndarray, amounts: np.ndarray, birth_date):
+    if not len(years):
+        return 0, 0.0
+    capped = np.minimum(
+        np.maximum(amounts, 0.0),
+        TAXABLE_MAX[_clip_years(years, AWI_FIRST_YEAR + len(TAXABLE_MAX) - 1)],
+    )
+
+    indexing_year = min(_attained_year(birth_date) + 60, AWI_LAST_YEAR)
+    index_awi = AWI[indexing_year - AWI_FIRST_YEAR]
+    # earnings after the indexing year count at face value
+    factors = np.where(
+        years < indexing_year, index_awi / AWI[_clip_years(years, AWI_LAST_YEAR)], 1.0
+    )
+    indexed = capped * factors
+
+    if len(indexed) > COMPUTATION_YEARS:
+        indexed = np.partition(indexed, -COMPUTATION_YEARS)[-COMPUTATION_YEARS:]
+    aime = int(indexed.sum() // (COMPUTATION_YEARS * 12))
+
+    first_bend, second_bend = (
+        round(base * index_awi / BEND_POINT_BASE_AWI) for base in BEND_POINT_BASES
+    )
+    pia = (
+        PIA_RATES[0] * min(aime, first_bend)
+        + PIA_RATES[1] * min(max(aime - first_bend, 0), second_bend - first_bend)
+        + PIA_RATES[2] * max(aime - second_bend, 0)
+    )
+    # the PIA is rounded down to the dime
+    return aime, math.floor(pia * 10) / 10
+
+
+@functools.lru_cache(maxsize=64)
+def own_benefit_factors(fra: int) -> np.ndarray:
+    """Share of the PIA paid when the worker claims at each of CLAIM_MONTHS."""
+    early = np.maximum(fra - CLAIM_MONTHS, 0)
+    late = np.maximum(CLAIM_MONTHS - fra, 0)
+    # 5/9% a month for the first 36 months early, 5/12% after; 2/3% a month of
+    # delayed retirement credits up to age 70
+    factors = (
+        1
+        - np.minimum(early, 36) * (5 / 900)
+        - np.maximum(early - 36, 0) * (5 / 1200)
+        + late * (2 / 300)
+    )
+    factors.flags.writeable = False
+    return factors
+
+
+@functools.lru_cache(maxsize=64)
+def spousal_benefit_factors(fra: int) -> np.ndarray:
+    """Share of the spousal benefit paid at each of CLAIM_MONTHS; no credits past FRA."""
+    early = np.maximum(fra - CLAIM_MONTHS, 0)
+    # 25/36% a month for the first 36 months early, 5/12% after
+    factors = (
+        1 - np.minimum(early, 36) * (25 / 3600) - np.maximum(early - 36, 0) * (5 / 1200)
+    )
+    factors.flags.writeable = False
+    return factors
+
+
+def benefits_by_claim_month(pia: float, fra: int, other_pia: float | None = None):
+    """Return (own, spousal) monthly benefits for each of CLAIM_MONTHS.
+
+    The spousal amount is the top-up over the worker's own PIA, paid once the
+    other spouse has filed; it is zero without a spouse.
+    """
+    own = np.floor(pia * own_benefit_factors(fra))
+    if other_pia is None:
+        return own, np.zeros_like(own)
+    excess = max(SPOUSAL_SHARE * other_pia - pia, 0.0)
+    spousal = np.floor(excess * spousal_benefit_factors(fra))
+    return own, spousal
+
+
+# index of each whole claim age in CLAIM_MONTHS
+_CLAIM_AGE_INDEX = CLAIM_AGES * 12 - MIN_CLAIM_MONTHS
+
+
+def _person_figures(person: dict, earnings: dict, other_pia: float | None) -> dict:
+    years, amounts = _earnings_arrays(earnings)
+    positive = int(np.count_nonzero(amounts > 0))
+    total = float(amounts.sum())
+    aime, computed_pia = _aime_pia(years, amounts, person["birth_date"])
+    # the export's PIA already reflects COLAs and any WEP, so claim-age figures
+    # start from it; the computed one is there to show the working
+    pia = person["pia"] or computed_pia
+    fra = fra_months(person["birth_date"])
+    own, spousal = benefits_by_claim_month(pia, fra, other_pia)
+    return {
+        "years_worked": positive,
+        "total_earnings": round(total, 2),
+        "avg_annual_earnings": round(total / positive, 2) if positive else 0.0,
+        "aime": aime,
+        "computed_pia": computed_pia,
+        "pia": pia,
+        "fra_months": fra,
+        "own_benefit": own[_CLAIM_AGE_INDEX].tolist(),
+        "spousal_benefit": spousal[_CLAIM_AGE_INDEX].tolist(),
+    }
+
+
+def compute_benefit_figures(roadmap: dict) -> dict:
+    """Per-person figures for a parsed roadmap; benefit lists follow CLAIM_AGES."""
+    primary = roadmap["primary"]
+    spouse = roadmap["spouse"]
+    married = spouse is not None and roadmap["marital_status"] == 2
+    figures = {
+        "claim_ages": CLAIM_AGES.tolist(),
+        "primary": _person_figures(
+            primary,
+            roadmap["primary_earnings"],
+            spouse["pia"] if married else None,
+        ),
+        "spouse": None,
+    }
+    if spouse is not None:
+        figures["spouse"] = _person_figures(
+            spouse,
+            roadmap["spouse_earnings"],
+            primary["pia"] if married else None,
+        )
+    return figures
+
+
+def _format_fra(months: int) -> str:
+    return f"{months // 12}y{months % 12}m" if months % 12 else f"{months // 12}y"
+
+
+def format_benefit_figures(figures: dict) -> str:
+    people = [("Primary", figures["primary"])]
+    if figures["spouse"] is not None:
+        people.append(("Spouse", figures["spouse"]))
+
+    lines = [
+        "Computed Social Security figures (calculated locally from the data above; "
+        "use these numbers as given rather than recomputing them):"
+    ]
+    for label, person in people:
+        lines.append(
+            f"{label}: years_worked={person['years_worked']}; "
+            f"total_earnings={person['total_earnings']:,.2f}; "
+            f"avg_annual_earnings={person['avg_annual_earnings']:,.2f}; "
+            f"aime={person['aime']:,}; "
+            f"pia_from_earnings={person['computed_pia']:,.2f} (wage-indexed, before COLAs); "
+            f"pia_used={person['pia']:,.2f}; fra={_format_fra(person['fra_months'])}"
+        )
+
+    header = ["claim_age"]
+    columns = []
+    for label, person in people:
+        name = label.lower()
+        header += [f"{name}_own", f"{name}_spousal", f"{name}_total"]
+        own = person["own_benefit"]
+        spousal = person["spousal_benefit"]
+        columns += [own, spousal, [a + b for a, b in zip(own, spousal)]]
+    lines.append(
+        "Monthly benefit by claim age (USD; spousal is the top-up paid once the other "
+        "spouse has filed):"
+    )
+    lines.append("|".join(header))
+    for row, age in enumerate(figures["claim_ages"]):
+        lines.append(
+            "|".join([str(age)] + [f"{round(column[row])}" for column in columns])
+        )
+    return "\n".join(lines)
@@ -0,0 +1,273 @@
+"""Preprocess multi-client export dumps without loading the whole dump into memory.
+
+A dump is either concatenated export objects (optionally newline-delimited) or a
+single top-level JSON array of exports. Records are decoded one at a time and
+fanned out to a process pool running preprocess_roadmap_output, and the results
+are written as they come back, so memory use stays flat however large the dump is.
+
+    python -m src.bulk_ingest dump.json --output contexts.jsonl --workers 4
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from src.roadmap_output_ingestor import (
+    RoadmapValidationError,
+    preprocess_roadmap_output,
+)
+
+OUTPUT_FIELDS = ["index", "id", "name", "status", "context", "errors"]
+
+
+# stands in for a line of a newline-delimited dump that isn't valid JSON
+MalformedRecord = namedtuple("MalformedRecord", ["error"])
+
+
+def iter_json_records(
+    fp, chunk_size: int = 1 << 16, max_record_chars: int | None = None
+):
+    """Yield each top-level export object from a text stream, one at a time.
+
+    A record that fails to decode is retried with more input, at most
+    max_record_chars (64 chunks by default) past its start, so a corrupt record
+    can't pull the rest of the dump into memory. In a newline-delimited dump a bad
+    line is yielded as a MalformedRecord and reading resumes on the next line;
+    anywhere else there is no safe place to resume, so ValueError is raised.
+    """
+    if max_record_chars is None:
+        max_record_chars = 64 * chunk_size
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    # position of buffer[0] in the stream, for error messages
+    offset = 0
+    eof = False
+    in_array = None
+    line_delimited = None
+
+    def fill():
+        nonlocal buffer, pos, offset, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        # drop everything already decoded so the buffer only ever holds one record
+        offset += pos
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        # skip whitespace, plus the commas between elements of a top-level array
+        while True:
+            while pos < len(buffer) and (
+                buffer[pos].isspace() or (in_array and buffer[pos] == ",")
+            ):
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            fill()
+
+        if pos >= len(buffer):
+            if in_array:
+                raise ValueError("Unterminated top-level JSON array")
+            return
+
+        if in_array is None:
+            in_array = buffer[pos] == "["
+            if in_array:
+                line_delimited = False
+                pos += 1
+                continue
+        if in_array and buffer[pos] == "]":
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            newline = buffer.find("\n", pos)
+            if line_delimited is None and newline != -1:
+                # undecided until a record decodes; pretty-printed exports don't
+                # start a line with "{" right after their first line
+                line_delimited = buffer.startswith("{", newline + 1)
+            if not line_delimited:
+                newline = -1
+            if newline == -1 and not eof and len(buffer) - pos <= max_record_chars:
+                # the record straddles the end of the buffer, read more and retry
+                fill()
+                continue
+            start = offset + pos
+            if not line_delimited:
+                if eof:
+                    raise ValueError(
+                        f"Invalid JSON record at character {start}: {e.msg}"
+                    ) from e
+                raise ValueError(
+                    f"No complete JSON record within {max_record_chars} characters "
+                    f"of character {start}"
+                ) from e
+            while newline == -1 and not eof:
+                # a line over the cap is dropped as it is read
+                pos = len(buffer)
+                fill()
+                newline = buffer.find("\n")
+            pos = len(buffer) if newline == -1 else newline + 1
+            yield MalformedRecord(f"Invalid JSON record at character {start}: {e.msg}")
+            continue
+        if line_delimited is None:
+            line_delimited = "\n" not in buffer[pos:end]
+        pos = end
+        yield record
+
+
+def open_dump(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def preprocess_records(batch):
+    """Process pool task: preprocess a batch of (index, record) pairs."""
+    results = []
+    for index, record in batch:
+        result = {
+            "index": index,
+            "id": record.get("id") if isinstance(record, dict) else None,
+            "name": record.get("name") if isinstance(record, dict) else None,
+        }
+        if isinstance(record, MalformedRecord):
+            result["status"] = "error"
+            result["errors"] = [record.error]
+            results.append(result)
+            continue
+        try:
+            result["context"] = preprocess_roadmap_output(record)
+            result["status"] = "success"
+        except RoadmapValidationError as e:
+            result["status"] = "error"
+            result["errors"] = e.errors
+        except Exception as e:
+            result["status"] = "error"
+            result["errors"] = [str(e)]
+        results.append(result)
+    return results
+
+
+class JSONLWriter:
+    def __init__(self, fp):
+        self.fp = fp
+
+    def write(self, result: dict):
+        self.fp.write(json.dumps(result) + "\n")
+
+
+class CSVWriter:
+    def __init__(self, fp):
+        self.writer = csv.DictWriter(fp, fieldnames=OUTPUT_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, result: dict):
+        self.writer.writerow({**result, "errors": "; ".join(result.get("errors", []))})
+
+
+OUTPUT_WRITERS = {"jsonl": JSONLWriter, "csv": CSVWriter}
+
+
+def iter_batches(records, batch_size: int):
+    batch = []
+    for index, record in enumerate(records):
+        batch.append((index, record))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run(
+    records,
+    writer,
+    workers: int = 4,
+    batch_size: int = 32,
+    report_every: float = 5.0,
+    log=sys.stderr,
+):
+    """Preprocess every record, writing results in input order; return (processed, failed)."""
+    processed = failed = 0
+    start = last_report = time.perf_counter()
+    # a bounded window of in-flight batches keeps memory flat (Executor.map would
+    # submit the whole dump up front)
+    max_in_flight = workers * 4
+    in_flight = deque()
+
+    def drain_one():
+        nonlocal processed, failed, last_report
+        for result in in_flight.popleft().result():
+            writer.write(result)
+            processed += 1
+            failed += result["status"] != "success"
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            last_report = now
+            print(
+                f"{processed} records, {processed / (now - start):,.0f} records/s",
+                file=log,
+            )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in iter_batches(records, batch_size):
+            if len(in_flight) >= max_in_flight:
+                drain_one()
+            in_flight.append(pool.submit(preprocess_records, batch))
+        while in_flight:
+            drain_one()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {processed} records ({failed} failed) in {elapsed:.2f}s, "
+        f"{processed / elapsed if elapsed else 0:,.0f} records/s",
+        file=log,
+    )
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Preprocess a multi-client export dump into LLM contexts."
+    )
+    parser.add_argument(
+        "input", help="Export dump (.json, .jsonl, .gz, or - for stdin)"
+    )
+    parser.add_argument("--output", default="-", help="Output file (default stdout)")
+    parser.add_argument("--format", choices=sorted(OUTPUT_WRITERS), default="jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    output = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "w", encoding="utf-8", newline="")
+    )
+    try:
+        with open_dump(args.input) as fp:
+            writer = OUTPUT_WRITERS[args.format](output)
+            run(
+                iter_json_records(fp),
+                writer,
+                workers=args.workers,
+                batch_size=args.batch_size,
+            )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
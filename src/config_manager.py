@@ -20,9 +20,22 @@ class ConfigManager:
         self.port = self._get_port()
         self.host = self._get_host()
         self.llm_provider_name = self._get_llm_provider()
-        self.api_key = self._get_api_key(llm_provider=self.llm_provider_name)
-        self.llm_config = self._get_llm_config(llm_name=self.llm_provider_name)
+        self.api_key = self.get_api_key(llm_provider=self.llm_provider_name)
+        self.llm_config = self.get_llm_config(llm_name=self.llm_provider_name)
         self.model = self.llm_config["model"]
+        self.cache_config = self._get_cache_config()
+        self.batch_config = self._get_batch_config()
+        self.jobs_config = self._get_jobs_config()
+        self.context_config = self._get_context_config()
+        self.router_config = self._get_router_config()
+        self.hedging_config = self._get_hedging_config()
+        self.validation_config = self._get_validation_config()
+        self.output_config = self._get_output_config()
+        self.reuse_config = self._get_reuse_config()
+        self.startup_config = self._get_startup_config()
+        self.health_config = self._get_health_config()
+        self.logging_config = self._get_logging_config()
+        self.profiling_config = self._get_profiling_config()
 
         logger.debug("Using LLM Config manager")
         self.initialized = True
@@ -32,7 +45,7 @@ class ConfigManager:
             logger.debug(f"Loaded config from path: {self.config_path}")
             return yaml.safe_load(f)
 
-    def _get_api_key(self, llm_provider):
+    def get_api_key(self, llm_provider):
         try:
             logger.debug("Loading api key")
             return os.environ.get(f"{llm_provider.upper()}_API_KEY")
@@ -41,7 +54,7 @@ class ConfigManager:
                 f"API key for {llm_provider} not found. Ensure the secret {llm_provider.lower()}_api_key is set."
             )
 
-    def _get_llm_config(self, llm_name):
+    def get_llm_config(self, llm_name):
         if llm_name not in self.config:
             raise ValueError(
                 f"Configuration for {llm_name} not found in the config file."
@@ -58,6 +71,45 @@ class ConfigManager:
     def _get_host(self):
         return self.config["general"]["host"]
 
+    def _get_cache_config(self):
+        return self.config.get("cache", {})
+
+    def _get_batch_config(self):
+        return self.config.get("batch", {})
+
+    def _get_jobs_config(self):
+        return self.config.get("jobs", {})
+
+    def _get_context_config(self):
+        return self.config.get("context", {})
+
+    def _get_router_config(self):
+        return self.config.get("router", {})
+
+    def _get_hedging_config(self):
+        return self.config.get("hedging", {})
+
+    def _get_validation_config(self):
+        return self.config.get("validation", {})
+
+    def _get_output_config(self):
+        return self.config.get("output", {})
+
+    def _get_reuse_config(self):
+        return self.config.get("reuse", {})
+
+    def _get_startup_config(self):
+        return self.config.get("startup", {})
+
+    def _get_health_config(self):
+        return self.config.get("health", {})
+
+    def _get_logging_config(self):
+        return self.config.get("logging", {})
+
+    def _get_profiling_config(self):
+        return self.config.get("profiling", {})
+
 
 if __name__ == "__main__":
     manager = ConfigManager()
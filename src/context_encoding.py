@@ -0,0 +1,238 @@
+import re
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Rough BPE approximation: words, 1-3 digit groups and punctuation are each about
+# one token, long words cost an extra token per ~7 characters.
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\n")
+
+RECENT_EARNINGS_YEARS = 20
+TRIM_LEVELS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + len(piece) // 7 for piece in _TOKEN_RE.findall(text))
+
+
+def _value(value) -> str:
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _fields(pairs) -> str:
+    # empty values carry no information for the model, so leave them out entirely
+    return "; ".join(
+        f"{key}={_value(value)}" for key, value in pairs if value not in (None, "", " ")
+    )
+
+
+def _format_person(person: dict, earnings: dict, drop_contact: bool) -> str:
+    years_worked = sum(1 for earning in earnings.values() if earning > 0)
+    total_earnings = sum(earnings.values())
+    pairs = [
+        ("name", person["name"]),
+        ("born", person["birth_date"].strftime("%Y-%m-%d")),
+        ("age", person["age"]),
+        ("gender", person["gender"]),
+    ]
+    if not drop_contact:
+        pairs += [("email", person["email"]), ("phone", person["phone"])]
+    pairs += [
+        ("blind", person["blind"]),
+        ("years_worked", years_worked),
+        ("total_earnings", round(total_earnings)),
+        (
+            "avg_annual_earnings",
+            round(total_earnings / years_worked) if years_worked else 0,
+        ),
+        ("pia", person["pia"]),
+        ("fra", f"{person['fra'].strftime('%Y-%m-%d')} (age {person['fra_age']})"),
+        ("full_coverage", person["has_full_coverage"]),
+        ("disabled", person["is_disabled"]),
+        ("has_pension", person["has_pension"]),
+        ("collecting", person["is_collecting_benefits"]),
+        ("est_retirement_age", person["est_retirement_age"]),
+        ("life_expectancy", person["life_expectancy"]),
+    ]
+    return _fields(pairs)
+
+
+def _earnings_rows(years, columns):
+    """Yield table rows newest first, collapsing runs of all-zero years into one range row."""
+    zero_run = []
+
+    def flush():
+        if zero_run:
+            span = (
+                str(zero_run[0])
+                if len(zero_run) == 1
+                else f"{zero_run[-1]}-{zero_run[0]}"
+            )
+            zero_run.clear()
+            return [f"{span}|" + "|".join("0" for _ in columns)]
+        return []
+
+    rows = []
+    for year in years:
+        amounts = [column.get(year, 0) for column in columns]
+        if not any(amounts):
+            zero_run.append(year)
+            continue
+        rows += flush()
+        rows.append(f"{year}|" + "|".join(str(round(amount)) for amount in amounts))
+    rows += flush()
+    return rows
+
+
+def _decade_totals(years, columns, labels) -> str:
+    decades = {}
+    for year in years:
+        totals = decades.setdefault(year // 10 * 10, [0] * len(columns))
+        for index, column in enumerate(columns):
+            totals[index] += column.get(year, 0)
+    return "\n".join(
+        f"{decade}s: "
+        + "; ".join(f"{label}={round(total)}" for label, total in zip(labels, totals))
+        for decade, totals in sorted(decades.items(), reverse=True)
+        if any(totals)
+    )
+
+
+def _format_earnings(roadmap: dict, level: int) -> str:
+    columns = [roadmap["primary_earnings"]]
+    labels = ["primary"]
+    if roadmap["spouse"] is not None:
+        columns.append(roadmap["spouse_earnings"])
+        labels.append("spouse")
+    years = sorted(set().union(*columns), reverse=True)
+    if not years:
+        return ""
+
+    if level >= 3:
+        return "Earnings totals by decade (USD):\n" + _decade_totals(
+            years, columns, labels
+        )
+
+    detailed_years = years
+    older_years = []
+    if level >= 2:
+        cutoff = years[0] - RECENT_EARNINGS_YEARS
+        detailed_years = [year for year in years if year > cutoff]
+        older_years = [year for year in years if year <= cutoff]
+
+    section = (
+        "Earnings (USD, whole dollars; a year range means every year in it was 0):\n"
+        + "year|"
+        + "|".join(labels)
+        + "\n"
+        + "\n".join(_earnings_rows(detailed_years, columns))
+    )
+    if older_years and any(
+        column.get(year, 0) for column in columns for year in older_years
+    ):
+        section += (
+            f"\nEarnings totals by decade up to {older_years[0]} (USD):\n"
+            + _decade_totals(older_years, columns, labels)
+        )
+    return section
+
+
+def _format_children(children: list, level: int) -> str:
+    if not children:
+        return ""
+    if level >= 4:
+        disabled = sum(1 for child in children if child["is_disabled"])
+        return f"Children: {len(children)} ({disabled} disabled)"
+    return "\n".join(
+        "Child: "
+        + _fields(
+            [
+                ("name", child["name"]),
+                ("born", child["birth_date"].strftime("%Y-%m-%d")),
+                ("age", child["age"]),
+                (
+                    "hs_graduation",
+                    child["high_school_grad_date"].strftime("%Y-%m-%d"),
+                ),
+                ("collecting", child["is_collecting_benefits"]),
+                ("disabled", child["is_disabled"]),
+            ]
+        )
+        for child in children
+    )
+
+
+def _format_pensions(pensions: list, level: int) -> str:
+    if not pensions:
+        return ""
+    if level >= 4:
+        total = sum(pension["annual_amount"] for pension in pensions)
+        return f"Pensions: {len(pensions)}; total_annual={round(total)}"
+    return "\n".join(
+        "Pension: "
+        + _fields(
+            [
+                ("title", pension["title"]),
+                ("annual", pension["annual_amount"]),
+                ("lump_sum", pension["lump_sum_amount"] or None),
+                ("start_year", pension["start_year"]),
+                ("gpo_exempt", pension["exempt_from_gpo"]),
+            ]
+        )
+        for pension in pensions
+    )
+
+
+def format_compact_context(roadmap: dict, level: int = 0) -> str:
+    """Render a parsed roadmap compactly; higher levels trim the lowest-value content first.
+
+    1 drops contact details, 2 summarizes earnings older than RECENT_EARNINGS_YEARS
+    by decade, 3 summarizes all earnings by decade, 4 reduces children and pensions
+    to counts.
+    """
+    drop_contact = level >= 1
+    settings = roadmap["settings"]
+    sections = [
+        "Primary beneficiary: "
+        + _format_person(roadmap["primary"], roadmap["primary_earnings"], drop_contact)
+    ]
+    if roadmap["spouse"] is not None:
+        sections.append(
+            "Spouse: "
+            + _format_person(
+                roadmap["spouse"], roadmap["spouse_earnings"], drop_contact
+            )
+        )
+    sections += [
+        f"Marital status: {'Married' if roadmap['marital_status'] == 2 else 'Other'}",
+        _format_earnings(roadmap, level),
+        _format_children(roadmap["children"], level),
+        _format_pensions(roadmap["pensions"], level),
+        "Settings: "
+        + _fields(
+            [
+                ("COLA", f"{settings['cola']}%"),
+                ("inflation", f"{settings['inflation_rate']}%"),
+                ("nominal_return", f"{settings['nominal_rate_of_return']}%"),
+                ("real_return", f"{settings['real_rate_of_return']}%"),
+            ]
+        ),
+    ]
+    return "\n".join(section for section in sections if section)
+
+
+def fit_compact_context(roadmap: dict, token_budget: int | None = None) -> str:
+    """Return the least-trimmed compact context that fits in token_budget."""
+    for level in range(TRIM_LEVELS + 1):
+        context = format_compact_context(roadmap, level)
+        if token_budget is None or estimate_tokens(context) <= token_budget:
+            return context
+    logger.warning(
+        f"Compact context is still over its {token_budget} token budget after trimming"
+    )
+    return context
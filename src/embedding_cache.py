@@ -0,0 +1,131 @@
+"""On-disk cache of text embeddings keyed by content hash.
+
+Vectors live in one float16 file, memory-mapped for reads and appended to for
+writes, with a json map from each text's hash to its row. Rebuilding an index
+after a small corpus change only embeds the texts whose hash isn't there yet.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DTYPE = np.float16
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Embeddings for one model under cache_dir: vectors.f16 plus rows.json."""
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.vectors_path = os.path.join(cache_dir, "vectors.f16")
+        self.rows_path = os.path.join(cache_dir, "rows.json")
+        self.dimension = None
+        self.rows = {}
+        self._vectors = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.rows_path):
+            return
+        with open(self.rows_path, encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata["model"] != self.model_name:
+            # vectors from another model are useless, start over
+            logger.info(
+                f"Embedding cache {self.cache_dir} is for {metadata['model']}, "
+                f"discarding it for {self.model_name}"
+            )
+            return
+        self.dimension = metadata["dimension"]
+        self.rows = metadata["rows"]
+        self._map()
+
+    def _map(self):
+        if not self.rows:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(
+            self.vectors_path,
+            dtype=DTYPE,
+            mode="r",
+            shape=(len(self.rows), self.dimension),
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def missing(self, hashes: list) -> list:
+        """The hashes with no cached vector, in order, without duplicates."""
+        return list(dict.fromkeys(h for h in hashes if h not in self.rows))
+
+    def get(self, hashes: list) -> np.ndarray:
+        """float32 vectors for hashes, which must all be cached."""
+        return np.asarray(self._vectors[[self.rows[h] for h in hashes]], np.float32)
+
+    def add(self, hashes: list, vectors: np.ndarray):
+        """Append vectors for new hashes.
+
+        The row map is written after the vectors, so an interrupted add leaves
+        only unreferenced bytes, which the next add truncates.
+        """
+        if not len(hashes):
+            return
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+            os.makedirs(self.cache_dir, exist_ok=True)
+            mode = "wb"
+        else:
+            # cut off anything an interrupted add left past the last mapped row
+            os.truncate(
+                self.vectors_path,
+                len(self.rows) * self.dimension * np.dtype(DTYPE).itemsize,
+            )
+            mode = "ab"
+        first_row = len(self.rows)
+        with open(self.vectors_path, mode) as f:
+            f.write(np.ascontiguousarray(vectors, dtype=DTYPE).tobytes())
+        for offset, text_hash in enumerate(hashes):
+            self.rows[text_hash] = first_row + offset
+        self._save_rows()
+        self._map()
+
+    def prune(self, live_hashes):
+        """Drop every vector whose hash isn't in live_hashes, rewriting the files."""
+        live = [h for h in dict.fromkeys(live_hashes) if h in self.rows]
+        if len(live) == len(self.rows):
+            return 0
+        removed = len(self.rows) - len(live)
+        vectors = np.asarray(self._vectors[[self.rows[h] for h in live]])
+        self._vectors = None
+        temp_path = self.vectors_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(temp_path, self.vectors_path)
+        self.rows = {text_hash: row for row, text_hash in enumerate(live)}
+        self._save_rows()
+        self._map()
+        return removed
+
+    def _save_rows(self):
+        temp_path = self.rows_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "model": self.model_name,
+                    "dimension": self.dimension,
+                    "rows": self.rows,
+                },
+                f,
+            )
+        os.replace(temp_path, self.rows_path)
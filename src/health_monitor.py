@@ -0,0 +1,272 @@
+"""Per-process provider health: a circuit breaker per provider and a background prober.
+
+Breakers are fed passively by real calls (BaseAIProvider.analyze and
+stream_analyze) and actively by a monitor that makes one cheap authenticated call
+per provider every `interval_seconds`, skipping providers that real traffic has
+shown healthy since the last round. /ready only reads breaker state, so a
+Kubernetes probe never costs a provider call.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+# timeout and connection error classes of the provider SDKs and their HTTP clients
+# (openai, anthropic, cohere, httpx, requests), matched by name so none is imported
+TRANSPORT_ERRORS = {
+    "APITimeoutError",
+    "APIConnectionError",
+    "TimeoutException",
+    "TransportError",
+    "ConnectionError",
+    "Timeout",
+}
+# auth failures count too: a revoked key fails every call until someone fixes it
+FAILURE_STATUSES = {401, 403, 429}
+
+
+def is_provider_failure(error: Exception | None) -> bool:
+    """Whether an error says the provider is down, overloaded or refusing our key.
+
+    Timeouts, connection errors, 5xx, 429 and auth failures count; a request the
+    provider rejected (400, 422, a reply we couldn't parse) says nothing about it.
+    """
+    if error is None or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if not isinstance(status, int):
+        return False
+    return status >= 500 or status in FAILURE_STATUSES
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and rejects calls.
+
+    After `reset_seconds` one trial call is let through (half open); its outcome,
+    or a probe's, closes the circuit again or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_success_at = 0.0
+        self.last_error = None
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; counts a rejection when it may not."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            # one trial at a time; a trial that never reported back expires
+            if now - max(self.opened_at, self._trial_started) >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._trial_started = now
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def available(self) -> bool:
+        """Like allow, without taking a trial slot."""
+        with self._lock:
+            return (
+                self.state != OPEN
+                or time.monotonic() - self.opened_at >= self.reset_seconds
+            )
+
+    def healthy(self) -> bool:
+        """Closed and shown working by a call; what readiness reports.
+
+        A new breaker is closed before any call has gone through, and a half open
+        one is still waiting on its trial, so neither counts.
+        """
+        with self._lock:
+            return self.state == CLOSED and self.last_success_at > 0
+
+    def record(self, ok: bool, error: Exception | None = None):
+        # the provider answered a bad request, so it's as up as after a success
+        if not ok and not is_provider_failure(error):
+            ok = True
+        now = time.monotonic()
+        with self._lock:
+            if ok:
+                self._stats["successes"] += 1
+                self.consecutive_failures = 0
+                self.last_success_at = now
+                if self.state != CLOSED:
+                    logger.info("Circuit closed after a successful call")
+                self.state = CLOSED
+                return
+            self._stats["failures"] += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened_at = now
+                self._stats["opened"] += 1
+                logger.warning(
+                    f"Circuit opened after {self.consecutive_failures} consecutive "
+                    f"failures: {self.last_error}"
+                )
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self.state
+            stats["consecutive_failures"] = self.consecutive_failures
+            stats["last_error"] = self.last_error
+            stats["seconds_since_success"] = (
+                round(time.monotonic() - self.last_success_at, 1)
+                if self.last_success_at
+                else None
+            )
+        return stats
+
+
+def build_circuit_breaker(health_config: dict) -> CircuitBreaker | None:
+    if not health_config.get("enabled", False):
+        return None
+    return CircuitBreaker(
+        failure_threshold=health_config.get("failure_threshold", 5),
+        reset_seconds=health_config.get("reset_seconds", 30),
+    )
+
+
+class HealthMonitor:
+    """Probes each provider from a daemon thread and reports readiness from their breakers."""
+
+    def __init__(
+        self, providers: dict, interval_seconds: float = 30, timeout_seconds: float = 5
+    ):
+        self.providers = providers
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self._stop = threading.Event()
+        self._probes = {name: 0 for name in providers}
+
+    def _due(self, provider) -> bool:
+        # real traffic that succeeded within the interval already says it's healthy
+        breaker = provider.breaker
+        return (
+            breaker.state != CLOSED
+            or time.monotonic() - breaker.last_success_at >= self.interval_seconds
+        )
+
+    def probe(self):
+        for name, provider in self.providers.items():
+            if not self._due(provider):
+                continue
+            self._probes[name] += 1
+            try:
+                provider.probe(self.timeout_seconds)
+            except Exception as e:
+                logger.warning(f"Health probe of {name} failed: {str(e)}")
+                provider.breaker.record(False, e)
+                continue
+            provider.breaker.record(True)
+
+    def start(self):
+        thread = threading.Thread(
+            target=self._run, name=f"health-monitor-{os.getpid()}", daemon=True
+        )
+        thread.start()
+        logger.debug(f"Started health monitor for {', '.join(self.providers)}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval_seconds)
+
+    def ready(self) -> bool:
+        return any(provider.breaker.healthy() for provider in self.providers.values())
+
+    def stats(self) -> dict:
+        return {
+            name: {**provider.breaker.stats(), "probes": self._probes[name]}
+            for name, provider in self.providers.items()
+        }
+
+
+class AsyncHealthMonitor(HealthMonitor):
+    """HealthMonitor as an asyncio task on the serving loop, used by src/asgi.py."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._task = None
+
+    async def _probe_one(self, name, provider):
+        self._probes[name] += 1
+        try:
+            await provider.probe(self.timeout_seconds)
+        except Exception as e:
+            logger.warning(f"Health probe of {name} failed: {str(e)}")
+            provider.breaker.record(False, e)
+            return
+        provider.breaker.record(True)
+
+    async def probe(self):
+        await asyncio.gather(
+            *(
+                self._probe_one(name, provider)
+                for name, provider in self.providers.items()
+                if self._due(provider)
+            )
+        )
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.debug(f"Started health monitor for {', '.join(self.providers)}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval_seconds)
+
+
+def build_health_monitor(
+    health_config: dict, llm, monitor_class=None
+) -> HealthMonitor | None:
+    if not health_config.get("enabled", False):
+        logger.debug("Health monitor disabled")
+        return None
+    # a ProviderRouter holds one provider per name, otherwise there is just the one
+    providers = getattr(llm, "providers", None) or {llm.llm_provider: llm}
+    monitor_class = monitor_class or HealthMonitor
+    logger.debug(f"Using health monitor config: {health_config}")
+    return monitor_class(
+        providers,
+        interval_seconds=health_config.get("interval_seconds", 30),
+        timeout_seconds=health_config.get("timeout_seconds", 5),
+    )
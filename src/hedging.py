@@ -0,0 +1,197 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class HedgePolicy:
+    """Decides when a slow provider call gets a second, hedged request.
+
+    A hedge fires once the primary call has run longer than `percentile` of the
+    recent primary latencies, as long as hedges stay under `max_hedge_rate` of
+    all requests.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        window: int = 200,
+        min_samples: int = 20,
+        max_hedge_rate: float = 0.1,
+        model: str | None = None,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.model = model
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "hedges_fired": 0,
+            "hedge_wins": 0,
+            "hedges_capped": 0,
+        }
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait on the primary before hedging, or None while warming up."""
+        with self._lock:
+            self._stats["requests"] += 1
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(
+            len(latencies) - 1, math.ceil(self.percentile / 100 * len(latencies)) - 1
+        )
+        return latencies[max(index, 0)]
+
+    def acquire_hedge(self) -> bool:
+        with self._lock:
+            if (
+                self._stats["hedges_fired"] + 1
+                > self.max_hedge_rate * self._stats["requests"]
+            ):
+                self._stats["hedges_capped"] += 1
+                return False
+            self._stats["hedges_fired"] += 1
+            return True
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def record_hedge_win(self):
+        with self._lock:
+            self._stats["hedge_wins"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            samples = len(self._latencies)
+        stats["latency_samples"] = samples
+        stats["hedge_rate"] = (
+            stats["hedges_fired"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        stats["hedge_win_rate"] = (
+            stats["hedge_wins"] / stats["hedges_fired"]
+            if stats["hedges_fired"]
+            else 0.0
+        )
+        return stats
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # threads don't survive a fork, so each worker process builds its own pool
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=64, thread_name_prefix="llm-hedge"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _primary_timer(policy: HedgePolicy, started: float):
+    # record how long the primary really took, even when a hedge beat it, so slow
+    # calls keep showing up in the percentile (a cancelled one ran at least this long)
+    def done(future):
+        if future.cancelled() or future.exception() is None:
+            policy.record_latency(time.monotonic() - started)
+
+    return done
+
+
+def hedged_call(policy: HedgePolicy, primary, hedge):
+    """Run primary(), hedging with hedge() if it runs long; return the first success."""
+    delay = policy.hedge_delay()
+    started = time.monotonic()
+    if delay is None:
+        result = primary()
+        policy.record_latency(time.monotonic() - started)
+        return result
+
+    executor = _get_executor()
+    primary_future = executor.submit(primary)
+    primary_future.add_done_callback(_primary_timer(policy, started))
+    done, _ = wait([primary_future], timeout=delay)
+    if done or not policy.acquire_hedge():
+        return primary_future.result()
+
+    logger.info(f"Primary call exceeded {delay:.2f}s, sending hedged request")
+    hedge_future = executor.submit(hedge)
+    pending = {primary_future, hedge_future}
+    first_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                first_error = first_error or future.exception()
+                continue
+            if future is hedge_future:
+                policy.record_hedge_win()
+            # a blocking sdk call can't be interrupted, so the loser is left to
+            # finish in the background and its result dropped
+            for loser in pending:
+                loser.cancel()
+            return future.result()
+    raise first_error
+
+
+async def async_hedged_call(policy: HedgePolicy, primary, hedge):
+    """Asyncio version of hedged_call; primary and hedge return coroutines and the loser is cancelled."""
+    delay = policy.hedge_delay()
+    started = time.monotonic()
+    if delay is None:
+        result = await primary()
+        policy.record_latency(time.monotonic() - started)
+        return result
+
+    primary_task = asyncio.ensure_future(primary())
+    primary_task.add_done_callback(_primary_timer(policy, started))
+    done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    if done or not policy.acquire_hedge():
+        return await primary_task
+
+    logger.info(f"Primary call exceeded {delay:.2f}s, sending hedged request")
+    hedge_task = asyncio.ensure_future(hedge())
+    pending = {primary_task, hedge_task}
+    first_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    continue
+                if task is hedge_task:
+                    policy.record_hedge_win()
+                return task.result()
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def build_hedge_policy(hedging_config: dict, llm_provider: str) -> HedgePolicy | None:
+    if not hedging_config.get("enabled", False):
+        return None
+    return HedgePolicy(
+        percentile=hedging_config.get("percentile", 95),
+        window=hedging_config.get("window", 200),
+        min_samples=hedging_config.get("min_samples", 20),
+        max_hedge_rate=hedging_config.get("max_hedge_rate", 0.1),
+        model=hedging_config.get("models", {}).get(llm_provider),
+    )
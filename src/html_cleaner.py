@@ -1,26 +1,106 @@
 import re
 
+# Define tags where we want to preserve newlines
+PRESERVE_TAGS = ["pre", "textarea", "script", "style"]
+_PRESERVE_ALTERNATION = "|".join(PRESERVE_TAGS)
+
+_PRESERVE_SPLIT_RE = re.compile(
+    f"(<(?:{_PRESERVE_ALTERNATION}).*?</(?:{_PRESERVE_ALTERNATION})>)",
+    flags=re.DOTALL | re.IGNORECASE,
+)
+_PRESERVE_OPEN_RE = re.compile(f"<(?:{_PRESERVE_ALTERNATION})", re.IGNORECASE)
+_PRESERVE_CLOSE_RE = re.compile(f"</(?:{_PRESERVE_ALTERNATION})>", re.IGNORECASE)
+_NEWLINE_RUN_RE = re.compile(r"\s*\n\s*")
+# longest text that could still grow into a preserve open tag or close tag
+_OPEN_HOLDBACK = max(len(tag) for tag in PRESERVE_TAGS)
+_CLOSE_HOLDBACK = _OPEN_HOLDBACK + 2
 
-def strip_newlines_from_html(html_string):
-    # Define tags where we want to preserve newlines
-    preserve_tags = ["pre", "textarea", "script", "style"]
 
+def strip_newlines_from_html(html_string):
     # Split the HTML into segments based on preserve tags
-    segments = re.split(
-        f'(<(?:{"|".join(preserve_tags)}).*?</(?:{"|".join(preserve_tags)})>)',
-        html_string,
-        flags=re.DOTALL | re.IGNORECASE,
-    )
+    segments = _PRESERVE_SPLIT_RE.split(html_string)
 
-    # Process each segment
+    # Remove newlines from non-preserve segments
     for i in range(0, len(segments), 2):
-        # Remove newlines from non-preserve segments
-        segments[i] = re.sub(r"\s*\n\s*", " ", segments[i])
+        segments[i] = _NEWLINE_RUN_RE.sub(" ", segments[i])
 
     # Join the segments back together
     return "".join(segments)
 
 
+class StreamingHTMLCleaner:
+    """strip_newlines_from_html for text that arrives in chunks.
+
+    feed() returns the cleaned text that is final so far, and close() returns the
+    rest; joined together they equal strip_newlines_from_html on the whole input.
+    Trailing whitespace and anything that could be the start of a preserve tag
+    are held back until the next chunk decides them. A preserve block is held
+    until its closing tag arrives, since an unclosed one gets its newlines
+    stripped after all.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_preserve = False
+        # where to resume looking for the closing tag of the current preserve block
+        self._close_search_from = 0
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        output = []
+        while True:
+            if self._in_preserve:
+                close = _PRESERVE_CLOSE_RE.search(self._buffer, self._close_search_from)
+                if close is None:
+                    # a closing tag split across chunks starts in the last few chars
+                    self._close_search_from = max(
+                        self._close_search_from, len(self._buffer) - _CLOSE_HOLDBACK
+                    )
+                    break
+                output.append(self._buffer[: close.end()])
+                self._buffer = self._buffer[close.end() :]
+                self._in_preserve = False
+                continue
+
+            opening = _PRESERVE_OPEN_RE.search(self._buffer)
+            if opening is not None:
+                output.append(_NEWLINE_RUN_RE.sub(" ", self._buffer[: opening.start()]))
+                self._buffer = self._buffer[opening.start() :]
+                self._in_preserve = True
+                # the closing tag can't overlap the "<tag" that opened the block
+                self._close_search_from = opening.end() - opening.start()
+                continue
+
+            safe = self._safe_length()
+            output.append(_NEWLINE_RUN_RE.sub(" ", self._buffer[:safe]))
+            self._buffer = self._buffer[safe:]
+            break
+        return "".join(output)
+
+    def _safe_length(self) -> int:
+        """Length of the buffer that no later chunk can change the cleaning of."""
+        buffer = self._buffer
+        # a partial "<scr" at the end could still become a preserve tag
+        lt = buffer.rfind("<", max(0, len(buffer) - _OPEN_HOLDBACK))
+        if lt != -1 and any(
+            tag.startswith(buffer[lt + 1 :].lower()) for tag in PRESERVE_TAGS
+        ):
+            end = lt
+        else:
+            end = len(buffer)
+        # a trailing whitespace run may still gain a newline
+        while end > 0 and buffer[end - 1].isspace():
+            end -= 1
+        return end
+
+    def close(self) -> str:
+        # an unclosed preserve block is ordinary text, exactly as in the split regex
+        rest = strip_newlines_from_html(self._buffer)
+        self._buffer = ""
+        self._in_preserve = False
+        return rest
+
+
 if __name__ == "__main__":
     test_str = '<!DOCTYPE html>\n<html>\n<head>\n    <title>Social Security Analysis for R Hall and R Munster</title>\n</head>\n<body>\n    <header>\n        <h1>Social Security Analysis for R Hall and R Munster</h1>\n    </header>\n    \n    <main>\n        <section>\n            <h2>1. Work History and Earnings Summary</h2>\n            <table>\n                <thead>\n                    <tr>\n                        <th>Individual</th>\n                        <th>Total Years Worked</th>\n                        <th>Total Lifetime Earnings</th>\n                        <th>Primary Insurance Amount (PIA)</th>\n                        <th>Average Annual Earnings</th>\n                    </tr>\n                </thead>\n                <tbody>\n                    <tr>\n                        <td>R Hall (Primary Beneficiary)</td>\n                        <td>1 year</td>\n                        <td>$50,000.00</td>\n                        <td>$390.60</td>\n                        <td>$50,000.00</td>\n                    </tr>\n                    <tr>\n                        <td>R Munster (Spouse)</td>\n                        <td>1 year</td>\n                        <td>$60,000.00</td>\n                        <td>$282.60</td>\n                        <td>$60,000.00</td>\n                    </tr>\n                </tbody>\n            </table>\n        </section>\n\n        <section>\n            <h2>2. Estimated Social Security Benefits Analysis</h2>\n            <p>Both R Hall and R Munster have limited work history, with only one year of earnings each. Their estimated Social Security benefits are as follows:</p>\n            <ul>\n                <li><strong>R Hall (Primary Beneficiary):</strong> At their full retirement age (FRA) of 67, R Hall\'s estimated monthly benefit is $390.60. This is calculated based on their total lifetime earnings and the average indexed monthly earnings (AIME). Since they have worked for only one year, their benefit amount is relatively low.</li>\n                <li><strong>R Munster (Spouse):</strong> Similarly, R Munster\'s FRA is also 67, and their estimated monthly benefit is $282.60. This amount is based on their sole year of earnings.</li>\n            </ul>\n\n            <h3>Spousal Benefits</h3>\n            <p>According to the Social Security Administration\'s rules on <a href="https://www.ssa.gov/planners/spouse/spouseben2.html">spousal benefits</a>, R Munster may be eligible for spousal benefits based on R Hall\'s work record. If R Munster\'s benefit based on their own work is less than half of R Hall\'s full retirement benefit, they can receive the difference to bring their benefit up to half of R Hall\'s amount. However, this is only applicable if R Munster starts claiming benefits at their full retirement age or later.</p>\n        </section>\n\n        <section>\n            <h2>3. Recommendations for Optimizing Benefits</h2>\n            <p>Given their limited work history, R Hall and R Munster should consider the following strategies to optimize their Social Security benefits:</p>\n            <ol>\n                <li><strong>Delay Claiming Benefits:</strong> Both individuals should consider delaying their benefit claims until their full retirement age or even longer. For each year they delay claiming benefits beyond their FRA, their benefit amount will increase by a certain percentage, known as the <a href="https://www.ssa.gov/planners/retire/delayret.html">delayed retirement credit</a>. This can result in a higher monthly benefit for life.</li>\n                <li><strong>Spousal Benefits Strategy:</strong> R Munster should carefully evaluate the timing of their benefit claim to maximize spousal benefits. If R Hall claims benefits at their FRA, R Munster can claim spousal benefits at their FRA while allowing their own benefit to continue growing until age 70. This strategy ensures that R Munster receives the highest possible benefit based on their own work record while also benefiting from spousal benefits.</li>\n                <li><strong>Explore Other Income Sources:</strong> Given their low total lifetime earnings, R Hall and R Munster might consider exploring other income sources or part-time work opportunities to supplement their Social Security benefits. This could help them maintain a more comfortable standard of living during retirement.</li>\n            </ol>\n        </section>\n\n        <section>\n            <h2>4. Insights Related to Dependents</h2>\n            <p>The couple has a child, Bill, who is disabled. According to the Social Security Administration\'s <a href="https://www.ssa.gov/pubs/EN-05-10086.pdf">rules on benefits for children</a>, a disabled child can receive benefits based on a parent\'s work record. Bill may be eligible for benefits until he reaches the age of 18 (or 19 if still attending primary or secondary school). If Bill\'s disability continues after that age, he may be eligible for continued benefits as an adult disabled child.</p>\n        </section>\n\n        <section>\n            <h2>5. Relevant Rules and References</h2>\n            <ul>\n                <li>Social Security Administration: <a href="https://www.ssa.gov/planners/retire/retirechart.html">Full Retirement Age and Delayed Retirement Credits</a></li>\n                <li>Social Security Administration: <a href="https://www.ssa.gov/planners/spouse/">Benefits for Spouses</a></li>\n                <li>Social Security Administration: <a href="https://www.ssa.gov/pubs/EN-05-10086.pdf">Benefits for Children with Disabilities</a></li>\n            </ul>\n        </section>\n    </main>\n</body>\n</html>'
 
@@ -0,0 +1,161 @@
+import re
+import threading
+
+from bs4 import BeautifulSoup
+
+from src.html_cleaner import strip_newlines_from_html
+from src.logging_config import get_logger
+from src.valid_html import (
+    NotValidHTMLException,
+    check_basic_structure,
+    is_unclosed_tag,
+)
+
+logger = get_logger(__name__)
+
+# ```html ... ``` around the whole report; after newline stripping the fences sit
+# inline at either end
+_LEADING_FENCE_RE = re.compile(r"^\s*```[A-Za-z]*\s*")
+_TRAILING_FENCE_RE = re.compile(r"\s*```\s*$")
+# empty cells are kept (with a non-breaking space) so table columns stay aligned
+_PLACEHOLDER_TAGS = frozenset({"td", "th"})
+PLACEHOLDER_ALT = "Image"
+
+FAILURE_TYPES = (
+    "markdown_fence",
+    "missing_html",
+    "missing_body",
+    "unclosed_tags",
+    "missing_alt",
+    "parse_error",
+)
+
+
+def failure_type(validation_message: str) -> str:
+    """Map a validator failure message to one of FAILURE_TYPES."""
+    if validation_message.startswith("Missing <html>"):
+        return "missing_html"
+    if validation_message.startswith("Missing <body>"):
+        return "missing_body"
+    if validation_message.startswith("Unclosed tags"):
+        return "unclosed_tags"
+    if validation_message.startswith("Images missing alt"):
+        return "missing_alt"
+    return "parse_error"
+
+
+def strip_markdown_fences(html_string: str) -> str:
+    return _TRAILING_FENCE_RE.sub("", _LEADING_FENCE_RE.sub("", html_string, 1), 1)
+
+
+def repair_html(html_string: str):
+    """Return (repaired html, names of the fixes applied).
+
+    html5lib parses the report into a tree, which closes every open element and
+    adds html, head and body; empty elements are then removed (table cells get a
+    non-breaking space instead) and images get placeholder alt text.
+    """
+    fixes = []
+    structure_valid, _ = check_basic_structure(html_string)
+    if not structure_valid:
+        fixes.append("wrappers")
+
+    soup = BeautifulSoup(html_string, "html5lib")
+
+    removed = filled = 0
+    # removing an element can leave its parent empty, so repeat until none are left
+    while True:
+        empty_tags = soup.find_all(is_unclosed_tag)
+        if not empty_tags:
+            break
+        for tag in empty_tags:
+            if tag.name in _PLACEHOLDER_TAGS:
+                tag.string = " "
+                filled += 1
+            else:
+                tag.decompose()
+                removed += 1
+    if removed or filled:
+        fixes.append("empty_elements")
+
+    imgs_without_alt = soup.find_all("img", alt=lambda x: not x)
+    for img in imgs_without_alt:
+        img["alt"] = PLACEHOLDER_ALT
+    if imgs_without_alt:
+        fixes.append("img_alt")
+
+    # the serializer puts a newline after the doctype
+    return strip_newlines_from_html(str(soup)), fixes
+
+
+def run_validator(validate_html, html_string: str):
+    """Call a validator, returning its NotValidHTMLException as a (False, message) result."""
+    try:
+        return validate_html(html_string)
+    except NotValidHTMLException as e:
+        return False, str(e)
+
+
+class RepairStats:
+    """Counts of repair attempts and successes per failure type, for /repair/stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = {
+            name: {"attempts": 0, "repaired": 0} for name in FAILURE_TYPES
+        }
+        self._fixes = {}
+
+    def record(self, failure: str, fixes: list, repaired: bool):
+        with self._lock:
+            counts = self._failures[failure]
+            counts["attempts"] += 1
+            counts["repaired"] += repaired
+            for fix in fixes:
+                self._fixes[fix] = self._fixes.get(fix, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            failures = {name: dict(counts) for name, counts in self._failures.items()}
+            fixes = dict(self._fixes)
+        attempts = sum(counts["attempts"] for counts in failures.values())
+        repaired = sum(counts["repaired"] for counts in failures.values())
+        return {
+            "attempts": attempts,
+            "repaired": repaired,
+            "repair_rate": repaired / attempts if attempts else 0.0,
+            "by_failure": failures,
+            "fixes_applied": fixes,
+        }
+
+
+repair_stats = RepairStats()
+
+
+def validate_with_repair(html_string: str, validate_html, result=None):
+    """Validate a cleaned report, repairing it locally when it fails.
+
+    `result` is a validation result for html_string computed already (the
+    streaming validator's); it is reused unless fence stripping changed the text.
+    Returns (html, validated, validation_message); when the repair doesn't help,
+    the unrepaired html and the original failure come back.
+    """
+    stripped = strip_markdown_fences(html_string)
+    fenced = stripped != html_string
+    if fenced or result is None:
+        result = run_validator(validate_html, stripped)
+    validated, validation_message = result
+    if validated:
+        if fenced:
+            repair_stats.record("markdown_fence", ["markdown_fence"], True)
+        return stripped, True, validation_message
+
+    failure = failure_type(validation_message)
+    repaired, fixes = repair_html(stripped)
+    validated, message = run_validator(validate_html, repaired)
+    repair_stats.record(failure, ["markdown_fence"] * fenced + fixes, validated)
+    if validated:
+        logger.info(f"Repaired HTML that failed validation ({failure}): {fixes}")
+        return repaired, True, message
+    logger.warning(f"HTML repair did not fix {failure}: {message}")
+    return stripped, False, validation_message
@@ -0,0 +1,292 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStore:
+    """Jobs persisted in sqlite so they survive worker restarts and are shared across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, "
+                "result TEXT, http_status INTEGER, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "worker TEXT, created_at REAL NOT NULL, started_at REAL, "
+                "finished_at REAL, not_before REAL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "not_before" not in columns:
+                # files created before retries were delayed
+                conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)"
+            )
+
+    def _connect(self):
+        # sqlite connections can't cross threads or forks, so keep one per thread and pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload), time.time()),
+        )
+        return job_id
+
+    def claim(self, worker: str):
+        """Atomically move the oldest queued job that is due to running.
+
+        Returns (job_id, payload), or None when no job is due.
+        """
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front so two workers can't claim the same job
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = ? "
+                "AND (not_before IS NULL OR not_before <= ?) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, time.time()),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, finished_at = NULL, "
+                "attempts = attempts + 1, worker = ? WHERE id = ?",
+                (RUNNING, time.time(), worker, row[0]),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0], json.loads(row[1])
+
+    def complete(self, job_id: str, result: dict, http_status: int):
+        status = SUCCEEDED if http_status < 400 else FAILED
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, http_status = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result), http_status, time.time(), job_id),
+        )
+
+    def fail(
+        self, job_id: str, error: str, max_attempts: int, retry_backoff: float = 0
+    ):
+        """Record an exception, requeueing the job until it runs out of attempts.
+
+        A requeued job isn't claimed again for retry_backoff seconds, doubled for
+        each attempt it has already used, so an outage doesn't burn every attempt
+        within a second.
+        """
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "error = ?, finished_at = ?, "
+            "not_before = ? + ? * (1 << (MAX(attempts, 1) - 1)) WHERE id = ?",
+            (max_attempts, QUEUED, FAILED, error, now, now, retry_backoff, job_id),
+        )
+
+    def requeue_stale(self, lease_seconds: float, max_attempts: int) -> int:
+        # a running job whose lease expired belonged to a worker that died or restarted;
+        # like fail(), stop once it runs out of attempts, in case it is what kills them
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "error = ?, finished_at = ? WHERE status = ? AND started_at < ?",
+            (
+                max_attempts,
+                QUEUED,
+                FAILED,
+                "lease expired",
+                now,
+                RUNNING,
+                now - lease_seconds,
+            ),
+        )
+        return cursor.rowcount
+
+    def queue_depth(self) -> int:
+        return (
+            self._connect()
+            .execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,))
+            .fetchone()[0]
+        )
+
+    def get(self, job_id: str) -> dict | None:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT id, status, result, http_status, error, attempts, created_at, "
+            "started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        (
+            job_id,
+            status,
+            result,
+            http_status,
+            error,
+            attempts,
+            created_at,
+            started_at,
+            finished_at,
+        ) = row
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": status,
+            "attempts": attempts,
+            "queue_depth": self.queue_depth(),
+            "wait_seconds": round((started_at or now) - created_at, 3),
+            "run_seconds": (
+                round((finished_at or now) - started_at, 3) if started_at else None
+            ),
+        }
+        if status == QUEUED:
+            job["queue_position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                (QUEUED, created_at),
+            ).fetchone()[0]
+        if result is not None:
+            job["http_status"] = http_status
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+
+class JobWorkerPool:
+    """Background threads that pull jobs off the store and run them through a handler."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler,
+        num_workers: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 600,
+        max_attempts: int = 3,
+        retry_backoff: float = 30,
+    ):
+        self.store = store
+        self.handler = handler
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        requeued = self.store.requeue_stale(self.lease_seconds, self.max_attempts)
+        if requeued:
+            logger.info(f"Released {requeued} jobs with expired leases")
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"job-worker-{os.getpid()}-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.debug(f"Started {self.num_workers} job workers")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        """Wake an idle worker instead of waiting for the next poll."""
+        self._wake.set()
+
+    def _run(self):
+        worker = threading.current_thread().name
+        while not self._stop.is_set():
+            try:
+                claimed = self.store.claim(worker)
+            except sqlite3.Error as e:
+                logger.error(f"Job claim failed: {str(e)}")
+                claimed = None
+
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                try:
+                    self.store.requeue_stale(self.lease_seconds, self.max_attempts)
+                except sqlite3.Error as e:
+                    logger.error(f"Releasing expired job leases failed: {str(e)}")
+                continue
+
+            job_id, payload = claimed
+            logger.info(f"{worker} running job {job_id}")
+            try:
+                result, http_status = self.handler(payload)
+            except Exception as e:
+                self._fail(job_id, e)
+                continue
+            try:
+                self.store.complete(job_id, result, http_status)
+            except sqlite3.Error as e:
+                # "database is locked" with workers in every process on one file; the
+                # lease expiring runs the job again rather than losing it
+                logger.error(f"Storing the result of job {job_id} failed: {str(e)}")
+            except Exception as e:
+                # a result that can't be stored, e.g. one that isn't JSON serializable
+                self._fail(job_id, e)
+
+    def _fail(self, job_id: str, error: Exception):
+        logger.error(f"Job {job_id} failed: {str(error)}")
+        try:
+            self.store.fail(job_id, str(error), self.max_attempts, self.retry_backoff)
+        except sqlite3.Error as e:
+            # the lease expiring puts the job back on the queue
+            logger.error(f"Recording the failure of job {job_id} failed: {str(e)}")
+
+
+def build_job_pool(jobs_config: dict, handler) -> JobWorkerPool | None:
+    if not jobs_config.get("enabled", False):
+        logger.debug("Job queue disabled")
+        return None
+
+    store = JobStore(jobs_config.get("sqlite_path", "cache/jobs.sqlite3"))
+    logger.debug(f"Using job queue config: {jobs_config}")
+    return JobWorkerPool(
+        store,
+        handler,
+        num_workers=jobs_config.get("workers", 2),
+        poll_interval=jobs_config.get("poll_interval_seconds", 1.0),
+        lease_seconds=jobs_config.get("lease_seconds", 600),
+        max_attempts=jobs_config.get("max_attempts", 3),
+        retry_backoff=jobs_config.get("retry_backoff_seconds", 30),
+    )
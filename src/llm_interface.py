@@ -1,28 +1,102 @@
+import contextvars
+import copy
+import importlib
+import json
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
 from os import system
-from typing import Any
-
-import anthropic
-import cohere
-from openai import OpenAI
+from typing import Any, AsyncIterator, Iterator
 
 from src.config_manager import ConfigManager
-from src.logging_config import get_logger
+from src.health_monitor import CircuitOpenError, build_circuit_breaker
+from src.hedging import async_hedged_call, build_hedge_policy, hedged_call
+from src.logging_config import get_logger, truncate_payload
+from src.metrics import (
+    observe_provider_request,
+    record_characters,
+    record_retry,
+    record_token_usage,
+)
+from src.report_renderer import REPORT_SCHEMA
 
 
 logger = get_logger(__name__)
 
+# (provider, model) that served this context's last analyze: the hedge model when
+# the hedge won; a contextvar since concurrent requests share provider instances
+_served_by = contextvars.ContextVar("served_by", default=None)
+
+# Anthropic has no JSON mode; forcing this tool makes the reply its arguments
+REPORT_TOOL = {
+    "name": "write_report",
+    "description": "Write the Social Security report sections.",
+    "input_schema": REPORT_SCHEMA,
+}
+
 
 class BaseAIProvider(ABC):
-    def __init__(self, config_manager: ConfigManager):
+    # module of the provider's SDK, imported only once a client is needed
+    sdk_module = None
+
+    def __init__(self, config_manager: ConfigManager, llm_provider: str | None = None):
         self.manager = config_manager
-        self.llm_provider = self.manager.llm_provider_name
-        self.api_key = self.manager.api_key
-        self.model = self.manager.model
-        self.llm_config = self.manager.llm_config
-        self.client = self._create_client()
+        # the router builds one instance per provider, otherwise use the configured one
+        self.llm_provider = llm_provider or self.manager.llm_provider_name
+        self.api_key = self.manager.get_api_key(self.llm_provider)
+        self.llm_config = self.manager.get_llm_config(self.llm_provider)
+        self.model = self.llm_config["model"]
+        self.hedge_policy = build_hedge_policy(
+            self.manager.hedging_config, self.llm_provider
+        )
+        self.breaker = build_circuit_breaker(self.manager.health_config)
+        # the client is created on first use in each process, see the client property
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
         logger.debug("Instantiated BaseAIProvider class")
 
+    def _sdk(self):
+        return importlib.import_module(self.sdk_module)
+
+    @property
+    def client(self) -> Any:
+        # lazy, so startup doesn't import SDKs for providers that are never called, and
+        # per pid, so a worker forked from a preloaded gunicorn master builds its own
+        # connection pool instead of sharing the parent's sockets
+        if self._client_pid != os.getpid():
+            with self._client_lock:
+                if self._client_pid != os.getpid():
+                    self._client = self._create_client()
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def preload(self):
+        """Import the SDK before forking, so workers share it instead of each importing it."""
+        # a throwaway client also pulls in the SDK's lazily imported modules; it
+        # opens no connection until the first request, so nothing leaks into a fork
+        self._create_client()
+
+    def probe(self, timeout: float):
+        """A cheap authenticated call that opens a connection; by default just build the client."""
+        self.client
+
+    def warm_up(self, timeout: float = 5.0):
+        """Create this process's client and open a connection before it takes traffic."""
+        started = time.perf_counter()
+        try:
+            self.probe(timeout)
+        except Exception as e:
+            # a failed warm-up only costs the first request its connection setup
+            logger.warning(f"Warm-up of {self.llm_provider} failed: {str(e)}")
+            self._record_call(False, e)
+            return
+        self._record_call(True)
+        logger.info(
+            f"Warmed up {self.llm_provider} in {time.perf_counter() - started:.3f}s"
+        )
+
     @abstractmethod
     def _create_client(self) -> Any:
         pass
@@ -31,13 +105,25 @@ class BaseAIProvider(ABC):
     def _send_request(self, messages) -> Any:
         pass
 
+    @abstractmethod
+    def _stream_request(self, messages) -> Iterator[str]:
+        pass
+
+    def _send_structured_request(self, messages) -> Any:
+        """Request a JSON report; without a provider JSON mode the prompt asks for it."""
+        return self._send_request(messages)
+
+    @staticmethod
+    def _request_method(structured: bool) -> str:
+        return "_send_structured_request" if structured else "_send_request"
+
     def _create_messages(self, system_content, user_content):
         return [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_content},
         ]
 
-    def analyze(self, query, context):
+    def _create_analysis_messages(self, query, context):
         system_content = (
             "You are a helpful assistant that analyzes social security data."
         )
@@ -46,33 +132,173 @@ class BaseAIProvider(ABC):
         Context: {context}
         Query: {query}
         """
-        messages = self._create_messages(system_content, user_content)
-        req = self._send_request(messages)
+        return self._create_messages(system_content, user_content)
+
+    def _hedge_target(self):
+        """Provider the hedged request goes to: this one, or a copy on the hedge model."""
+        if self.hedge_policy.model is None or self.hedge_policy.model == self.model:
+            return self
+        # shallow copy so the hedge shares the client (and its connection pool);
+        # create it first, or the copy would build its own
+        self.client
+        target = copy.copy(self)
+        target.model = self.hedge_policy.model
+        return target
+
+    def _check_breaker(self):
+        # shed the call at once instead of waiting on a provider that keeps failing
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError(
+                f"Circuit open for {self.llm_provider}: {self.breaker.last_error}"
+            )
+
+    def _record_call(self, ok: bool, error: Exception | None = None):
+        if self.breaker is not None:
+            self.breaker.record(ok, error)
+
+    def _guarded_stream(self, deltas):
+        started = time.perf_counter()
+        try:
+            yield from deltas
+        except Exception as e:
+            self._record_call(False, e)
+            self._observe("_stream_request", False, started)
+            raise
+        self._record_call(True)
+        self._observe("_stream_request", True, started)
+
+    def _observe(self, method: str, ok: bool, started: float):
+        observe_provider_request(
+            self.llm_provider, self.model, method, ok, time.perf_counter() - started
+        )
+
+    def _timed_request(self, method: str, messages):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = getattr(self, method)(messages)
+            ok = True
+            return result
+        finally:
+            self._observe(method, ok, started)
+
+    def _usage(self, usage, input_field: str, output_field: str):
+        """Count the tokens a response's usage object reports; missing fields count nothing."""
+        record_token_usage(
+            self.llm_provider,
+            self.model,
+            getattr(usage, input_field, None),
+            getattr(usage, output_field, None),
+        )
+
+    def _served_request(self, method: str, messages):
+        """_timed_request, plus the model that answered it."""
+        return self.model, self._timed_request(method, messages)
+
+    def _hedge(self, hedge_target, method: str, messages):
+        record_retry("hedge", self.llm_provider)
+        return hedge_target._served_request(method, messages)
+
+    def analyze(self, query, context, structured=False):
+        self._check_breaker()
+        messages = self._create_analysis_messages(query, context)
+        method = self._request_method(structured)
+        try:
+            if self.hedge_policy is None:
+                served_model, req = self._served_request(method, messages)
+            else:
+                hedge_target = self._hedge_target()
+                served_model, req = hedged_call(
+                    self.hedge_policy,
+                    lambda: self._served_request(method, messages),
+                    lambda: self._hedge(hedge_target, method, messages),
+                )
+        except Exception as e:
+            self._record_call(False, e)
+            raise
+        self._record_call(True)
+        _served_by.set((self.llm_provider, served_model))
+        len_of_input = sum(len(msg["content"]) for msg in messages)
+        record_characters(self.llm_provider, len_of_input, len(req))
         # return the output, plus the count of input and output chars for token approximation
-        return req, len(system_content + user_content), len(req)
+        return req, len_of_input, len(req)
+
+    def served_by(self):
+        """Return (provider, model) that served the last call in this context."""
+        return _served_by.get() or (self.llm_provider, self.model)
+
+    def stream_analyze(self, query, context):
+        """Return a generator of text deltas, plus the count of input chars."""
+        self._check_breaker()
+        _served_by.set((self.llm_provider, self.model))
+        messages = self._create_analysis_messages(query, context)
+        return self._guarded_stream(self._stream_request(messages)), sum(
+            len(msg["content"]) for msg in messages
+        )
 
 
 class OpenAIProvider(BaseAIProvider):
-    def __init__(self, config_manager: ConfigManager):
-        super().__init__(config_manager)
+    sdk_module = "openai"
+
+    def __init__(self, config_manager: ConfigManager, llm_provider: str | None = None):
+        super().__init__(config_manager, llm_provider)
         logger.debug("Instantiated OpenAIProvider class")
 
     def _create_client(self):
-        return OpenAI(api_key=self.api_key)
+        return self._sdk().OpenAI(api_key=self.api_key)
+
+    def probe(self, timeout: float):
+        # with_options shares the client's connection pool, so the connection stays warm
+        self.client.with_options(max_retries=0).models.retrieve(
+            self.model, timeout=timeout
+        )
 
     def _send_request(self, messages):
         response = self.client.chat.completions.create(
             model=self.model, messages=messages
         )
+        self._usage(response.usage, "prompt_tokens", "completion_tokens")
         return response.choices[0].message.content
 
+    def _send_structured_request(self, messages):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+        )
+        self._usage(response.usage, "prompt_tokens", "completion_tokens")
+        return response.choices[0].message.content
+
+    def _stream_request(self, messages):
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    self._usage(chunk.usage, "prompt_tokens", "completion_tokens")
+        finally:
+            stream.close()
+
 
 class CohereAIProvider(BaseAIProvider):
-    def __init__(self, config_manager: ConfigManager):
-        super().__init__(config_manager)
+    sdk_module = "cohere"
+
+    def __init__(self, config_manager: ConfigManager, llm_provider: str | None = None):
+        super().__init__(config_manager, llm_provider)
 
     def _create_client(self) -> Any:
-        return cohere.Client(api_key=self.api_key)
+        return self._sdk().Client(api_key=self.api_key)
+
+    def probe(self, timeout: float):
+        self.client.check_api_key(
+            request_options={"timeout_in_seconds": int(timeout), "max_retries": 0}
+        )
 
     def _send_request(self, messages) -> Any:
         formatted_message = "\n".join(
@@ -82,15 +308,61 @@ class CohereAIProvider(BaseAIProvider):
             message=formatted_message,
         )
 
+        self._usage(
+            getattr(response.meta, "billed_units", None), "input_tokens", "output_tokens"
+        )
+        return response.text
+
+    def _send_structured_request(self, messages) -> Any:
+        formatted_message = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in messages]
+        )
+        response = self.client.chat(
+            message=formatted_message,
+            response_format={"type": "json_object", "schema": REPORT_SCHEMA},
+        )
+
+        self._usage(
+            getattr(response.meta, "billed_units", None), "input_tokens", "output_tokens"
+        )
         return response.text
 
+    def _stream_request(self, messages):
+        formatted_message = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in messages]
+        )
+        for event in self.client.chat_stream(message=formatted_message):
+            if event.event_type == "text-generation":
+                yield event.text
+            elif event.event_type == "stream-end":
+                self._usage(
+                    getattr(event.response.meta, "billed_units", None),
+                    "input_tokens",
+                    "output_tokens",
+                )
+
+
+def _tool_input_json(response) -> str:
+    for block in response.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input)
+    logger.warning("No tool call found in Anthropic API response")
+    return "No content found in response"
+
 
 class AnthropicAIProvider(BaseAIProvider):
-    def __init__(self, config_manager: ConfigManager):
-        super().__init__(config_manager)
+    sdk_module = "anthropic"
+
+    def __init__(self, config_manager: ConfigManager, llm_provider: str | None = None):
+        super().__init__(config_manager, llm_provider)
 
     def _create_client(self) -> Any:
-        return anthropic.Anthropic(api_key=self.api_key)
+        return self._sdk().Anthropic(api_key=self.api_key)
+
+    def probe(self, timeout: float):
+        self.client.with_options(max_retries=0).models.retrieve(
+            self.model, timeout=timeout
+        )
 
     def _send_request(self, messages):
         system_message = next(
@@ -101,24 +373,338 @@ class AnthropicAIProvider(BaseAIProvider):
         logger.debug(
             f"Sending request to Anthropic API. System message: {system_message}"
         )
-        logger.debug(f"User messages: {user_messages}")
+        logger.debug(f"User messages: {truncate_payload(user_messages)}")
 
         try:
             response = self.client.messages.create(
                 model=self.model,
-                max_tokens=self.manager.llm_config["max_tokens"],
-                temperature=self.manager.llm_config["temperature"],
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
                 system=system_message,
                 messages=user_messages,
             )
 
-            logger.debug(f"Received response from Anthropic API: {response}")
+            logger.debug(
+                f"Received response from Anthropic API: {truncate_payload(response)}"
+            )
+
+            self._usage(response.usage, "input_tokens", "output_tokens")
+            if response.content and len(response.content) > 0:
+                return response.content[0].text
+            else:
+                logger.warning("No content found in Anthropic API response")
+                return "No content found in response"
+        except self._sdk().APIError as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
+
+    def _send_structured_request(self, messages):
+        system_message = next(
+            (msg["content"] for msg in messages if msg["role"] == "system"), None
+        )
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
+                system=system_message,
+                messages=user_messages,
+                tools=[REPORT_TOOL],
+                tool_choice={"type": "tool", "name": REPORT_TOOL["name"]},
+            )
+            self._usage(response.usage, "input_tokens", "output_tokens")
+            return _tool_input_json(response)
+        except self._sdk().APIError as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
+
+    def _stream_request(self, messages):
+        system_message = next(
+            (msg["content"] for msg in messages if msg["role"] == "system"), None
+        )
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+
+        logger.debug(
+            f"Streaming request to Anthropic API. System message: {system_message}"
+        )
+
+        try:
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
+                system=system_message,
+                messages=user_messages,
+            ) as stream:
+                yield from stream.text_stream
+                final = stream.get_final_message()
+                self._usage(final.usage, "input_tokens", "output_tokens")
+        except self._sdk().APIError as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
+
+
+class AsyncBaseAIProvider(BaseAIProvider):
+    """Asyncio counterpart of BaseAIProvider, used by the ASGI app in src/asgi.py."""
+
+    @abstractmethod
+    async def _send_request(self, messages) -> Any:
+        pass
+
+    @abstractmethod
+    def _stream_request(self, messages) -> AsyncIterator[str]:
+        pass
+
+    async def _send_structured_request(self, messages) -> Any:
+        return await self._send_request(messages)
+
+    async def probe(self, timeout: float):
+        self.client
+
+    async def warm_up(self, timeout: float = 5.0):
+        """Create this process's client and open a connection on the serving event loop."""
+        started = time.perf_counter()
+        try:
+            await self.probe(timeout)
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.llm_provider} failed: {str(e)}")
+            self._record_call(False, e)
+            return
+        self._record_call(True)
+        logger.info(
+            f"Warmed up {self.llm_provider} in {time.perf_counter() - started:.3f}s"
+        )
+
+    async def _guarded_stream(self, deltas):
+        started = time.perf_counter()
+        try:
+            async for delta in deltas:
+                yield delta
+        except Exception as e:
+            self._record_call(False, e)
+            self._observe("_stream_request", False, started)
+            raise
+        finally:
+            await deltas.aclose()
+        self._record_call(True)
+        self._observe("_stream_request", True, started)
+
+    async def _timed_request(self, method: str, messages):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = await getattr(self, method)(messages)
+            ok = True
+            return result
+        finally:
+            self._observe(method, ok, started)
+
+    async def _served_request(self, method: str, messages):
+        return self.model, await self._timed_request(method, messages)
+
+    async def _hedge(self, hedge_target, method: str, messages):
+        record_retry("hedge", self.llm_provider)
+        return await hedge_target._served_request(method, messages)
+
+    async def analyze(self, query, context, structured=False):
+        self._check_breaker()
+        messages = self._create_analysis_messages(query, context)
+        method = self._request_method(structured)
+        try:
+            if self.hedge_policy is None:
+                served_model, req = await self._served_request(method, messages)
+            else:
+                hedge_target = self._hedge_target()
+                served_model, req = await async_hedged_call(
+                    self.hedge_policy,
+                    lambda: self._served_request(method, messages),
+                    lambda: self._hedge(hedge_target, method, messages),
+                )
+        except Exception as e:
+            self._record_call(False, e)
+            raise
+        self._record_call(True)
+        _served_by.set((self.llm_provider, served_model))
+        len_of_input = sum(len(msg["content"]) for msg in messages)
+        record_characters(self.llm_provider, len_of_input, len(req))
+        return req, len_of_input, len(req)
+
+
+class AsyncOpenAIProvider(AsyncBaseAIProvider):
+    sdk_module = "openai"
+
+    def _create_client(self):
+        return self._sdk().AsyncOpenAI(api_key=self.api_key)
+
+    async def probe(self, timeout: float):
+        await self.client.with_options(max_retries=0).models.retrieve(
+            self.model, timeout=timeout
+        )
+
+    async def _send_request(self, messages):
+        response = await self.client.chat.completions.create(
+            model=self.model, messages=messages
+        )
+        self._usage(response.usage, "prompt_tokens", "completion_tokens")
+        return response.choices[0].message.content
+
+    async def _send_structured_request(self, messages):
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+        )
+        self._usage(response.usage, "prompt_tokens", "completion_tokens")
+        return response.choices[0].message.content
+
+    async def _stream_request(self, messages):
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    self._usage(chunk.usage, "prompt_tokens", "completion_tokens")
+        finally:
+            await stream.close()
+
+
+class AsyncCohereAIProvider(AsyncBaseAIProvider):
+    sdk_module = "cohere"
+
+    def _create_client(self) -> Any:
+        return self._sdk().AsyncClient(api_key=self.api_key)
+
+    async def probe(self, timeout: float):
+        await self.client.check_api_key(
+            request_options={"timeout_in_seconds": int(timeout), "max_retries": 0}
+        )
+
+    async def _send_request(self, messages) -> Any:
+        formatted_message = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in messages]
+        )
+        response = await self.client.chat(
+            message=formatted_message,
+        )
+
+        self._usage(
+            getattr(response.meta, "billed_units", None), "input_tokens", "output_tokens"
+        )
+        return response.text
+
+    async def _send_structured_request(self, messages) -> Any:
+        formatted_message = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in messages]
+        )
+        response = await self.client.chat(
+            message=formatted_message,
+            response_format={"type": "json_object", "schema": REPORT_SCHEMA},
+        )
+
+        self._usage(
+            getattr(response.meta, "billed_units", None), "input_tokens", "output_tokens"
+        )
+        return response.text
+
+    async def _stream_request(self, messages):
+        formatted_message = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in messages]
+        )
+        async for event in self.client.chat_stream(message=formatted_message):
+            if event.event_type == "text-generation":
+                yield event.text
+            elif event.event_type == "stream-end":
+                self._usage(
+                    getattr(event.response.meta, "billed_units", None),
+                    "input_tokens",
+                    "output_tokens",
+                )
+
 
+class AsyncAnthropicAIProvider(AsyncBaseAIProvider):
+    sdk_module = "anthropic"
+
+    def _create_client(self) -> Any:
+        return self._sdk().AsyncAnthropic(api_key=self.api_key)
+
+    async def probe(self, timeout: float):
+        await self.client.with_options(max_retries=0).models.retrieve(
+            self.model, timeout=timeout
+        )
+
+    async def _send_request(self, messages):
+        system_message = next(
+            (msg["content"] for msg in messages if msg["role"] == "system"), None
+        )
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+
+        try:
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
+                system=system_message,
+                messages=user_messages,
+            )
+
+            self._usage(response.usage, "input_tokens", "output_tokens")
             if response.content and len(response.content) > 0:
                 return response.content[0].text
             else:
                 logger.warning("No content found in Anthropic API response")
                 return "No content found in response"
-        except anthropic.APIError as e:
+        except self._sdk().APIError as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
+
+    async def _send_structured_request(self, messages):
+        system_message = next(
+            (msg["content"] for msg in messages if msg["role"] == "system"), None
+        )
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+
+        try:
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
+                system=system_message,
+                messages=user_messages,
+                tools=[REPORT_TOOL],
+                tool_choice={"type": "tool", "name": REPORT_TOOL["name"]},
+            )
+            self._usage(response.usage, "input_tokens", "output_tokens")
+            return _tool_input_json(response)
+        except self._sdk().APIError as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
+
+    async def _stream_request(self, messages):
+        system_message = next(
+            (msg["content"] for msg in messages if msg["role"] == "system"), None
+        )
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+
+        try:
+            async with self.client.messages.stream(
+                model=self.model,
+                max_tokens=self.llm_config["max_tokens"],
+                temperature=self.llm_config["temperature"],
+                system=system_message,
+                messages=user_messages,
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final = await stream.get_final_message()
+                self._usage(final.usage, "input_tokens", "output_tokens")
+        except self._sdk().APIError as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
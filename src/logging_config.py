@@ -1,13 +1,164 @@
+import atexit
+import hashlib
 import logging
+import os
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
 from pythonjsonlogger import jsonlogger
 
+# cap for truncate_payload, set from logging.max_payload_chars by setup_logging
+_max_payload_chars = 1000
+_handlers = []
+_queue_handler = None
+_listener = None
 
-def setup_logging(log_file="app.log"):
+
+def truncate_payload(value, max_chars: int | None = None) -> str:
+    """The value as text, cut to max_chars with its full length and a hash appended.
+
+    The hash still ties a truncated export, prompt or response in the logs to the
+    original.
+    """
+    max_chars = _max_payload_chars if max_chars is None else max_chars
+    raw = value if isinstance(value, bytes) else str(value).encode("utf-8", "replace")
+    if len(raw) <= max_chars:
+        return (
+            raw.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+        )
+    digest = hashlib.sha256(raw).hexdigest()[:16]
+    head = raw[:max_chars].decode("utf-8", "ignore")
+    return f"{head}... [{len(raw)} bytes, sha256 {digest}]"
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of a logger's records below WARNING.
+
+    Rates are keyed by logger name; the longest matching dotted prefix wins, so
+    {"src": 0.1, "src.main": 1.0} samples everything but src.main.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._rate_by_name = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rate_by_name.get(name)
+        if rate is None:
+            prefix = name
+            while prefix not in self.rates and "." in prefix:
+                prefix = prefix.rsplit(".", 1)[0]
+            rate = float(self.rates.get(prefix, 1.0))
+            self._rate_by_name[name] = rate
+        return rate
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        # decided once per record, so every handler keeps or drops the same ones
+        keep = getattr(record, "_sampled", None)
+        if keep is None:
+            rate = self._rate(record.name)
+            keep = rate >= 1.0 or random.random() < rate
+            record._sampled = keep
+        return keep
+
+
+class MessageCapFilter(logging.Filter):
+    """Truncates any message over max_chars, as truncate_payload does."""
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = truncate_payload(message, self.max_chars)
+        # merged once here, so later handlers don't format the args again
+        record.msg = message
+        record.args = None
+        return True
+
+
+class _WriterQueueHandler(QueueHandler):
+    """Hands records to the writer thread; drops them rather than block when it falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the queue never leaves the process, so only merge msg and args now, while
+        # any mutable args still hold their values; JSON formatting happens in the writer
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _WriterListener(QueueListener):
+    def enqueue_sentinel(self):
+        # block, so stopping waits for the writer to drain a full queue
+        self.queue.put(self._sentinel)
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def _restart_listener_after_fork():
+    # the writer thread doesn't survive a fork (gunicorn --preload), so the child
+    # gets a fresh queue and its own writer
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener = _WriterListener(
+        _queue_handler.queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def setup_logging(log_file="app.log", logging_config: dict | None = None):
+    """Attach the console and rotating file handlers to the root logger.
+
+    In "queue" mode (logging.mode) the handlers run on a writer thread behind a
+    bounded queue, so the request thread only pays for filtering and enqueueing.
+    """
+    global _max_payload_chars, _queue_handler, _handlers, _listener
+    logging_config = logging_config or {}
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
+    # setup_logging can run more than once (src.main's __main__ block), don't stack handlers
+    _stop_listener()
+    for handler in _handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    _queue_handler = None
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
@@ -31,16 +182,52 @@ def setup_logging(log_file="app.log"):
     console_handler.setFormatter(json_formatter)
     file_handler.setFormatter(json_formatter)
     timed_handler.setFormatter(json_formatter)
+    handlers = [console_handler, file_handler, timed_handler]
+
+    for name, level in logging_config.get("levels", {"src": "DEBUG"}).items():
+        logging.getLogger(name).setLevel(level)
+    _max_payload_chars = logging_config.get("max_payload_chars", 1000)
+    filters = []
+    if logging_config.get("sampling"):
+        filters.append(SamplingFilter(logging_config["sampling"]))
+    if logging_config.get("max_message_chars"):
+        filters.append(MessageCapFilter(logging_config["max_message_chars"]))
+
+    if logging_config.get("mode", "sync") == "queue":
+        _queue_handler = _WriterQueueHandler(
+            queue.Queue(logging_config.get("queue_size", 10000))
+        )
+        for log_filter in filters:
+            _queue_handler.addFilter(log_filter)
+        _listener = _WriterListener(
+            _queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        _listener.start()
+        _handlers = [_queue_handler]
+    else:
+        for handler in handlers:
+            for log_filter in filters:
+                handler.addFilter(log_filter)
+        _handlers = handlers
 
     # Add handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    logger.addHandler(timed_handler)
+    for handler in _handlers:
+        logger.addHandler(handler)
 
     return logger
 
 
+def logging_stats() -> dict:
+    if _queue_handler is None:
+        return {"mode": "sync"}
+    return {
+        "mode": "queue",
+        "queued": _queue_handler.queue.qsize(),
+        "queue_size": _queue_handler.queue.maxsize,
+        "dropped": _queue_handler.dropped,
+    }
+
+
 def get_logger(name):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    return logger
+    # levels are set by setup_logging from logging.levels, "src" at DEBUG by default
+    return logging.getLogger(name)
@@ -1,15 +1,41 @@
-from flask import Flask, request, jsonify
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask.logging import default_handler
-from src.logging_config import setup_logging
-from src.valid_html import validate_llm_html
+from src.logging_config import logging_stats, setup_logging, truncate_payload
 from src.llm_interface import (
     OpenAIProvider,
     CohereAIProvider,
     AnthropicAIProvider,
 )
-from src.roadmap_output_ingestor import preprocess_roadmap_output
+from src.html_repair import repair_stats
+from src.report_pipeline import (
+    REPORT_QUERY,
+    StreamingReportCheck,
+    build_report_context,
+    build_report_payload,
+    format_report_sse,
+    format_sse,
+    invalid_export_payload,
+    lookup_cached_report,
+    process_report,
+    provider_unavailable_payload,
+    score_exports,
+    store_cached_report,
+)
+from src.report_renderer import structured_output_enabled
+from src.provider_router import ProviderRouter, build_provider_router
+from src.roadmap_output_ingestor import RoadmapValidationError
+from src.report_cache import build_report_cache, make_cache_key
+from src.report_reuse import build_report_reuse
+from src.health_monitor import CircuitOpenError, build_health_monitor
+from src.job_queue import build_job_pool
+from src.metrics import render_metrics, time_stage
+from src.request_profiler import build_request_profiler, request_profile
 from src.logging_config import get_logger
-from src.html_cleaner import strip_newlines_from_html
 
 from src.config_manager import ConfigManager
 from dotenv import load_dotenv
@@ -17,12 +43,12 @@ from dotenv import load_dotenv
 # set environment vars
 load_dotenv()
 
-# set up logger
-setup_logging()
-
 # set global configuration
 config_manager = ConfigManager()
 
+# set up logger
+setup_logging(logging_config=config_manager.logging_config)
+
 app = Flask(__name__)
 app.logger.removeHandler(default_handler)
 logger = get_logger(__name__)
@@ -45,73 +71,153 @@ llm_strategy = {
     "anthropic": get_anthropic_provider,
     "cohere": get_cohere_provider,
 }
-llm_provider = llm_strategy[config_manager.llm_provider_name]
-logger.debug(f"Using LLM provider: {llm_provider}")
-llm = llm_provider()
+llm = build_provider_router(
+    config_manager.router_config,
+    config_manager,
+    {
+        "openai": OpenAIProvider,
+        "anthropic": AnthropicAIProvider,
+        "cohere": CohereAIProvider,
+    },
+)
+if llm is None:
+    llm_provider = llm_strategy[config_manager.llm_provider_name]
+    logger.debug(f"Using LLM provider: {llm_provider}")
+    llm = llm_provider()
+report_cache = build_report_cache(config_manager.cache_config)
+report_reuse = build_report_reuse(
+    config_manager.reuse_config, config_manager.output_config.get("format", "html")
+)
+request_profiler = build_request_profiler(config_manager.profiling_config)
+
+
+def run_report_job(user_data):
+    try:
+        return process_report(
+            user_data, llm, config_manager, report_cache, {}, report_reuse
+        )
+    except RoadmapValidationError as e:
+        # retrying can't fix a bad export, so fail the job instead of raising
+        return invalid_export_payload(e), 400
+
+
+job_pool = build_job_pool(config_manager.jobs_config, run_report_job)
+health_monitor = build_health_monitor(config_manager.health_config, llm)
+_worker_pid = None
+
+
+def start_worker():
+    """Per-process startup: warm the provider clients, then start the background threads.
+
+    Runs at import, or from the post_fork hook in src/run/gunicorn.conf.py when
+    gunicorn preloads the app, since connections and threads don't survive a fork.
+    """
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+    if config_manager.startup_config.get("warm_up", False):
+        llm.warm_up(config_manager.startup_config.get("warm_up_timeout_seconds", 5))
+    if health_monitor is not None:
+        health_monitor.start()
+    if job_pool is not None:
+        job_pool.start()
+
+
+if os.environ.get("PRELOAD_APP"):
+    # import the configured providers' SDKs once in the gunicorn master, so forked
+    # workers share them; each worker then runs start_worker after the fork
+    llm.preload()
+else:
+    start_worker()
 
 
 @app.route("/process", methods=["POST"])
 def process_data():
     try:
-        logger.debug(f":Received request data: {request.data}")
+        logger.debug(f":Received request data: {truncate_payload(request.data)}")
+
+        with request_profile(request_profiler, request.headers) as profile:
+            with time_stage("parse"):
+                user_data = request.json
+            if not user_data:
+                return jsonify({"error": "No data provided"}), 400
+
+            payload, status_code = process_report(
+                user_data,
+                llm,
+                config_manager,
+                report_cache,
+                request.headers,
+                report_reuse,
+            )
+        if profile is not None and profile["mode"] == "inline":
+            payload["profile"] = profile
+        return jsonify(payload), status_code
+
+    except CircuitOpenError as e:
+        return jsonify(provider_unavailable_payload(e)), 503
+    except RoadmapValidationError as e:
+        return jsonify(invalid_export_payload(e)), 400
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        return jsonify(
+            {
+                "status": "error",
+                "message": "An error occurred while processing the request",
+                "details": str(e),
+            }
+        ), 500
+
 
+@app.route("/process/stream", methods=["POST"])
+def process_data_stream():
+    logger.debug(
+        f":Received streaming request data: {truncate_payload(request.data)}"
+    )
+
+    with time_stage("parse"):
         user_data = request.json
-        if not user_data:
-            return jsonify({"error": "No data provided"}), 400
-
-        preprocessed_data = preprocess_roadmap_output(user_data)
-        context = f"User Data:\n{preprocessed_data}\n"
-
-        query = """
-        Based on the provided user data for both the primary beneficiary and spouse, and the relevant Social Security rules, please provide:
-        1. A summary of both individuals' work history and earnings in the form of a table with five columns: individual, total years worked, total lifetime earnings, primary insurance amount, and average annual earnings.
-        2. An analysis of their estimated Social Security benefits, including any spousal benefits they might be eligible for.
-        3. Recommendations for optimizing their Social Security benefits as a couple. Be extremely detailed whenever possible, including referencing the source of your information. If you are recommending strategies, please detail them in procedural form so that they can be followed easily.
-        4. Any insights related to their dependents, if any.
-        5. Note any specific rules that you are referencing in your analysis.
-
-        Important: 
-        - Provide your response as a complete, properly formatted HTML document, including <!DOCTYPE html>, <html>, <head>, and <body> tags.
-        - Minimize the use of newline characters. Only use them where necessary for HTML structure (e.g., between major elements like <head> and <body>).
-        - Do not include any markdown formatting or code block syntax.
-        - Ensure all tags are properly closed and the HTML is valid.
-        - Use appropriate semantic HTML5 tags where possible (e.g., <header>, <main>, <section>, <article>).
-        """
-
-        logger.info("Performing LLM analysis now...")
-        analysis_result, len_of_input, len_of_output = llm.analyze(query, context)
-        cleaned_results = strip_newlines_from_html(analysis_result)
-
-        logger.info("Performing HTML validation now...")
-        validated, validation_message = validate_llm_html(cleaned_results)
-
-        if validated:
-            logger.info("HTML was validated!")
-            return jsonify(
-                {
-                    "html_report": cleaned_results,
-                    "provider": config_manager.llm_provider_name,
-                    "model": config_manager.model,
-                    "input_length": len_of_input,
-                    "output_length": len_of_output,
-                    "total_chars": len_of_input + len_of_output,
-                    "token approximation": (len_of_input + len_of_output) / 4,
-                    "status": "success",
-                }
+    if not user_data:
+        return jsonify({"error": "No data provided"}), 400
+
+    if structured_output_enabled(config_manager.output_config):
+        # a structured report can only be rendered once all of its JSON is in, so
+        # it goes out the way a cached one does: the whole report, then done
+        try:
+            payload, status_code = process_report(
+                user_data,
+                llm,
+                config_manager,
+                report_cache,
+                request.headers,
+                report_reuse,
             )
-        else:
-            logger.error(f"HTML Validation failed: {validation_message}")
+        except CircuitOpenError as e:
+            return jsonify(provider_unavailable_payload(e)), 503
+        except RoadmapValidationError as e:
+            return jsonify(invalid_export_payload(e)), 400
+        except Exception as e:
+            logger.error(f"Error processing streaming request: {str(e)}")
             return jsonify(
                 {
                     "status": "error",
-                    "message": "HTML validation failed",
-                    "details": validation_message,
-                    "partial_response": validation_message[:1000],
+                    "message": "An error occurred while processing the request",
+                    "details": str(e),
                 }
             ), 500
+        return Response(
+            format_report_sse(payload, status_code), mimetype="text/event-stream"
+        )
 
+    try:
+        context, token_counts = build_report_context(
+            user_data, config_manager.context_config
+        )
+    except RoadmapValidationError as e:
+        return jsonify(invalid_export_payload(e)), 400
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        logger.error(f"Error preprocessing streaming request: {str(e)}")
         return jsonify(
             {
                 "status": "error",
@@ -120,6 +226,285 @@ def process_data():
             }
         ), 500
 
+    cache_key = make_cache_key(
+        context,
+        REPORT_QUERY,
+        config_manager.llm_provider_name,
+        config_manager.model,
+    )
+    cached, cache_status = lookup_cached_report(report_cache, cache_key, request.headers)
+    if cached is not None:
+        logger.info(f"Serving streamed report from cache ({cache_status})")
+        payload = {**cached, "cache": cache_status}
+        return Response(
+            format_sse("delta", {"text": cached["html_report"]})
+            + format_sse("done", payload),
+            mimetype="text/event-stream",
+        )
+
+    try:
+        deltas, len_of_input = llm.stream_analyze(REPORT_QUERY, context)
+    except CircuitOpenError as e:
+        return jsonify(provider_unavailable_payload(e)), 503
+
+    def generate():
+        check = StreamingReportCheck(config_manager.validation_config)
+        abort_on_error = config_manager.validation_config.get(
+            "abort_stream_on_error", True
+        )
+        len_of_output = 0
+        try:
+            logger.info("Streaming LLM analysis now...")
+            for delta in deltas:
+                len_of_output += len(delta)
+                cleaned, error = check.feed(delta)
+                if cleaned:
+                    yield format_sse("delta", {"text": cleaned})
+                if error and abort_on_error:
+                    # the report can no longer pass validation, so stop paying
+                    # for the rest of the generation
+                    logger.error(f"Aborting stream, HTML validation failed: {error}")
+                    yield format_sse(
+                        "error",
+                        {
+                            "status": "error",
+                            "message": "HTML validation failed",
+                            "details": error,
+                        },
+                    )
+                    return
+
+            cleaned, cleaned_results, validated, validation_message = check.close()
+            if cleaned:
+                yield format_sse("delta", {"text": cleaned})
+            if validated:
+                logger.info("HTML was validated!")
+                served_provider, served_model = llm.served_by()
+                payload = build_report_payload(
+                    cleaned_results,
+                    served_provider,
+                    served_model,
+                    len_of_input,
+                    len_of_output,
+                    token_counts,
+                )
+                store_cached_report(report_cache, cache_key, payload, config_manager)
+                yield format_sse("done", {**payload, "cache": cache_status})
+            else:
+                logger.error(f"HTML Validation failed: {validation_message}")
+                yield format_sse(
+                    "error",
+                    {
+                        "status": "error",
+                        "message": "HTML validation failed",
+                        "details": validation_message,
+                    },
+                )
+        except Exception as e:
+            logger.error(f"Error streaming request: {str(e)}")
+            yield format_sse(
+                "error",
+                {
+                    "status": "error",
+                    "message": "An error occurred while processing the request",
+                    "details": str(e),
+                },
+            )
+        finally:
+            # closes the provider stream if the client disconnects mid-generation
+            deltas.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/process/batch", methods=["POST"])
+def process_batch():
+    body = request.json
+    exports = body.get("exports") if isinstance(body, dict) else body
+    if not exports or not isinstance(exports, list):
+        return jsonify({"error": "Expected a list of exports"}), 400
+
+    max_items = config_manager.batch_config.get("max_items", 500)
+    if len(exports) > max_items:
+        return jsonify({"error": f"Batch is limited to {max_items} exports"}), 413
+
+    max_concurrency = config_manager.batch_config.get("max_concurrency", 8)
+    # worker threads don't run inside the request context, so copy what they need
+    headers = dict(request.headers)
+    logger.info(f"Processing batch of {len(exports)} exports")
+
+    def run_item(index, user_data):
+        item_id = user_data.get("id") if isinstance(user_data, dict) else None
+        try:
+            if not user_data:
+                raise ValueError("No data provided")
+            payload, status_code = process_report(
+                user_data,
+                llm,
+                config_manager,
+                report_cache,
+                headers,
+                report_reuse,
+            )
+        except RoadmapValidationError as e:
+            payload, status_code = invalid_export_payload(e), 400
+        except Exception as e:
+            logger.error(f"Error processing batch item {index}: {str(e)}")
+            payload, status_code = {
+                "status": "error",
+                "message": "An error occurred while processing the request",
+                "details": str(e),
+            }, 500
+        return {"index": index, "id": item_id, "http_status": status_code, **payload}
+
+    def generate():
+        start = time.perf_counter()
+        succeeded = 0
+        executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(exports)))
+        try:
+            futures = [
+                executor.submit(run_item, index, user_data)
+                for index, user_data in enumerate(exports)
+            ]
+            # one json line per export, in completion order
+            for future in as_completed(futures):
+                result = future.result()
+                succeeded += result["status"] == "success"
+                yield json.dumps(result) + "\n"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield json.dumps(
+            {
+                "summary": {
+                    "total": len(exports),
+                    "succeeded": succeeded,
+                    "failed": len(exports) - succeeded,
+                    "elapsed_seconds": round(time.perf_counter() - start, 3),
+                }
+            }
+        ) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    if job_pool is None:
+        return jsonify({"error": "Job queue is disabled"}), 404
+
+    user_data = request.json
+    if not user_data:
+        return jsonify({"error": "No data provided"}), 400
+
+    job_id = job_pool.store.enqueue(user_data)
+    job_pool.notify()
+    logger.info(f"Queued job {job_id}")
+    return jsonify(
+        {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+    ), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    if job_pool is None:
+        return jsonify({"error": "Job queue is disabled"}), 404
+
+    job = job_pool.store.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/strategies", methods=["POST"])
+def claiming_strategies():
+    body = request.json
+    exports = body.get("exports") if isinstance(body, dict) else body
+    if not exports or not isinstance(exports, list):
+        return jsonify({"error": "Expected a list of exports"}), 400
+
+    max_items = config_manager.batch_config.get("max_items", 500)
+    if len(exports) > max_items:
+        return jsonify({"error": f"Batch is limited to {max_items} exports"}), 413
+
+    top_n = body.get("top_n", 3) if isinstance(body, dict) else 3
+    if not isinstance(top_n, int) or top_n < 1:
+        return jsonify({"error": "top_n must be a positive integer"}), 400
+
+    # scored locally, no LLM call, so a whole portfolio comes back in one response
+    logger.info(f"Scoring claiming strategies for {len(exports)} exports")
+    return jsonify({"results": score_exports(exports, top_n)})
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    if report_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **report_cache.stats()})
+
+
+@app.route("/router/stats", methods=["GET"])
+def router_stats():
+    if not isinstance(llm, ProviderRouter):
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "providers": llm.router_stats()})
+
+
+@app.route("/hedge/stats", methods=["GET"])
+def hedge_stats():
+    providers = llm.providers if isinstance(llm, ProviderRouter) else {llm.llm_provider: llm}
+    return jsonify(
+        {
+            name: provider.hedge_policy.stats()
+            for name, provider in providers.items()
+            if provider.hedge_policy is not None
+        }
+    )
+
+
+@app.route("/repair/stats", methods=["GET"])
+def repair_stats_endpoint():
+    return jsonify(repair_stats.stats())
+
+
+@app.route("/reuse/stats", methods=["GET"])
+def reuse_stats():
+    if report_reuse is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **report_reuse.stats()})
+
+
+@app.route("/logging/stats", methods=["GET"])
+def logging_stats_endpoint():
+    return jsonify(logging_stats())
+
+
+@app.route("/health/stats", methods=["GET"])
+def health_stats():
+    if health_monitor is None:
+        return jsonify({"enabled": False})
+    return jsonify(
+        {
+            "enabled": True,
+            "ready": health_monitor.ready(),
+            "providers": health_monitor.stats(),
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 
 @app.route("/healthz", methods=["GET"])
 def health_check():
@@ -130,6 +515,12 @@ def health_check():
 @app.route("/ready", methods=["GET"])
 def readiness_check():
     logger.info("Readiness check requested")
+    if health_monitor is not None:
+        # the monitor and real traffic keep the breakers current, so no LLM call here
+        if health_monitor.ready():
+            return "", 200
+        logger.error(f"Readiness check failed: {health_monitor.stats()}")
+        return "Service is not ready", 503
     try:
         # Perform a simple request to the LLM provider
         llm.analyze("Test", "This is a test.")
@@ -141,7 +532,7 @@ def readiness_check():
 
 
 if __name__ == "__main__":
-    setup_logging()
+    setup_logging(logging_config=config_manager.logging_config)
     # Line below is used for testing app with flask server.
     app.run(host=config_manager.host, port=int(config_manager.port), debug=False)
     # In production, using gunicorn from cmd line:
@@ -0,0 +1,141 @@
+"""Prometheus metrics for the request path, served at /metrics.
+
+Stage and provider latencies are histograms; characters, provider-reported
+tokens, cache lookups, retries and validation failures are counters. Under
+gunicorn, src/run/gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR, so every
+worker writes its values to shared memory-mapped files and /metrics, whichever
+worker answers it, adds up all of them.
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# LLM calls run to minutes, while parsing and cleaning take milliseconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+
+STAGE_SECONDS = Histogram(
+    "rssa_stage_seconds",
+    "Time spent in each stage of report generation.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "rssa_provider_request_seconds",
+    "Latency of individual provider requests.",
+    ["provider", "model", "method", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CHARACTERS = Counter(
+    "rssa_characters",
+    "Characters sent to and received from providers.",
+    ["provider", "direction"],
+)
+TOKENS = Counter(
+    "rssa_tokens",
+    "Tokens billed by providers, as reported in their responses.",
+    ["provider", "model", "direction"],
+)
+CACHE_LOOKUPS = Counter(
+    "rssa_cache_lookups", "Report cache lookups by result.", ["result"]
+)
+RETRIES = Counter(
+    "rssa_retries",
+    "Extra provider requests: router failovers and hedged requests.",
+    ["kind", "provider"],
+)
+VALIDATIONS = Counter("rssa_validations", "Report validations by result.", ["result"])
+
+
+@contextmanager
+def time_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """Decorator form of time_stage."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with time_stage(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_provider_request(
+    provider: str, model: str, method: str, ok: bool, seconds: float
+):
+    PROVIDER_REQUEST_SECONDS.labels(
+        provider, model, method, "ok" if ok else "error"
+    ).observe(seconds)
+
+
+def record_characters(provider: str, sent: int, received: int):
+    CHARACTERS.labels(provider, "input").inc(sent)
+    CHARACTERS.labels(provider, "output").inc(received)
+
+
+def record_token_usage(provider: str, model: str, input_tokens, output_tokens):
+    # providers leave usage out of some responses, count only what they report
+    if input_tokens:
+        TOKENS.labels(provider, model, "input").inc(input_tokens)
+    if output_tokens:
+        TOKENS.labels(provider, model, "output").inc(output_tokens)
+
+
+def record_cache_lookup(result: str):
+    CACHE_LOOKUPS.labels(result).inc()
+
+
+def record_retry(kind: str, provider: str):
+    RETRIES.labels(kind, provider).inc()
+
+
+def record_validation(validated: bool):
+    VALIDATIONS.labels("valid" if validated else "invalid").inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """(body, content type) of every metric, summed over workers when multiprocess."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
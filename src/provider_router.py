@@ -0,0 +1,363 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+
+from src.health_monitor import CircuitOpenError
+from src.logging_config import get_logger
+from src.metrics import record_retry
+
+logger = get_logger(__name__)
+
+# (provider, model) that served the current request; a contextvar so concurrent
+# requests on threads or asyncio tasks each see their own
+_served_by = contextvars.ContextVar("served_by", default=None)
+
+
+class NoHealthyProviderError(RuntimeError):
+    pass
+
+
+class ProviderStats:
+    """Rolling latency, error rate and in-flight count for one provider."""
+
+    def __init__(self, error_window: int, latency_alpha: float):
+        self.latency_alpha = latency_alpha
+        self.latency = None
+        self.outcomes = deque(maxlen=error_window)
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.cooldown_until = 0.0
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, ok: bool, elapsed: float | None):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if not ok:
+            self.errors += 1
+        elif elapsed is not None:
+            # exponentially weighted moving average, so recent slowdowns show quickly
+            self.latency = (
+                elapsed
+                if self.latency is None
+                else self.latency_alpha * elapsed
+                + (1 - self.latency_alpha) * self.latency
+            )
+
+
+class ProviderRouter:
+    """Sends each request to the best-scoring healthy provider and fails over on errors.
+
+    Providers are grouped by priority (lower first); within a group the score is
+    (latency + error rate * error penalty) * (in-flight + 1) / weight, lowest wins.
+    """
+
+    def __init__(
+        self,
+        providers: dict,
+        settings: dict,
+        default_provider: str,
+        error_window: int = 20,
+        latency_alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        error_penalty_seconds: float = 30,
+        cooldown_seconds: float = 30,
+        max_attempts: int = 3,
+    ):
+        self.providers = providers
+        self.settings = settings
+        self.default_provider = default_provider
+        self.max_error_rate = max_error_rate
+        self.error_penalty_seconds = error_penalty_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.max_attempts = max_attempts
+        self.stats = {
+            name: ProviderStats(error_window, latency_alpha) for name in providers
+        }
+        self._lock = threading.Lock()
+
+    def _score(self, name: str) -> float:
+        stats = self.stats[name]
+        # a provider with no samples yet scores 0 so it gets tried
+        latency = stats.latency or 0.0
+        return (
+            (latency + stats.error_rate() * self.error_penalty_seconds)
+            * (stats.in_flight + 1)
+            / self.settings[name].get("weight", 1.0)
+        )
+
+    def _healthy(self, name: str, now: float) -> bool:
+        breaker = self.providers[name].breaker
+        return self.stats[name].cooldown_until <= now and (
+            breaker is None or breaker.available()
+        )
+
+    def ranked_providers(self) -> list:
+        """Provider names in the order a request would try them."""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(
+                self.providers,
+                key=lambda name: (
+                    not self._healthy(name, now),
+                    self.settings[name].get("priority", 1),
+                    self._score(name),
+                ),
+            )
+
+    def _begin(self, name: str) -> float:
+        with self._lock:
+            self.stats[name].in_flight += 1
+        return time.monotonic()
+
+    def _finish(self, name: str, started: float, ok: bool):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            stats = self.stats[name]
+            stats.in_flight -= 1
+            stats.record(ok, elapsed)
+            if (
+                not ok
+                and len(stats.outcomes) >= min(5, stats.outcomes.maxlen)
+                and stats.error_rate() > self.max_error_rate
+            ):
+                stats.cooldown_until = time.monotonic() + self.cooldown_seconds
+                logger.warning(
+                    f"Provider {name} error rate {stats.error_rate():.0%}, "
+                    f"cooling down for {self.cooldown_seconds}s"
+                )
+
+    def _abandon(self, name: str):
+        with self._lock:
+            self.stats[name].in_flight -= 1
+
+    def _input_length(self, name: str, query, context) -> int:
+        messages = self.providers[name]._create_analysis_messages(query, context)
+        return sum(len(msg["content"]) for msg in messages)
+
+    def _attempts(self) -> list:
+        ranked = self.ranked_providers()
+        now = time.monotonic()
+        healthy = [name for name in ranked if self._healthy(name, now)]
+        # when everything is cooling down, still try the best candidates
+        # rather than failing the request outright
+        return (healthy or ranked)[: self.max_attempts]
+
+    def _mark_served(self, name: str):
+        # the provider's own served_by, which names the hedge model when it won
+        _served_by.set(self.providers[name].served_by())
+
+    def served_by(self):
+        """Return (provider, model) that served the last call in this context."""
+        return _served_by.get() or (
+            self.default_provider,
+            self.providers[self.default_provider].model,
+        )
+
+    def analyze(self, query, context, structured=False):
+        last_error = None
+        for name in self._attempts():
+            started = self._begin(name)
+            try:
+                result = self.providers[name].analyze(query, context, structured)
+            except CircuitOpenError as e:
+                # shed without a call, so it says nothing new about the provider
+                self._abandon(name)
+                last_error = e
+                continue
+            except Exception as e:
+                self._finish(name, started, ok=False)
+                logger.error(f"Provider {name} failed, failing over: {str(e)}")
+                record_retry("failover", name)
+                last_error = e
+                continue
+            self._finish(name, started, ok=True)
+            self._mark_served(name)
+            return result
+        raise NoHealthyProviderError(f"All providers failed: {last_error}")
+
+    def stream_analyze(self, query, context):
+        """Stream from the best provider; fail over only until the first delta is sent."""
+        attempts = self._attempts()
+        len_of_input = self._input_length(attempts[0], query, context)
+
+        def generate():
+            last_error = None
+            for name in attempts:
+                try:
+                    deltas, _ = self.providers[name].stream_analyze(query, context)
+                except CircuitOpenError as e:
+                    last_error = e
+                    continue
+                started = self._begin(name)
+                sent = False
+                try:
+                    for delta in deltas:
+                        if not sent:
+                            self._mark_served(name)
+                            sent = True
+                        yield delta
+                except GeneratorExit:
+                    # the client went away, which says nothing about the provider
+                    self._abandon(name)
+                    raise
+                except Exception as e:
+                    self._finish(name, started, ok=False)
+                    if sent:
+                        raise
+                    logger.error(f"Provider {name} failed, failing over: {str(e)}")
+                    record_retry("failover", name)
+                    last_error = e
+                    continue
+                finally:
+                    deltas.close()
+                self._finish(name, started, ok=True)
+                return
+            raise NoHealthyProviderError(f"All providers failed: {last_error}")
+
+        return generate(), len_of_input
+
+    def preload(self):
+        for provider in self.providers.values():
+            provider.preload()
+
+    def warm_up(self, timeout: float = 5.0):
+        for provider in self.providers.values():
+            provider.warm_up(timeout)
+
+    def router_stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "priority": self.settings[name].get("priority", 1),
+                    "weight": self.settings[name].get("weight", 1.0),
+                    "healthy": self._healthy(name, now),
+                    "latency_ewma_seconds": (
+                        round(stats.latency, 3) if stats.latency is not None else None
+                    ),
+                    "error_rate": round(stats.error_rate(), 3),
+                    "in_flight": stats.in_flight,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "score": round(self._score(name), 3),
+                }
+                for name, stats in self.stats.items()
+            }
+
+
+class AsyncProviderRouter(ProviderRouter):
+    """ProviderRouter over AsyncBaseAIProvider instances, used by src/asgi.py."""
+
+    async def warm_up(self, timeout: float = 5.0):
+        await asyncio.gather(
+            *(provider.warm_up(timeout) for provider in self.providers.values())
+        )
+
+    async def analyze(self, query, context, structured=False):
+        last_error = None
+        for name in self._attempts():
+            started = self._begin(name)
+            try:
+                result = await self.providers[name].analyze(query, context, structured)
+            except CircuitOpenError as e:
+                # shed without a call, so it says nothing new about the provider
+                self._abandon(name)
+                last_error = e
+                continue
+            except Exception as e:
+                self._finish(name, started, ok=False)
+                logger.error(f"Provider {name} failed, failing over: {str(e)}")
+                record_retry("failover", name)
+                last_error = e
+                continue
+            self._finish(name, started, ok=True)
+            self._mark_served(name)
+            return result
+        raise NoHealthyProviderError(f"All providers failed: {last_error}")
+
+    def stream_analyze(self, query, context):
+        attempts = self._attempts()
+        len_of_input = self._input_length(attempts[0], query, context)
+
+        async def generate():
+            last_error = None
+            for name in attempts:
+                try:
+                    deltas, _ = self.providers[name].stream_analyze(query, context)
+                except CircuitOpenError as e:
+                    last_error = e
+                    continue
+                started = self._begin(name)
+                sent = False
+                try:
+                    async for delta in deltas:
+                        if not sent:
+                            self._mark_served(name)
+                            sent = True
+                        yield delta
+                except GeneratorExit:
+                    # the client went away, which says nothing about the provider
+                    self._abandon(name)
+                    raise
+                except Exception as e:
+                    self._finish(name, started, ok=False)
+                    if sent:
+                        raise
+                    logger.error(f"Provider {name} failed, failing over: {str(e)}")
+                    record_retry("failover", name)
+                    last_error = e
+                    continue
+                finally:
+                    await deltas.aclose()
+                self._finish(name, started, ok=True)
+                return
+            raise NoHealthyProviderError(f"All providers failed: {last_error}")
+
+        return generate(), len_of_input
+
+
+def build_provider_router(
+    router_config: dict, config_manager, provider_classes: dict, router_class=None
+):
+    if not router_config.get("enabled", False):
+        logger.debug("Provider router disabled")
+        return None
+
+    router_class = router_class or ProviderRouter
+    providers = {}
+    settings = {}
+    for name, provider_settings in router_config.get("providers", {}).items():
+        if name not in provider_classes:
+            raise ValueError(f"Unknown provider in router config: {name}")
+        if not config_manager.get_api_key(name):
+            logger.warning(f"Skipping router provider {name}: no API key set")
+            continue
+        providers[name] = provider_classes[name](config_manager, name)
+        settings[name] = provider_settings or {}
+    if not providers:
+        raise ValueError("Provider router enabled but no provider has an API key")
+
+    default_provider = (
+        config_manager.llm_provider_name
+        if config_manager.llm_provider_name in providers
+        else next(iter(providers))
+    )
+    logger.debug(f"Using provider router config: {router_config}")
+    return router_class(
+        providers,
+        settings,
+        default_provider,
+        error_window=router_config.get("error_window", 20),
+        latency_alpha=router_config.get("latency_alpha", 0.2),
+        max_error_rate=router_config.get("max_error_rate", 0.5),
+        error_penalty_seconds=router_config.get("error_penalty_seconds", 30),
+        cooldown_seconds=router_config.get("cooldown_seconds", 30),
+        max_attempts=router_config.get("max_attempts", 3),
+    )
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+BYPASS_HEADER = "X-Cache-Bypass"
+# bump when the shape of cached payloads changes so stale entries are never served
+CACHE_FORMAT_VERSION = "2"
+
+
+def make_cache_key(context: str, query: str, provider: str, model: str) -> str:
+    # context is the build_report_context text, so the key only changes
+    # when the normalized client data, the prompt or the model changes
+    digest = hashlib.sha256()
+    for part in (CACHE_FORMAT_VERSION, context, query, provider, model):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_bypass_requested(headers) -> bool:
+    if headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in headers.get("Cache-Control", "").lower()
+
+
+class MemoryLRUTier:
+    """Per-process LRU with a time-to-live on every entry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteTier:
+    """On-disk tier shared by every worker process (and pod) that mounts the file."""
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # sqlite connections can't cross threads or forks, so keep one per thread and pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value FROM reports WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            with conn:
+                conn.execute(
+                    "DELETE FROM reports WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+
+
+class ReportCache:
+    def __init__(self, memory_tier: MemoryLRUTier, disk_tier: SQLiteTier | None):
+        self.memory_tier = memory_tier
+        self.disk_tier = disk_tier
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypasses": 0,
+            "stores": 0,
+            "errors": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        """Return (value, "hit-memory" | "hit-disk" | "miss")."""
+        value = self.memory_tier.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value, "hit-memory"
+
+        if self.disk_tier is not None:
+            try:
+                value = self.disk_tier.get(key)
+            except sqlite3.Error as e:
+                logger.error(f"Report cache read failed: {str(e)}")
+                self._count("errors")
+                value = None
+            if value is not None:
+                self.memory_tier.set(key, value)
+                self._count("disk_hits")
+                return value, "hit-disk"
+
+        self._count("misses")
+        return None, "miss"
+
+    def set(self, key, value):
+        self.memory_tier.set(key, value)
+        if self.disk_tier is not None:
+            try:
+                self.disk_tier.set(key, value)
+            except sqlite3.Error as e:
+                logger.error(f"Report cache write failed: {str(e)}")
+                self._count("errors")
+                return
+        self._count("stores")
+
+    def record_bypass(self):
+        self._count("bypasses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+
+def build_report_cache(cache_config: dict) -> ReportCache | None:
+    if not cache_config.get("enabled", False):
+        logger.debug("Report cache disabled")
+        return None
+
+    memory_tier = MemoryLRUTier(
+        max_entries=cache_config.get("memory_max_entries", 256),
+        ttl_seconds=cache_config.get("memory_ttl_seconds", 3600),
+    )
+    disk_tier = None
+    if cache_config.get("sqlite_path"):
+        disk_tier = SQLiteTier(
+            path=cache_config["sqlite_path"],
+            ttl_seconds=cache_config.get("disk_ttl_seconds", 7 * 24 * 3600),
+        )
+    logger.debug(f"Using report cache config: {cache_config}")
+    return ReportCache(memory_tier, disk_tier)
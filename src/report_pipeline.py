@@ -0,0 +1,470 @@
+import json
+
+from src.benefit_engine import compute_benefit_figures, format_benefit_figures
+from src.claiming_optimizer import (
+    format_claiming_strategies,
+    optimize_household,
+    score_portfolio,
+)
+from src.health_monitor import CircuitOpenError
+from src.html_cleaner import StreamingHTMLCleaner, strip_newlines_from_html
+from src.context_encoding import estimate_tokens
+from src.html_repair import validate_with_repair
+from src.logging_config import get_logger
+from src.metrics import record_cache_lookup, record_validation, time_stage, timed_stage
+from src.report_cache import ReportCache, cache_bypass_requested, make_cache_key
+from src.report_renderer import (
+    STRUCTURED_REPORT_QUERY,
+    render_structured_report,
+    structured_output_enabled,
+)
+from src.report_reuse import (
+    ReportReuseIndex,
+    adapt_report_query,
+    household_names,
+    leaked_names,
+    profile_features,
+)
+from src.roadmap_output_ingestor import (
+    RoadmapValidationError,
+    format_roadmap,
+    parse_roadmap_output,
+)
+from src.rules_retrieval import format_rules, retrieve_rules
+from src.valid_html import (
+    NotValidHTMLException,
+    StreamingHTMLValidator,
+    get_validator,
+)
+
+logger = get_logger(__name__)
+
+
+REPORT_QUERY = """
+        Based on the provided user data for both the primary beneficiary and spouse, and the relevant Social Security rules, please provide:
+        1. A summary of both individuals' work history and earnings in the form of a table with five columns: individual, total years worked, total lifetime earnings, primary insurance amount, and average annual earnings.
+        2. An analysis of their estimated Social Security benefits, including any spousal benefits they might be eligible for.
+        3. Recommendations for optimizing their Social Security benefits as a couple. Be extremely detailed whenever possible, including referencing the source of your information. If you are recommending strategies, please detail them in procedural form so that they can be followed easily.
+        4. Any insights related to their dependents, if any.
+        5. Note any specific rules that you are referencing in your analysis.
+
+        Important: 
+        - Provide your response as a complete, properly formatted HTML document, including <!DOCTYPE html>, <html>, <head>, and <body> tags.
+        - Minimize the use of newline characters. Only use them where necessary for HTML structure (e.g., between major elements like <head> and <body>).
+        - Do not include any markdown formatting or code block syntax.
+        - Ensure all tags are properly closed and the HTML is valid.
+        - Use appropriate semantic HTML5 tags where possible (e.g., <header>, <main>, <section>, <article>).
+        """
+
+
+@timed_stage("preprocess")
+def build_report_context(user_data: dict, context_config: dict | None = None):
+    """Return the LLM context for an export, plus its token counts before/after encoding."""
+    context_config = context_config or {}
+    encoding = context_config.get("encoding", "verbose")
+
+    roadmap = parse_roadmap_output(user_data)
+    extras = ""
+    if context_config.get("benefit_figures", True):
+        # totals, AIME/PIA and claim-age benefits computed here, so the model
+        # doesn't have to derive (and sometimes get wrong) the numbers itself
+        extras = "\n" + format_benefit_figures(compute_benefit_figures(roadmap)) + "\n"
+    top_n = context_config.get("claiming_strategies", 3)
+    if top_n:
+        strategies = optimize_household(roadmap, top_n)
+        extras += (
+            "\n" + format_claiming_strategies(strategies, roadmap["settings"]) + "\n"
+        )
+    rules_config = context_config.get("rules", {})
+    if rules_config.get("enabled", False):
+        passages = retrieve_rules(roadmap, rules_config)
+        if passages:
+            extras += "\n" + format_rules(passages) + "\n"
+
+    verbose_data = format_roadmap(roadmap) + extras
+    if encoding == "verbose":
+        preprocessed_data = verbose_data
+    else:
+        token_budget = context_config.get("token_budget")
+        if token_budget is not None:
+            extras_tokens = estimate_tokens(extras)
+            if extras_tokens >= token_budget:
+                logger.warning(
+                    f"Computed figures, strategies and rules take {extras_tokens} "
+                    f"tokens of the {token_budget} token budget, none is left for "
+                    "the client data"
+                )
+            # the client data is then trimmed as far as it goes
+            token_budget = max(token_budget - extras_tokens, 0)
+        preprocessed_data = format_roadmap(roadmap, encoding, token_budget) + extras
+
+    token_counts = {
+        "context_before": estimate_tokens(verbose_data),
+        "context_after": estimate_tokens(preprocessed_data),
+    }
+    return f"User Data:\n{preprocessed_data}\n", token_counts
+
+
+def invalid_export_payload(error: RoadmapValidationError) -> dict:
+    logger.warning(f"Rejected invalid roadmap export: {error}")
+    return {
+        "status": "error",
+        "message": "Invalid roadmap export",
+        "details": error.errors,
+    }
+
+
+def provider_unavailable_payload(error: CircuitOpenError) -> dict:
+    logger.warning(f"Shed request while the provider circuit is open: {error}")
+    return {
+        "status": "error",
+        "message": "LLM provider unavailable",
+        "details": str(error),
+    }
+
+
+def score_exports(exports: list, top_n: int = 3) -> list:
+    """Top claiming strategies for every export in a portfolio, with no LLM call."""
+    roadmaps = []
+    results = []
+    for index, user_data in enumerate(exports):
+        item_id = user_data.get("id") if isinstance(user_data, dict) else None
+        try:
+            roadmaps.append(parse_roadmap_output(user_data))
+        except RoadmapValidationError as e:
+            results.append({"index": index, "id": item_id, **invalid_export_payload(e)})
+            continue
+        results.append({"index": index, "id": item_id, "status": "success"})
+
+    # every valid household is scored together, a chunk of grids at a time
+    scored = iter(score_portfolio(roadmaps, top_n))
+    for result in results:
+        if result["status"] == "success":
+            result.update(next(scored))
+    return results
+
+
+def clean_and_validate_report(
+    analysis_result: str, validation_config: dict | None = None
+):
+    validation_config = validation_config or {}
+    with time_stage("clean"):
+        cleaned_results = strip_newlines_from_html(analysis_result)
+
+    logger.info("Performing HTML validation now...")
+    validate_html = get_validator(validation_config.get("validator", "html5lib"))
+    with time_stage("validate"):
+        if validation_config.get("repair", True):
+            # a local repair is far cheaper than the client retrying the whole generation
+            return validate_with_repair(cleaned_results, validate_html)
+        validated, validation_message = validate_html(cleaned_results)
+    return cleaned_results, validated, validation_message
+
+
+def report_query(output_config: dict) -> str:
+    if structured_output_enabled(output_config):
+        return STRUCTURED_REPORT_QUERY
+    return REPORT_QUERY
+
+
+def finish_report(analysis_result: str, user_data: dict, config_manager):
+    """(html, validated, validation_message) for the provider output in the configured format."""
+    if structured_output_enabled(config_manager.output_config):
+        with time_stage("render"):
+            result = render_structured_report(
+                analysis_result, user_data, config_manager.validation_config
+            )
+    else:
+        result = clean_and_validate_report(
+            analysis_result, config_manager.validation_config
+        )
+    record_validation(result[1])
+    return result
+
+
+class StreamingReportCheck:
+    """clean_and_validate_report for a streamed report, one provider delta at a time.
+
+    feed() returns the cleaned text ready to send plus the first validation failure
+    that is already certain (only the fast validator can tell mid-stream, and only
+    with repair off, since the repair pass fixes those failures); close()
+    returns the last cleaned text followed by the same (cleaned_results, validated,
+    validation_message) as clean_and_validate_report on the whole output.
+    """
+
+    def __init__(self, validation_config: dict | None = None):
+        self.validation_config = validation_config or {}
+        self.validator_name = self.validation_config.get("validator", "html5lib")
+        self.repair = self.validation_config.get("repair", True)
+        self.cleaner = StreamingHTMLCleaner()
+        self.validator = (
+            StreamingHTMLValidator() if self.validator_name == "fast" else None
+        )
+        self.chunks = []
+        self.error = None
+
+    def feed(self, delta: str):
+        cleaned = self.cleaner.feed(delta)
+        if cleaned:
+            self.chunks.append(cleaned)
+            if self.validator is not None and self.error is None:
+                error = self.validator.feed(cleaned)
+                self.error = None if self.repair else error
+        return cleaned, self.error
+
+    def close(self):
+        cleaned = self.cleaner.close()
+        self.chunks.append(cleaned)
+        cleaned_results = "".join(self.chunks)
+
+        logger.info("Performing HTML validation now...")
+        validate_html = get_validator(self.validator_name)
+        with time_stage("validate"):
+            if self.validator is None:
+                result = None
+            else:
+                self.validator.feed(cleaned)
+                try:
+                    result = self.validator.close()
+                except NotValidHTMLException as e:
+                    if not self.repair:
+                        record_validation(False)
+                        raise
+                    result = False, str(e)
+            if self.repair:
+                cleaned_results, validated, validation_message = validate_with_repair(
+                    cleaned_results, validate_html, result
+                )
+            else:
+                validated, validation_message = result or validate_html(cleaned_results)
+        record_validation(validated)
+        return cleaned, cleaned_results, validated, validation_message
+
+
+def build_report_payload(
+    html_report: str,
+    provider: str,
+    model: str,
+    len_of_input: int,
+    len_of_output: int,
+    token_counts: dict,
+) -> dict:
+    return {
+        "html_report": html_report,
+        "provider": provider,
+        "model": model,
+        "input_length": len_of_input,
+        "output_length": len_of_output,
+        "total_chars": len_of_input + len_of_output,
+        "token_counts": {**token_counts, "output": estimate_tokens(html_report)},
+        "status": "success",
+    }
+
+
+def lookup_cached_report(report_cache: ReportCache | None, cache_key: str, headers):
+    """Return (cached_value, cache_status) for a report request."""
+    if report_cache is None:
+        return None, "disabled"
+    if cache_bypass_requested(headers):
+        report_cache.record_bypass()
+        record_cache_lookup("bypass")
+        return None, "bypass"
+    cached, status = report_cache.get(cache_key)
+    record_cache_lookup(status)
+    return cached, status
+
+
+def store_cached_report(
+    report_cache: ReportCache | None, cache_key: str, payload, config_manager
+):
+    if report_cache is None:
+        return
+    # the key names the configured provider and model; a report from a fallback
+    # provider or the hedge model would be served in their place on the next hit
+    served = (payload["provider"], payload["model"])
+    if served != (config_manager.llm_provider_name, config_manager.model):
+        logger.info(f"Not caching a report served by {served[0]}/{served[1]}")
+        return
+    report_cache.set(cache_key, payload)
+
+
+@timed_stage("reuse_lookup")
+def find_reuse_draft(report_reuse: ReportReuseIndex | None, user_data: dict):
+    """Return (draft, profile vector, household names, reuse info) for an export.
+
+    draft is None unless a stored report's profile is within the reuse distance.
+    """
+    if report_reuse is None:
+        return None, None, None, {"status": "disabled"}
+    roadmap = parse_roadmap_output(user_data)
+    vector = profile_features(roadmap)
+    names = household_names(roadmap)
+    draft, distance = report_reuse.find(vector)
+    info = {"status": "miss" if draft is None else "hit"}
+    if distance is not None and distance != float("inf"):
+        info["distance"] = round(distance, 4)
+    if draft is not None:
+        logger.info(f"Adapting the report of a similar household ({info['distance']})")
+    return draft, vector, names, info
+
+
+def store_reuse_draft(
+    report_reuse: ReportReuseIndex | None, vector, draft: str, names: list
+):
+    # only full generations are stored, so adapted reports never drift from an original
+    if report_reuse is None or vector is None:
+        return
+    report_reuse.add(vector, draft, names)
+
+
+def reject_leaked_draft(
+    report: dict, analysis_result: str, config_manager, report_reuse
+) -> bool:
+    """Whether an adapted report still names people from its draft's household.
+
+    If so, report is switched to a full generation and the caller analyzes
+    report["query"] again; the adapted output is never cached or returned.
+    """
+    if report["draft"] is None:
+        return False
+    leaked = leaked_names(report["draft"], report["names"], analysis_result)
+    if not leaked:
+        return False
+    logger.warning(
+        f"Adapted report still names {len(leaked)} people from its draft, "
+        "generating it in full"
+    )
+    report_reuse.record_rejected()
+    report["query"] = report_query(config_manager.output_config)
+    report["draft"] = None
+    report["reuse_info"] = {**report["reuse_info"], "status": "rejected"}
+    return True
+
+
+def prepare_report(
+    user_data: dict, config_manager, report_cache, headers, report_reuse=None
+):
+    """Everything before the LLM call: preprocess, cache lookup and reuse lookup.
+
+    Returns (cached payload, None) on a cache hit, else (None, report), where report
+    holds the query and context for llm.analyze and what complete_report needs.
+    """
+    context, token_counts = build_report_context(
+        user_data, config_manager.context_config
+    )
+
+    structured = structured_output_enabled(config_manager.output_config)
+    query = report_query(config_manager.output_config)
+    cache_key = make_cache_key(
+        context, query, config_manager.llm_provider_name, config_manager.model
+    )
+    cached, cache_status = lookup_cached_report(report_cache, cache_key, headers)
+    if cached is not None:
+        logger.info(f"Serving report from cache ({cache_status})")
+        return {**cached, "cache": cache_status}, None
+
+    draft, vector, names, reuse_info = find_reuse_draft(report_reuse, user_data)
+    if draft is not None:
+        query = adapt_report_query(draft)
+    return None, {
+        "context": context,
+        "query": query,
+        "structured": structured,
+        "token_counts": token_counts,
+        "cache_key": cache_key,
+        "cache_status": cache_status,
+        "draft": draft,
+        "vector": vector,
+        "names": names,
+        "reuse_info": reuse_info,
+    }
+
+
+def complete_report(
+    report: dict,
+    analysis,
+    llm,
+    user_data: dict,
+    config_manager,
+    report_cache,
+    report_reuse=None,
+):
+    """Everything after the LLM call: clean, validate and store the report.
+
+    analysis is llm.analyze's (output, input chars, output chars); returns the
+    response payload and its http status code.
+    """
+    analysis_result, len_of_input, len_of_output = analysis
+    cleaned_results, validated, validation_message = finish_report(
+        analysis_result, user_data, config_manager
+    )
+
+    if validated:
+        logger.info("HTML was validated!")
+        # with the provider router enabled, the report may come from a fallback provider
+        served_provider, served_model = llm.served_by()
+        payload = build_report_payload(
+            cleaned_results,
+            served_provider,
+            served_model,
+            len_of_input,
+            len_of_output,
+            report["token_counts"],
+        )
+        payload["reuse"] = report["reuse_info"]
+        store_cached_report(report_cache, report["cache_key"], payload, config_manager)
+        if report["draft"] is None:
+            store_reuse_draft(
+                report_reuse,
+                report["vector"],
+                analysis_result if report["structured"] else cleaned_results,
+                report["names"],
+            )
+        return {**payload, "cache": report["cache_status"]}, 200
+
+    logger.error(f"HTML Validation failed: {validation_message}")
+    return {
+        "status": "error",
+        "message": "HTML validation failed",
+        "details": validation_message,
+        "partial_response": validation_message[:1000],
+    }, 500
+
+
+def process_report(
+    user_data: dict, llm, config_manager, report_cache, headers, report_reuse=None
+):
+    """Run preprocess -> cache lookup -> analyze -> clean -> validate for one export.
+
+    Returns the response payload and its http status code.
+    """
+    cached, report = prepare_report(
+        user_data, config_manager, report_cache, headers, report_reuse
+    )
+    if cached is not None:
+        return cached, 200
+
+    logger.info("Performing LLM analysis now...")
+    with time_stage("llm"):
+        analysis = llm.analyze(report["query"], report["context"], report["structured"])
+    if reject_leaked_draft(report, analysis[0], config_manager, report_reuse):
+        with time_stage("llm"):
+            analysis = llm.analyze(
+                report["query"], report["context"], report["structured"]
+            )
+    return complete_report(
+        report, analysis, llm, user_data, config_manager, report_cache, report_reuse
+    )
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def format_report_sse(payload: dict, status_code: int) -> str:
+    """A finished report as server-sent events: the whole report as one delta, then done."""
+    if status_code != 200:
+        return format_sse("error", payload)
+    return format_sse("delta", {"text": payload["html_report"]}) + format_sse(
+        "done", payload
+    )
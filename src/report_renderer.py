@@ -0,0 +1,227 @@
+"""Structured report mode: the LLM returns the report sections as JSON and the
+HTML is rendered here from src/templates/report.html.
+
+The model only writes the narrative, so far fewer output tokens go on markup, and
+the section 1 work history table comes straight from the benefit engine rather
+than from the model. The template escapes every value and never emits an empty
+element, so the rendered report always passes validation.
+"""
+
+import functools
+import json
+import os
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+from src.benefit_engine import compute_benefit_figures
+from src.html_cleaner import strip_newlines_from_html
+from src.html_repair import run_validator, strip_markdown_fences
+from src.logging_config import get_logger
+from src.roadmap_output_ingestor import parse_roadmap_output
+from src.valid_html import get_validator
+
+logger = get_logger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+REPORT_TEMPLATE = "report.html"
+
+# JSON schema for the sections the model writes; the work history table is
+# rendered from computed data, so only its commentary is asked for
+REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "work_history_summary": {"type": "string"},
+        "benefits_analysis": {"type": "array", "items": {"type": "string"}},
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "steps": {"type": "array", "items": {"type": "string"}},
+                    "sources": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["title", "steps", "sources"],
+            },
+        },
+        "dependents": {"type": "array", "items": {"type": "string"}},
+        "rules": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "rule": {"type": "string"},
+                    "source": {"type": "string"},
+                },
+                "required": ["rule", "source"],
+            },
+        },
+    },
+    "required": [
+        "work_history_summary",
+        "benefits_analysis",
+        "recommendations",
+        "dependents",
+        "rules",
+    ],
+}
+
+STRUCTURED_REPORT_QUERY = """
+        Based on the provided user data for both the primary beneficiary and spouse, and the relevant Social Security rules, return a JSON object with these keys:
+        - "work_history_summary": one or two sentences on their work history and earnings. A table of years worked, lifetime earnings, PIA and average earnings is added from the computed figures, so do not repeat those numbers as a table.
+        - "benefits_analysis": a list of paragraphs analyzing their estimated Social Security benefits, including any spousal benefits they might be eligible for.
+        - "recommendations": a list of recommendations for optimizing their Social Security benefits as a couple, each an object with "title", "steps" (the strategy in procedural form, one step per item, so it can be followed easily) and "sources" (where the information comes from). Be extremely detailed whenever possible.
+        - "dependents": a list of insights related to their dependents, empty if there are none.
+        - "rules": a list of the specific rules referenced in the analysis, each an object with "rule" and "source".
+
+        Important:
+        - Respond with the JSON object only: no HTML, no markdown and no code block syntax.
+        - Use plain text in every string; formatting is applied when the report is rendered.
+        """
+
+
+class StructuredReportError(ValueError):
+    """The model's output could not be read as a structured report."""
+
+
+def _usd(value) -> str:
+    return f"${value:,.2f}"
+
+
+@functools.lru_cache(maxsize=1)
+def _template():
+    # compiled once per process; autoescape so model text can't inject markup
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=True,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        undefined=StrictUndefined,
+    )
+    environment.filters["usd"] = _usd
+    return environment.get_template(REPORT_TEMPLATE)
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    return value.strip() if isinstance(value, str) else str(value).strip()
+
+
+def _items(value) -> list:
+    # a lone value where a list was asked for still counts
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _texts(value) -> list:
+    # blanks would render as empty elements, so they are dropped
+    return [text for text in map(_text, _items(value)) if text]
+
+
+def _load_json(analysis_result: str) -> dict:
+    text = strip_markdown_fences(analysis_result.strip())
+    try:
+        report = json.loads(text)
+    except json.JSONDecodeError:
+        # prose around the object from a provider without a JSON mode
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise StructuredReportError("No JSON object in the model output")
+        try:
+            report = json.loads(text[start : end + 1])
+        except json.JSONDecodeError as e:
+            raise StructuredReportError(f"Invalid JSON in the model output: {e}")
+    if not isinstance(report, dict):
+        raise StructuredReportError("Model output is not a JSON object")
+    return report
+
+
+def parse_structured_report(analysis_result: str) -> dict:
+    """Read the model output into the sections the template expects.
+
+    Missing sections come back empty; raises StructuredReportError when the
+    output isn't a JSON object.
+    """
+    report = _load_json(analysis_result)
+
+    recommendations = []
+    for index, item in enumerate(_items(report.get("recommendations")), start=1):
+        if not isinstance(item, dict):
+            item = {"steps": item}
+        recommendation = {
+            "title": _text(item.get("title")) or f"Recommendation {index}",
+            "steps": _texts(item.get("steps")),
+            "sources": _texts(item.get("sources")),
+        }
+        recommendations.append(recommendation)
+
+    rules = []
+    for item in _items(report.get("rules")):
+        if not isinstance(item, dict):
+            item = {"rule": item}
+        rule = _text(item.get("rule"))
+        if rule:
+            rules.append({"rule": rule, "source": _text(item.get("source"))})
+
+    return {
+        "work_history_summary": _text(report.get("work_history_summary")),
+        "benefits_analysis": _texts(report.get("benefits_analysis")),
+        "recommendations": recommendations,
+        "dependents": _texts(report.get("dependents")),
+        "rules": rules,
+    }
+
+
+def work_history_rows(roadmap: dict) -> list:
+    """Section 1 table rows for a parsed roadmap, from the benefit engine."""
+    figures = compute_benefit_figures(roadmap)
+    rows = []
+    for key in ("primary", "spouse"):
+        person = figures[key]
+        if person is None:
+            continue
+        rows.append(
+            {
+                "individual": roadmap[key]["name"],
+                "years_worked": person["years_worked"],
+                "total_earnings": person["total_earnings"],
+                "pia": person["pia"],
+                "avg_annual_earnings": person["avg_annual_earnings"],
+            }
+        )
+    return rows
+
+
+def render_report(report: dict, roadmap: dict) -> str:
+    """HTML for parsed report sections, with the newlines already stripped."""
+    html = _template().render(report=report, work_history=work_history_rows(roadmap))
+    return strip_newlines_from_html(html)
+
+
+def render_structured_report(
+    analysis_result: str, user_data: dict, validation_config: dict | None = None
+):
+    """Render the model's JSON into the report HTML.
+
+    Returns (html, validated, validation_message) like clean_and_validate_report;
+    output that can't be read as a report fails with the reason as the message.
+    """
+    validation_config = validation_config or {}
+    try:
+        report = parse_structured_report(analysis_result)
+    except StructuredReportError as e:
+        logger.error(f"Structured report could not be read: {str(e)}")
+        return "", False, str(e)
+
+    html = render_report(report, parse_roadmap_output(user_data))
+    # the template can't produce invalid markup, but check anyway so a broken
+    # template edit fails loudly instead of shipping
+    validate_html = get_validator(validation_config.get("validator", "html5lib"))
+    validated, validation_message = run_validator(validate_html, html)
+    return html, validated, validation_message
+
+
+def structured_output_enabled(output_config: dict) -> bool:
+    return output_config.get("format", "html") == "json"
@@ -0,0 +1,358 @@
+"""Reuse a report written for a near-identical household as a draft.
+
+Each generated report is stored with a feature vector of the household it was
+written for: ages, FRA, PIA, earnings summary, benefit status, dependents and
+pensions, scaled so that a euclidean distance of about 0.1 is a small
+difference in one of them (a year of age, $100 of PIA). A new export whose
+nearest stored profile is within `max_distance` gets that report back as a draft
+for a short "adapt this report" prompt instead of a full generation.
+
+Reports are kept in a sqlite file shared by every worker. Each process searches
+an in-memory Annoy index over the rows it has indexed, plus a brute-force scan
+of rows added since, and rebuilds the index once `rebuild_every` rows are waiting.
+
+Each row also keeps the names in the draft's household, so an adapted report
+that still mentions one of them can be rejected.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from annoy import AnnoyIndex
+
+from src.benefit_engine import compute_benefit_figures, fra_months
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ADAPT_REPORT_QUERY = """
+        The draft below is a report written for a different client whose situation is nearly identical. Adapt it to the user data above and return the complete report in the same format as the draft.
+        - Replace every name, date, age and dollar figure with this client's; nothing about the draft's client may remain.
+        - Change any analysis or recommendation the differences in the data make wrong, and keep everything else as written.
+        Draft:
+        """
+
+# (feature, scale): each feature is divided by its scale, so a difference of
+# one scale unit adds 1 to the distance
+PERSON_FEATURES = (
+    ("present", 1.0),
+    ("age", 10.0),
+    ("fra_years", 1.0),
+    ("pia", 1000.0),
+    ("years_worked", 35.0),
+    ("avg_annual_earnings", 100_000.0),
+    ("life_expectancy", 10.0),
+    ("is_collecting_benefits", 1.0),
+    ("is_disabled", 1.0),
+    ("has_pension", 1.0),
+)
+HOUSEHOLD_FEATURES = (
+    ("married", 1.0),
+    ("children", 1.0),
+    ("disabled_children", 1.0),
+    ("pensions", 1.0),
+    ("cola", 2.0),
+    ("nominal_rate_of_return", 2.0),
+)
+# a stored report, and the names of the household it was written for
+Draft = namedtuple("Draft", ["text", "names"])
+
+DIMENSION = 2 * len(PERSON_FEATURES) + len(HOUSEHOLD_FEATURES)
+_PERSON_SCALES = np.array([scale for _, scale in PERSON_FEATURES])
+_HOUSEHOLD_SCALES = np.array([scale for _, scale in HOUSEHOLD_FEATURES])
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _person_features(person: dict | None, figures: dict | None) -> np.ndarray:
+    if person is None:
+        return np.zeros(len(PERSON_FEATURES))
+    values = (
+        1.0,
+        _number(person["age"]),
+        fra_months(person["birth_date"]) / 12,
+        figures["pia"],
+        figures["years_worked"],
+        figures["avg_annual_earnings"],
+        _number(person["life_expectancy"]),
+        bool(person["is_collecting_benefits"]),
+        bool(person["is_disabled"] or person["blind"]),
+        bool(person["has_pension"]),
+    )
+    return np.array(values, dtype=float) / _PERSON_SCALES
+
+
+def household_names(roadmap: dict) -> list:
+    """Every first, middle and last name of the household's people, deduplicated."""
+    people = [roadmap["primary"], roadmap["spouse"], *roadmap["children"]]
+    names = set()
+    for person in people:
+        if person is not None and isinstance(person["name"], str):
+            names.update(part for part in person["name"].split() if len(part) > 1)
+    return sorted(names)
+
+
+def leaked_names(draft: Draft, names: list, text: str) -> list:
+    """Names of the draft's household, not shared with this one, still in text."""
+    own = {name.lower() for name in names}
+    foreign = [name for name in draft.names if name.lower() not in own]
+    if not foreign:
+        return []
+    pattern = r"\b(?:" + "|".join(map(re.escape, foreign)) + r")\b"
+    return sorted(set(re.findall(pattern, text, flags=re.IGNORECASE)))
+
+
+def profile_features(roadmap: dict) -> np.ndarray:
+    """The household's feature vector, length DIMENSION."""
+    figures = compute_benefit_figures(roadmap)
+    spouse = roadmap["spouse"]
+    settings = roadmap["settings"]
+    household = np.array(
+        (
+            spouse is not None and roadmap["marital_status"] == 2,
+            min(len(roadmap["children"]), 3),
+            sum(bool(child["is_disabled"]) for child in roadmap["children"]),
+            min(len(roadmap["pensions"]), 3),
+            _number(settings["cola"]),
+            _number(settings["nominal_rate_of_return"]),
+        ),
+        dtype=float,
+    )
+    return np.concatenate(
+        (
+            _person_features(roadmap["primary"], figures["primary"]),
+            _person_features(spouse, figures["spouse"]),
+            household / _HOUSEHOLD_SCALES,
+        )
+    ).astype(np.float32)
+
+
+class ReportReuseIndex:
+    """Stored reports searchable by household profile; see the module docstring."""
+
+    def __init__(
+        self,
+        path: str,
+        output_format: str = "html",
+        max_distance: float = 0.25,
+        n_trees: int = 10,
+        rebuild_every: int = 256,
+        refresh_seconds: float = 5.0,
+    ):
+        self.path = path
+        # drafts only make sense for the output format they were written in
+        self.output_format = output_format
+        self.max_distance = max_distance
+        self.n_trees = n_trees
+        self.rebuild_every = rebuild_every
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # rows in the Annoy index, by Annoy item number
+        self._indexed_ids = []
+        self._indexed_vectors = []
+        self._annoy = None
+        # rows read since the last rebuild, searched by brute force
+        self._pending_ids = []
+        self._pending_vectors = []
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "rejected": 0,
+            "stores": 0,
+            "errors": 0,
+        }
+        self._hit_distance_total = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, output_format TEXT NOT NULL, "
+                "vector BLOB NOT NULL, draft TEXT NOT NULL, created_at REAL NOT NULL, "
+                "names TEXT NOT NULL DEFAULT '[]')"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+            if "names" not in columns:
+                # files created before names were stored; their drafts go unchecked
+                conn.execute(
+                    "ALTER TABLE profiles ADD COLUMN names TEXT NOT NULL DEFAULT '[]'"
+                )
+
+    def _connect(self):
+        # sqlite connections can't cross threads or forks, so keep one per thread and pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _refresh(self):
+        """Pick up rows other workers stored; call with self._lock held."""
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_seconds:
+            return
+        self._refreshed_at = now
+        rows = (
+            self._connect()
+            .execute(
+                "SELECT id, vector FROM profiles "
+                "WHERE id > ? AND output_format = ? ORDER BY id",
+                (self._last_id, self.output_format),
+            )
+            .fetchall()
+        )
+        for row_id, vector in rows:
+            self._pending_ids.append(row_id)
+            self._pending_vectors.append(np.frombuffer(vector, dtype=np.float32))
+            self._last_id = row_id
+        if len(self._pending_ids) >= self.rebuild_every:
+            self._rebuild()
+
+    def _rebuild(self):
+        started = time.perf_counter()
+        # an Annoy index can't take items once built, so build a new one over all rows
+        self._indexed_ids += self._pending_ids
+        self._indexed_vectors += self._pending_vectors
+        annoy = AnnoyIndex(DIMENSION, "euclidean")
+        for item, vector in enumerate(self._indexed_vectors):
+            annoy.add_item(item, vector)
+        annoy.build(self.n_trees)
+        self._annoy = annoy
+        self._pending_ids, self._pending_vectors = [], []
+        logger.info(
+            f"Rebuilt report reuse index over {len(self._indexed_ids)} profiles in "
+            f"{time.perf_counter() - started:.3f}s"
+        )
+
+    def _nearest(self, vector: np.ndarray):
+        """(row id, distance) of the closest stored profile, or (None, inf)."""
+        best_id, best_distance = None, float("inf")
+        if self._annoy is not None:
+            items, distances = self._annoy.get_nns_by_vector(
+                vector, 1, include_distances=True
+            )
+            if items:
+                best_id, best_distance = self._indexed_ids[items[0]], distances[0]
+        if self._pending_vectors:
+            distances = np.linalg.norm(np.stack(self._pending_vectors) - vector, axis=1)
+            closest = int(distances.argmin())
+            if distances[closest] < best_distance:
+                best_id, best_distance = self._pending_ids[closest], float(
+                    distances[closest]
+                )
+        return best_id, best_distance
+
+    def find(self, vector: np.ndarray):
+        """Return (Draft, distance) for the nearest profile within max_distance, else (None, distance)."""
+        try:
+            with self._lock:
+                self._refresh()
+                row_id, distance = self._nearest(vector)
+            row = None
+            if row_id is not None and distance <= self.max_distance:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT draft, names FROM profiles WHERE id = ?", (row_id,)
+                    )
+                    .fetchone()
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Report reuse lookup failed: {str(e)}")
+            self._count("errors")
+            return None, None
+        with self._lock:
+            self._stats["lookups"] += 1
+            if row is None:
+                self._stats["misses"] += 1
+                return None, distance
+            self._stats["hits"] += 1
+            self._hit_distance_total += distance
+        return Draft(row[0], json.loads(row[1])), distance
+
+    def add(self, vector: np.ndarray, draft: str, names: list = ()):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO profiles "
+                    "(output_format, vector, draft, created_at, names) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.output_format,
+                        vector.astype(np.float32).tobytes(),
+                        draft,
+                        time.time(),
+                        json.dumps(list(names)),
+                    ),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Report reuse store failed: {str(e)}")
+            self._count("errors")
+            return
+        with self._lock:
+            # picked up on the next lookup instead of waiting for refresh_seconds
+            self._refreshed_at = 0.0
+        self._count("stores")
+
+    def record_rejected(self):
+        self._count("rejected")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["indexed"] = len(self._indexed_ids)
+            stats["pending"] = len(self._pending_ids)
+            hit_distance_total = self._hit_distance_total
+        stats["max_distance"] = self.max_distance
+        stats["hit_rate"] = (
+            stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        )
+        stats["mean_hit_distance"] = (
+            round(hit_distance_total / stats["hits"], 4) if stats["hits"] else None
+        )
+        return stats
+
+
+def adapt_report_query(draft: Draft) -> str:
+    return ADAPT_REPORT_QUERY + draft.text
+
+
+def build_report_reuse(
+    reuse_config: dict, output_format: str = "html"
+) -> ReportReuseIndex | None:
+    if not reuse_config.get("enabled", False):
+        logger.debug("Report reuse disabled")
+        return None
+    logger.debug(f"Using report reuse config: {reuse_config}")
+    return ReportReuseIndex(
+        path=reuse_config.get("sqlite_path", "cache/report_reuse.sqlite3"),
+        output_format=output_format,
+        max_distance=reuse_config.get("max_distance", 0.25),
+        n_trees=reuse_config.get("n_trees", 10),
+        rebuild_every=reuse_config.get("rebuild_every", 256),
+        refresh_seconds=reuse_config.get("refresh_seconds", 5.0),
+    )
@@ -0,0 +1,210 @@
+"""Opt-in cProfile of individual /process requests.
+
+A request is profiled when it sends `X-Profile: 1` (the profile is written to
+`profiling.output_dir`) or `X-Profile: inline` (the hot functions are returned in
+the response), or when it is drawn by `profiling.sample_rate`. Either way the
+functions with the most self time are logged. With profiling disabled the routes
+get a shared nullcontext, so a request pays for nothing but one attribute check.
+
+cProfile only hooks the thread that enables it, so the ASGI app profiles just the
+work a request hands to worker threads (see ProfiledCalls) rather than the event
+loop, where every other request's coroutines run too.
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+_NOT_PROFILED = nullcontext()
+
+
+class ProfiledCalls:
+    """One profile over several calls, each enabled in the thread that makes it."""
+
+    def __init__(self, mode: str):
+        self.result = {"mode": mode}
+        self.profiler = cProfile.Profile()
+        self.seconds = 0.0
+        self.calls = 0
+
+    def run(self, func, *args):
+        """func(*args), profiled; meant to be what asyncio.to_thread runs."""
+        started = time.perf_counter()
+        self.profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            self.profiler.disable()
+            self.seconds += time.perf_counter() - started
+            self.calls += 1
+
+
+class RequestProfiler:
+    """Profiles one request at a time per process, keeps max_files profiles on disk."""
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_files: int = 100,
+        sample_rate: float = 0.0,
+        allow_header: bool = True,
+        top_n: int = 15,
+    ):
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.top_n = top_n
+        # only one profiler can hook a thread's calls, and one request at a time keeps
+        # the cost bounded
+        self._lock = threading.Lock()
+        self._count = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def requested(self, headers) -> str | None:
+        """The profiling mode, "inline", "file" or None, for these request headers."""
+        if self.allow_header:
+            value = headers.get(PROFILE_HEADER, "").lower()
+            if value == "inline":
+                return "inline"
+            if value in ("1", "true", "yes"):
+                return "file"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "file"
+        return None
+
+    @contextmanager
+    def profile(self, mode: str):
+        """Profile the block; the yielded dict gets the results when the block exits."""
+        result = {"mode": mode}
+        if not self._lock.acquire(blocking=False):
+            logger.debug("Another request is being profiled, not profiling this one")
+            yield None
+            return
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            self._lock.release()
+            # written even when the request failed, a slow failure is worth a look too
+            self._finish(profiler, mode, time.perf_counter() - started, result)
+
+    @contextmanager
+    def profile_calls(self, mode: str):
+        """Like profile, but only the calls run through the yielded ProfiledCalls."""
+        if not self._lock.acquire(blocking=False):
+            logger.debug("Another request is being profiled, not profiling this one")
+            yield None
+            return
+        calls = ProfiledCalls(mode)
+        try:
+            yield calls
+        finally:
+            self._lock.release()
+            # a request that failed before its first call has nothing to report
+            if calls.calls:
+                self._finish(calls.profiler, mode, calls.seconds, calls.result)
+
+    def _finish(self, profiler, mode: str, seconds: float, result: dict):
+        stats = pstats.Stats(profiler)
+        result["seconds"] = round(seconds, 4)
+        result["hot_functions"] = hot_functions(stats, self.top_n)
+        if mode == "file":
+            result["path"] = self._write(profiler)
+        logger.info(
+            f"Profiled request in {seconds:.3f}s"
+            + (f" ({result['path']})" if "path" in result else "")
+            + ", top functions by self time: "
+            + "; ".join(
+                f"{row['function']} {row['self_seconds']}s/{row['calls']} calls"
+                for row in result["hot_functions"][:5]
+            )
+        )
+
+    def _write(self, profiler) -> str:
+        self._count += 1
+        path = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._count}.prof",
+        )
+        profiler.dump_stats(path)
+        self._prune()
+        return path
+
+    def _prune(self):
+        # workers share the directory, so another one may remove a file first
+        profiles = []
+        for name in os.listdir(self.output_dir):
+            if not name.endswith(".prof"):
+                continue
+            path = os.path.join(self.output_dir, name)
+            try:
+                profiles.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        profiles.sort()
+        for _, path in profiles[: max(len(profiles) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def hot_functions(stats: pstats.Stats, top_n: int) -> list:
+    """The top_n functions by self time, with their call counts and cumulative time."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    return [
+        {
+            "function": pstats.func_std_string(func),
+            "calls": calls,
+            "self_seconds": round(self_time, 4),
+            "cumulative_seconds": round(cumulative, 4),
+        }
+        for func, (_, calls, self_time, cumulative, _) in rows[:top_n]
+    ]
+
+
+def request_profile(request_profiler: RequestProfiler | None, headers):
+    """A context manager that profiles this request if it should, else yields None."""
+    if request_profiler is None:
+        return _NOT_PROFILED
+    mode = request_profiler.requested(headers)
+    if mode is None:
+        return _NOT_PROFILED
+    return request_profiler.profile(mode)
+
+
+def request_calls_profile(request_profiler: RequestProfiler | None, headers):
+    """request_profile for the ASGI app: yields a ProfiledCalls or None."""
+    if request_profiler is None:
+        return _NOT_PROFILED
+    mode = request_profiler.requested(headers)
+    if mode is None:
+        return _NOT_PROFILED
+    return request_profiler.profile_calls(mode)
+
+
+def build_request_profiler(profiling_config: dict) -> RequestProfiler | None:
+    if not profiling_config.get("enabled", False):
+        logger.debug("Request profiling disabled")
+        return None
+    logger.debug(f"Using request profiling config: {profiling_config}")
+    return RequestProfiler(
+        output_dir=profiling_config.get("output_dir", "cache/profiles"),
+        max_files=profiling_config.get("max_files", 100),
+        sample_rate=profiling_config.get("sample_rate", 0.0),
+        allow_header=profiling_config.get("header", True),
+        top_n=profiling_config.get("top_n", 15),
+    )
@@ -1,186 +1,389 @@
 import json
+from collections import namedtuple
 from datetime import datetime
 
+from src.context_encoding import fit_compact_context
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class RoadmapValidationError(ValueError):
+    """Raised when a roadmap export is missing fields or has fields of the wrong type"""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__(f"Invalid roadmap export: {'; '.join(errors)}")
+
+
+def _date(value):
+    # fromisoformat is much faster than strptime; the shape check keeps it as strict as DATE_FORMAT
+    if len(value) != 19 or value[10] != "T":
+        raise ValueError(f"time data {value!r} does not match format {DATE_FORMAT!r}")
+    return datetime.fromisoformat(value)
+
+
+def _optional_date(value):
+    return None if value is None else _date(value)
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"expected a number, got {value!r}")
+    return value
+
+
+def _optional_number(value):
+    return None if value is None else _number(value)
+
+
+def _raw(value):
+    return value
+
+
+def _full_name(first_name, last_name):
+    return f"{first_name} {last_name}"
+
+
+# Field mapping tables: (output key, section, source keys, converter).
+# "data" is raw_data["data"], "ss" is raw_data["data"]["SSCalData"] and "item" is one
+# entry of a list. "{p}" in a source key is replaced with "Primary" or "Spouse".
+PERSON_FIELDS = [
+    ("name", "data", ("{p}_FirstName", "{p}_LastName"), _full_name),
+    ("birth_date", "data", ("{p}_BirthDate",), _date),
+    ("age", "data", ("{p}_Age",), _raw),
+    ("gender", "data", ("{p}_GenderID",), _raw),
+    ("email", "data", ("{p}_Email",), _raw),
+    ("phone", "data", ("{p}_Phone",), _raw),
+    ("blind", "data", ("{p}_Blind",), _raw),
+    ("pia", "ss", ("{p}_PIA",), _number),
+    ("fra", "ss", ("{p}_FRA",), _date),
+    ("fra_age", "ss", ("{p}_FRAAge",), _raw),
+    ("has_full_coverage", "ss", ("{p}_HasFullCoverage",), _raw),
+    ("is_disabled", "ss", ("{p}_IsDisabled",), _raw),
+    ("has_pension", "ss", ("{p}_HasPension",), _raw),
+    ("is_collecting_benefits", "ss", ("{p}_IsCollectingBenefits",), _raw),
+    ("cal_basis", "ss", ("{p}_CalBasis",), _raw),
+    ("est_retirement_age", "ss", ("{p}_EstRetirementAge",), _raw),
+    ("how_cal_benefits", "ss", ("{p}_HowCalBenefits",), _raw),
+    ("benefits_start_date", "ss", ("{p}_BenefitsStartDate",), _optional_date),
+    ("entitlement_date", "ss", ("{p}_EntitlementDate",), _raw),
+    ("annual_earning_rate", "ss", ("{p}_AnualEarningRate",), _raw),
+    ("annual_part_time_earning_rate", "ss", ("{p}_AnualPartTimeEarningRate",), _raw),
+    ("disability_benefit", "ss", ("{p}_DisabilityBenefit",), _raw),
+    ("pen_amount", "ss", ("{p}_PenAmount",), _raw),
+    ("pen_salary_ss", "ss", ("{p}_PenSalarySS",), _raw),
+    ("pia_62", "ss", ("{p}_PIA62",), _raw),
+    ("pia_70", "ss", ("{p}_PIA70",), _raw),
+    ("qe_avg_salary", "ss", ("{p}_QEAvgSalary",), _raw),
+    ("sspia", "ss", ("{p}_SSPIA",), _raw),
+    ("ss_earning", "ss", ("{p}_SSEarning",), _raw),
+    ("wep_bend_rate", "ss", ("{p}_WEPBendRate",), _raw),
+    ("fra_year", "ss", ("{p}_FRAYear",), _raw),
+    ("last_year_earnings_age", "ss", ("{p}_LastYearEarningsAge",), _raw),
+    (
+        "last_year_part_time_earnings_age",
+        "ss",
+        ("{p}_LastYearPartTimeEarningsAge",),
+        _raw,
+    ),
+    ("life_expectancy", "ss", ("{p}_LifeExpectancy",), _number),
+    ("qe_years_worked", "ss", ("{p}_QEYearsWorked",), _raw),
+]
+
+PRIMARY_ONLY_FIELDS = [
+    ("has_children", "ss", ("Primary_HasChildren",), _raw),
+    ("is_remarried", "ss", ("Primary_IsRemarried",), _raw),
+    ("married_before_60", "ss", ("Primary_MarriedBefore60",), _raw),
+    ("married_over_10_years", "ss", ("Primary_MarriedOver10Years",), _raw),
+    ("divorce_date", "ss", ("Primary_DivorceDate",), _raw),
+    ("benefits_amount", "ss", ("Primary_BenefitsAmount",), _raw),
+]
+
+SPOUSE_ONLY_FIELDS = [
+    ("is_living", "ss", ("Spouse_IsLiving",), _raw),
+    ("death_date", "ss", ("Spouse_DeathDate",), _raw),
+    ("annual_income", "ss", ("Spouse_AnualIncome",), _raw),
+    ("benefit_amount", "ss", ("Spouse_BenefitAmount",), _raw),
+]
+
+CHILD_FIELDS = [
+    ("name", "item", ("Name",), _raw),
+    ("birth_date", "item", ("BirthDate",), _date),
+    ("age", "item", ("Age",), _raw),
+    ("high_school_grad_date", "item", ("HighSchoolGradDate",), _date),
+    ("is_collecting_benefits", "item", ("IsCollectingBenefits",), _raw),
+    ("benefits_start_date", "item", ("BenefitsStartDate",), _raw),
+    ("benefits_amount", "item", ("BenefitsAmount",), _raw),
+    ("is_disabled", "item", ("IsDisabled",), _raw),
+    ("disability_benefit", "item", ("DisabilityBenefit",), _raw),
+    ("supplemental_income", "item", ("SupplementalIncome",), _raw),
+    ("dependent_type", "item", ("DependentType",), _raw),
+]
+
+PENSION_FIELDS = [
+    ("title", "item", ("Title",), _raw),
+    ("annual_amount", "item", ("AnnualAmount",), _number),
+    ("lump_sum_amount", "item", ("LumpSumAmount",), _optional_number),
+    ("start_year", "item", ("StartYear",), _raw),
+    ("exempt_from_gpo", "item", ("ExemptFromGPO",), _raw),
+]
+
+EARNING_FIELDS = [
+    ("year", "item", ("YearID",), _raw),
+    ("is_primary", "item", ("IsPrimary",), _raw),
+    ("earning", "item", ("Earning",), _number),
+]
+
+SETTINGS_FIELDS = [
+    ("cola", "item", ("COLA",), _number),
+    ("inflation_rate", "item", ("InflationRate",), _number),
+    ("nominal_rate_of_return", "item", ("NominalRateOfReturn",), _number),
+    ("real_rate_of_return", "item", ("RealRateOfReturn",), _number),
+]
+
+
+Schema = namedtuple("Schema", ["fields", "extract", "extract_item"])
+
+
+def _fill_record(record: dict, source: dict, steps: tuple) -> dict:
+    for key, sources, convert in steps:
+        if convert is None:
+            record[key] = source[sources]
+        elif isinstance(sources, str):
+            record[key] = convert(source[sources])
+        else:
+            record[key] = convert(*[source[name] for name in sources])
+    return record
+
+
+def _build_schema(fields, prefix=""):
+    """Resolve a field table once at import.
+
+    Returns the resolved fields (also used to report every missing or invalid
+    field when extraction fails) and an extractor that builds one record from them.
+    Tables read only from "item" also get an extractor taking the item itself, so
+    list entries don't each need a sections dict.
+    """
+    section_labels = {"data": "data.", "ss": "data.SSCalData.", "item": ""}
+    resolved = tuple(
+        (
+            key,
+            section,
+            tuple(source.format(p=prefix) for source in sources),
+            convert,
+            section_labels[section],
+        )
+        for key, section, sources, convert in fields
+    )
+
+    # most fields are one source key passed through as is, so those skip the
+    # converter call and the argument list; consecutive fields from the same
+    # section form a run, so a section is looked up once per run, not per field
+    runs = []
+    for key, section, sources, convert, _ in resolved:
+        step = (
+            key,
+            sources[0] if len(sources) == 1 else sources,
+            None if convert is _raw else convert,
+        )
+        if runs and runs[-1][0] == section:
+            runs[-1][1].append(step)
+        else:
+            runs.append((section, [step]))
+    runs = tuple((section, tuple(steps)) for section, steps in runs)
+
+    def extract(sections: dict) -> dict:
+        record = {}
+        for section, steps in runs:
+            _fill_record(record, sections[section], steps)
+        return record
+
+    extract_item = None
+    if (
+        len(runs) == 1
+        and runs[0][0] == "item"
+        and all(isinstance(sources, str) for _, sources, _ in runs[0][1])
+    ):
+        item_steps = runs[0][1]
+
+        def extract_item(item: dict) -> dict:
+            record = {}
+            for key, sources, convert in item_steps:
+                if convert is None:
+                    record[key] = item[sources]
+                else:
+                    record[key] = convert(item[sources])
+            return record
+
+    return Schema(resolved, extract, extract_item)
+
+
+PRIMARY_SCHEMA = _build_schema(PERSON_FIELDS + PRIMARY_ONLY_FIELDS, "Primary")
+SPOUSE_SCHEMA = _build_schema(PERSON_FIELDS + SPOUSE_ONLY_FIELDS, "Spouse")
+CHILD_SCHEMA = _build_schema(CHILD_FIELDS)
+PENSION_SCHEMA = _build_schema(PENSION_FIELDS)
+EARNING_SCHEMA = _build_schema(EARNING_FIELDS)
+SETTINGS_SCHEMA = _build_schema(SETTINGS_FIELDS)
+
+
+def _collect_errors(schema, sections: dict, errors: list, label_prefix: str = ""):
+    for key, section, sources, convert, section_label in schema.fields:
+        source = sections[section]
+        try:
+            values = [source[name] for name in sources]
+        except KeyError as e:
+            errors.append(f"missing {label_prefix}{section_label}{e.args[0]}")
+            continue
+        except TypeError:
+            errors.append(
+                f"{(label_prefix + section_label).rstrip('.')} is not an object"
+            )
+            return
+        try:
+            convert(*values)
+        except (TypeError, ValueError) as e:
+            errors.append(f"invalid {label_prefix}{section_label}{sources[0]}: {e}")
+
+
+def _extract(schema, sections: dict, errors: list, label_prefix: str = "") -> dict:
+    try:
+        return schema.extract(sections)
+    except (KeyError, TypeError, ValueError):
+        _collect_errors(schema, sections, errors, label_prefix)
+        return {}
+
+
+def _extract_list(schema, items, label: str, errors: list) -> list:
+    if not isinstance(items, list):
+        errors.append(f"{label} is not a list")
+        return []
+    extract_item = schema.extract_item or (lambda item: schema.extract({"item": item}))
+    try:
+        return [extract_item(item) for item in items]
+    except (KeyError, TypeError, ValueError):
+        for index, item in enumerate(items):
+            _collect_errors(schema, {"item": item}, errors, f"{label}[{index}].")
+        return []
+
+
+def parse_roadmap_output(raw_data: dict) -> dict:
+    """Extract, convert and validate a whole export in one pass.
+
+    Raises RoadmapValidationError listing every missing or invalid field, so bad
+    exports are rejected before any LLM call is made.
+    """
+    errors = []
+    data = raw_data.get("data") if isinstance(raw_data, dict) else None
+    ss_data = data.get("SSCalData") if isinstance(data, dict) else None
+    if not isinstance(ss_data, dict):
+        raise RoadmapValidationError(["missing data.SSCalData"])
+    sections = {"data": data, "ss": ss_data}
+
+    roadmap = {"primary": _extract(PRIMARY_SCHEMA, sections, errors), "spouse": None}
+    if data.get("Spouse_FirstName"):
+        roadmap["spouse"] = _extract(SPOUSE_SCHEMA, sections, errors)
+
+    if "MaritalStatus" not in data:
+        errors.append("missing data.MaritalStatus")
+    roadmap["marital_status"] = data.get("MaritalStatus")
+
+    roadmap["children"] = _extract_list(
+        CHILD_SCHEMA,
+        ss_data.get("SSCalChildren"),
+        "data.SSCalData.SSCalChildren",
+        errors,
+    )
+    roadmap["pensions"] = _extract_list(
+        PENSION_SCHEMA,
+        ss_data.get("SSCalPensions"),
+        "data.SSCalData.SSCalPensions",
+        errors,
+    )
+    earnings = _extract_list(
+        EARNING_SCHEMA,
+        ss_data.get("SSCalEarnings"),
+        "data.SSCalData.SSCalEarnings",
+        errors,
+    )
+    settings = data.get("Settings")
+    if isinstance(settings, dict):
+        roadmap["settings"] = _extract(
+            SETTINGS_SCHEMA, {"item": settings}, errors, "data.Settings."
+        )
+    else:
+        errors.append("missing data.Settings")
+
+    if errors:
+        raise RoadmapValidationError(errors)
+
+    primary_earnings = {}
+    spouse_earnings = {}
+    for entry in earnings:
+        if entry["is_primary"]:
+            primary_earnings[entry["year"]] = entry["earning"]
+        else:
+            spouse_earnings[entry["year"]] = entry["earning"]
+    roadmap["primary_earnings"] = primary_earnings
+    roadmap["spouse_earnings"] = spouse_earnings
+    return roadmap
+
 
 def get_primary(raw_data: dict):
-    return {
-        "name": f"{raw_data['data']['Primary_FirstName']} {raw_data['data']['Primary_LastName']}",
-        "birth_date": datetime.strptime(
-            raw_data["data"]["Primary_BirthDate"], "%Y-%m-%dT%H:%M:%S"
-        ),
-        "age": raw_data["data"]["Primary_Age"],
-        "gender": raw_data["data"]["Primary_GenderID"],
-        "email": raw_data["data"]["Primary_Email"],
-        "phone": raw_data["data"]["Primary_Phone"],
-        "blind": raw_data["data"]["Primary_Blind"],
-        "pia": raw_data["data"]["SSCalData"]["Primary_PIA"],
-        "fra": datetime.strptime(
-            raw_data["data"]["SSCalData"]["Primary_FRA"], "%Y-%m-%dT%H:%M:%S"
-        ),
-        "fra_age": raw_data["data"]["SSCalData"]["Primary_FRAAge"],
-        "has_full_coverage": raw_data["data"]["SSCalData"]["Primary_HasFullCoverage"],
-        "is_disabled": raw_data["data"]["SSCalData"]["Primary_IsDisabled"],
-        "has_children": raw_data["data"]["SSCalData"]["Primary_HasChildren"],
-        "has_pension": raw_data["data"]["SSCalData"]["Primary_HasPension"],
-        "is_collecting_benefits": raw_data["data"]["SSCalData"][
-            "Primary_IsCollectingBenefits"
-        ],
-        "is_remarried": raw_data["data"]["SSCalData"]["Primary_IsRemarried"],
-        "married_before_60": raw_data["data"]["SSCalData"]["Primary_MarriedBefore60"],
-        "married_over_10_years": raw_data["data"]["SSCalData"][
-            "Primary_MarriedOver10Years"
-        ],
-        "cal_basis": raw_data["data"]["SSCalData"]["Primary_CalBasis"],
-        "est_retirement_age": raw_data["data"]["SSCalData"]["Primary_EstRetirementAge"],
-        "how_cal_benefits": raw_data["data"]["SSCalData"]["Primary_HowCalBenefits"],
-        "benefits_start_date": raw_data["data"]["SSCalData"][
-            "Primary_BenefitsStartDate"
-        ],
-        "divorce_date": raw_data["data"]["SSCalData"]["Primary_DivorceDate"],
-        "entitlement_date": raw_data["data"]["SSCalData"]["Primary_EntitlementDate"],
-        "annual_earning_rate": raw_data["data"]["SSCalData"][
-            "Primary_AnualEarningRate"
-        ],
-        "annual_part_time_earning_rate": raw_data["data"]["SSCalData"][
-            "Primary_AnualPartTimeEarningRate"
-        ],
-        "benefits_amount": raw_data["data"]["SSCalData"]["Primary_BenefitsAmount"],
-        "disability_benefit": raw_data["data"]["SSCalData"][
-            "Primary_DisabilityBenefit"
-        ],
-        "pen_amount": raw_data["data"]["SSCalData"]["Primary_PenAmount"],
-        "pen_salary_ss": raw_data["data"]["SSCalData"]["Primary_PenSalarySS"],
-        "pia_62": raw_data["data"]["SSCalData"]["Primary_PIA62"],
-        "pia_70": raw_data["data"]["SSCalData"]["Primary_PIA70"],
-        "qe_avg_salary": raw_data["data"]["SSCalData"]["Primary_QEAvgSalary"],
-        "sspia": raw_data["data"]["SSCalData"]["Primary_SSPIA"],
-        "ss_earning": raw_data["data"]["SSCalData"]["Primary_SSEarning"],
-        "wep_bend_rate": raw_data["data"]["SSCalData"]["Primary_WEPBendRate"],
-        "fra_year": raw_data["data"]["SSCalData"]["Primary_FRAYear"],
-        "last_year_earnings_age": raw_data["data"]["SSCalData"][
-            "Primary_LastYearEarningsAge"
-        ],
-        "last_year_part_time_earnings_age": raw_data["data"]["SSCalData"][
-            "Primary_LastYearPartTimeEarningsAge"
-        ],
-        "life_expectancy": raw_data["data"]["SSCalData"]["Primary_LifeExpectancy"],
-        "qe_years_worked": raw_data["data"]["SSCalData"]["Primary_QEYearsWorked"],
-    }
+    errors = []
+    data = raw_data["data"]
+    primary = _extract(PRIMARY_SCHEMA, {"data": data, "ss": data["SSCalData"]}, errors)
+    if errors:
+        raise RoadmapValidationError(errors)
+    return primary
 
 
 def get_spouse(raw_data: dict):
-    return {
-        "name": f"{raw_data['data']['Spouse_FirstName']} {raw_data['data']['Spouse_LastName']}",
-        "birth_date": datetime.strptime(
-            raw_data["data"]["Spouse_BirthDate"], "%Y-%m-%dT%H:%M:%S"
-        ),
-        "age": raw_data["data"]["Spouse_Age"],
-        "gender": raw_data["data"]["Spouse_GenderID"],
-        "email": raw_data["data"]["Spouse_Email"],
-        "phone": raw_data["data"]["Spouse_Phone"],
-        "blind": raw_data["data"]["Spouse_Blind"],
-        "pia": raw_data["data"]["SSCalData"]["Spouse_PIA"],
-        "fra": datetime.strptime(
-            raw_data["data"]["SSCalData"]["Spouse_FRA"], "%Y-%m-%dT%H:%M:%S"
-        ),
-        "fra_age": raw_data["data"]["SSCalData"]["Spouse_FRAAge"],
-        "has_full_coverage": raw_data["data"]["SSCalData"]["Spouse_HasFullCoverage"],
-        "is_disabled": raw_data["data"]["SSCalData"]["Spouse_IsDisabled"],
-        "has_pension": raw_data["data"]["SSCalData"]["Spouse_HasPension"],
-        "is_collecting_benefits": raw_data["data"]["SSCalData"][
-            "Spouse_IsCollectingBenefits"
-        ],
-        "is_living": raw_data["data"]["SSCalData"]["Spouse_IsLiving"],
-        "cal_basis": raw_data["data"]["SSCalData"]["Spouse_CalBasis"],
-        "est_retirement_age": raw_data["data"]["SSCalData"]["Spouse_EstRetirementAge"],
-        "how_cal_benefits": raw_data["data"]["SSCalData"]["Spouse_HowCalBenefits"],
-        "benefits_start_date": raw_data["data"]["SSCalData"][
-            "Spouse_BenefitsStartDate"
-        ],
-        "death_date": raw_data["data"]["SSCalData"]["Spouse_DeathDate"],
-        "entitlement_date": raw_data["data"]["SSCalData"]["Spouse_EntitlementDate"],
-        "annual_earning_rate": raw_data["data"]["SSCalData"]["Spouse_AnualEarningRate"],
-        "annual_income": raw_data["data"]["SSCalData"]["Spouse_AnualIncome"],
-        "annual_part_time_earning_rate": raw_data["data"]["SSCalData"][
-            "Spouse_AnualPartTimeEarningRate"
-        ],
-        "benefit_amount": raw_data["data"]["SSCalData"]["Spouse_BenefitAmount"],
-        "disability_benefit": raw_data["data"]["SSCalData"]["Spouse_DisabilityBenefit"],
-        "pen_amount": raw_data["data"]["SSCalData"]["Spouse_PenAmount"],
-        "pen_salary_ss": raw_data["data"]["SSCalData"]["Spouse_PenSalarySS"],
-        "pia_62": raw_data["data"]["SSCalData"]["Spouse_PIA62"],
-        "pia_70": raw_data["data"]["SSCalData"]["Spouse_PIA70"],
-        "qe_avg_salary": raw_data["data"]["SSCalData"]["Spouse_QEAvgSalary"],
-        "sspia": raw_data["data"]["SSCalData"]["Spouse_SSPIA"],
-        "ss_earning": raw_data["data"]["SSCalData"]["Spouse_SSEarning"],
-        "wep_bend_rate": raw_data["data"]["SSCalData"]["Spouse_WEPBendRate"],
-        "fra_year": raw_data["data"]["SSCalData"]["Spouse_FRAYear"],
-        "last_year_earnings_age": raw_data["data"]["SSCalData"][
-            "Spouse_LastYearEarningsAge"
-        ],
-        "last_year_part_time_earnings_age": raw_data["data"]["SSCalData"][
-            "Spouse_LastYearPartTimeEarningsAge"
-        ],
-        "life_expectancy": raw_data["data"]["SSCalData"]["Spouse_LifeExpectancy"],
-        "qe_years_worked": raw_data["data"]["SSCalData"]["Spouse_QEYearsWorked"],
-    }
+    errors = []
+    data = raw_data["data"]
+    spouse = _extract(SPOUSE_SCHEMA, {"data": data, "ss": data["SSCalData"]}, errors)
+    if errors:
+        raise RoadmapValidationError(errors)
+    return spouse
 
 
 def get_children(raw_data: dict):
-    children = []
-    for child in raw_data["data"]["SSCalData"]["SSCalChildren"]:
-        children.append(
-            {
-                "name": child["Name"],
-                "birth_date": datetime.strptime(
-                    child["BirthDate"], "%Y-%m-%dT%H:%M:%S"
-                ),
-                "age": child["Age"],
-                "high_school_grad_date": datetime.strptime(
-                    child["HighSchoolGradDate"], "%Y-%m-%dT%H:%M:%S"
-                ),
-                "is_collecting_benefits": child["IsCollectingBenefits"],
-                "benefits_start_date": child["BenefitsStartDate"],
-                "benefits_amount": child["BenefitsAmount"],
-                "is_disabled": child["IsDisabled"],
-                "disability_benefit": child["DisabilityBenefit"],
-                "supplemental_income": child["SupplementalIncome"],
-                "dependent_type": child["DependentType"],
-            }
-        )
+    errors = []
+    children = _extract_list(
+        CHILD_SCHEMA,
+        raw_data["data"]["SSCalData"]["SSCalChildren"],
+        "data.SSCalData.SSCalChildren",
+        errors,
+    )
+    if errors:
+        raise RoadmapValidationError(errors)
     return children
 
 
-def calculate_earnings_history(raw_data):
-    primary_earnings = {}
-    spouse_earnings = {}
-    for entry in raw_data["data"]["SSCalData"]["SSCalEarnings"]:
-        if entry["IsPrimary"]:
-            primary_earnings[entry["YearID"]] = entry["Earning"]
-        else:
-            spouse_earnings[entry["YearID"]] = entry["Earning"]
-    return primary_earnings, spouse_earnings
+def _years_worked_and_total(earnings: dict):
+    years_worked = sum(1 for earning in earnings.values() if earning > 0)
+    return years_worked, sum(earnings.values())
 
 
-def preprocess_data_primary_and_spouse(raw_data: dict, primary: dict, spouse: dict):
-    primary_earnings, spouse_earnings = calculate_earnings_history(raw_data=raw_data)
+def preprocess_data_primary_and_spouse(roadmap: dict):
+    primary_earnings = roadmap["primary_earnings"]
+    spouse_earnings = roadmap["spouse_earnings"]
 
     # Calculate total years worked and total earnings
-    primary_years_worked = sum(
-        1 for earning in primary_earnings.values() if earning > 0
+    primary_years_worked, primary_total_earnings = _years_worked_and_total(
+        primary_earnings
+    )
+    spouse_years_worked, spouse_total_earnings = _years_worked_and_total(
+        spouse_earnings
     )
-    primary_total_earnings = sum(primary_earnings.values())
-    spouse_years_worked = sum(1 for earning in spouse_earnings.values() if earning > 0)
-    spouse_total_earnings = sum(spouse_earnings.values())
 
     preprocessed_data = f"""
 Primary Beneficiary:
-{format_person_data(primary, primary_years_worked, primary_total_earnings)}
+{format_person_data(roadmap["primary"], primary_years_worked, primary_total_earnings)}
 
 Spouse:
-{format_person_data(spouse, spouse_years_worked, spouse_total_earnings)}
+{format_person_data(roadmap["spouse"], spouse_years_worked, spouse_total_earnings)}
 
-Marital Status: {"Married" if raw_data['data']['MaritalStatus'] == 2 else "Other"}
+Marital Status: {"Married" if roadmap["marital_status"] == 2 else "Other"}
 
 Primary Beneficiary Earnings History:
 {format_earnings_history(primary_earnings)}
@@ -189,44 +392,43 @@ Spouse Earnings History:
 {format_earnings_history(spouse_earnings)}
 
 Children:
-{format_children_data(raw_data["data"]["SSCalData"]["SSCalChildren"])}
+{format_children_data(roadmap["children"])}
 
 Pensions:
-{format_pension_data(raw_data["data"]["SSCalData"]["SSCalPensions"])}
+{format_pension_data(roadmap["pensions"])}
 
 Settings:
-{format_settings(raw_data["data"]["Settings"])}
+{format_settings(roadmap["settings"])}
 """
 
     return preprocessed_data
 
 
-def preprocess_data_primary_only(raw_data: dict, primary: dict):
-    primary_earnings, _ = calculate_earnings_history(raw_data=raw_data)
+def preprocess_data_primary_only(roadmap: dict):
+    primary_earnings = roadmap["primary_earnings"]
 
     # Calculate total years worked and total earnings
-    primary_years_worked = sum(
-        1 for earning in primary_earnings.values() if earning > 0
+    primary_years_worked, primary_total_earnings = _years_worked_and_total(
+        primary_earnings
     )
-    primary_total_earnings = sum(primary_earnings.values())
 
     preprocessed_data = f"""
 Primary Beneficiary:
-{format_person_data(primary, primary_years_worked, primary_total_earnings)}
+{format_person_data(roadmap["primary"], primary_years_worked, primary_total_earnings)}
 
-Marital Status: {"Married" if raw_data['data']['MaritalStatus'] == 2 else "Other"}
+Marital Status: {"Married" if roadmap["marital_status"] == 2 else "Other"}
 
 Primary Beneficiary Earnings History:
 {format_earnings_history(primary_earnings)}
 
 Children:
-{format_children_data(raw_data["data"]["SSCalData"]["SSCalChildren"])}
+{format_children_data(roadmap["children"])}
 
 Pensions:
-{format_pension_data(raw_data["data"]["SSCalData"]["SSCalPensions"])}
+{format_pension_data(roadmap["pensions"])}
 
 Settings:
-{format_settings(raw_data["data"]["Settings"])}
+{format_settings(roadmap["settings"])}
 """
 
     return preprocessed_data
@@ -242,7 +444,7 @@ Phone: {person['phone']}
 Blind: {person['blind']}
 Total Years Worked: {years_worked}
 Total Lifetime Earnings: ${total_earnings:,.2f}
-Average Annual Earnings: ${total_earnings / years_worked:,.2f}
+Average Annual Earnings: ${total_earnings / years_worked if years_worked else 0:,.2f}
 Primary Insurance Amount (PIA): ${person['pia']:,.2f}
 Full Retirement Age (FRA): {person['fra'].strftime('%Y-%m-%d')} (Age {person['fra_age']})
 Has Full Coverage: {person['has_full_coverage']}
@@ -267,12 +469,12 @@ def format_children_data(children: list) -> str:
 
     children_data = []
     for child in children:
-        child_info = f"""Name: {child['Name']}
-Birth Date: {datetime.strptime(child['BirthDate'], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')}
-Age: {child['Age']}
-High School Graduation Date: {datetime.strptime(child['HighSchoolGradDate'], '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')}
-Is Collecting Benefits: {child['IsCollectingBenefits']}
-Is Disabled: {child['IsDisabled']}
+        child_info = f"""Name: {child['name']}
+Birth Date: {child['birth_date'].strftime('%Y-%m-%d')}
+Age: {child['age']}
+High School Graduation Date: {child['high_school_grad_date'].strftime('%Y-%m-%d')}
+Is Collecting Benefits: {child['is_collecting_benefits']}
+Is Disabled: {child['is_disabled']}
 """
         children_data.append(child_info)
 
@@ -285,11 +487,11 @@ def format_pension_data(pensions: list) -> str:
 
     pension_data = []
     for pension in pensions:
-        pension_info = f"""Title: {pension['Title']}
-Annual Amount: ${pension['AnnualAmount']:,.2f}
-Lump Sum Amount: {"$" + f"{pension['LumpSumAmount']:,.2f}" if pension['LumpSumAmount'] else "N/A"}
-Start Year: {pension['StartYear']}
-Exempt from GPO: {pension['ExemptFromGPO']}
+        pension_info = f"""Title: {pension['title']}
+Annual Amount: ${pension['annual_amount']:,.2f}
+Lump Sum Amount: {"$" + f"{pension['lump_sum_amount']:,.2f}" if pension['lump_sum_amount'] else "N/A"}
+Start Year: {pension['start_year']}
+Exempt from GPO: {pension['exempt_from_gpo']}
 """
         pension_data.append(pension_info)
 
@@ -297,37 +499,33 @@ Exempt from GPO: {pension['ExemptFromGPO']}
 
 
 def format_settings(settings: dict) -> str:
-    return f"""COLA: {settings['COLA']}%
-Inflation Rate: {settings['InflationRate']}%
-Nominal Rate of Return: {settings['NominalRateOfReturn']}%
-Real Rate of Return: {settings['RealRateOfReturn']}%"""
+    return f"""COLA: {settings['cola']}%
+Inflation Rate: {settings['inflation_rate']}%
+Nominal Rate of Return: {settings['nominal_rate_of_return']}%
+Real Rate of Return: {settings['real_rate_of_return']}%"""
 
 
-def preprocess_roadmap_output(raw_data) -> str | None:
-    # Extract primary and spouse information
-    family = {}
-    primary = get_primary(raw_data=raw_data)
-    family["primary"] = primary
+def format_roadmap(
+    roadmap: dict, encoding: str = "verbose", token_budget: int | None = None
+) -> str:
+    if encoding == "compact":
+        return fit_compact_context(roadmap, token_budget)
+    if encoding != "verbose":
+        raise ValueError(f"Unknown context encoding: {encoding}")
 
-    if raw_data["data"]["Spouse_FirstName"]:
-        spouse = get_spouse(raw_data=raw_data)
-        family["spouse"] = spouse
+    if roadmap["spouse"] is None:
+        return preprocess_data_primary_only(roadmap)
+    return preprocess_data_primary_and_spouse(roadmap)
 
-    if raw_data["data"]["SSCalData"]["SSCalChildren"]:
-        children = get_children(raw_data=raw_data)
-        family["children"] = children
 
-    # Format the preprocessed data
-    if "spouse" not in family.keys():
-        result = preprocess_data_primary_only(
-            raw_data=raw_data, primary=family["primary"]
-        )
-    else:
-        result = preprocess_data_primary_and_spouse(
-            raw_data=raw_data, primary=family["primary"], spouse=family["spouse"]
-        )
+def preprocess_roadmap_output(
+    raw_data, encoding: str = "verbose", token_budget: int | None = None
+) -> str | None:
+    # Extract and validate everything up front, raising RoadmapValidationError on bad input
+    roadmap = parse_roadmap_output(raw_data)
 
-    return result
+    # Format the preprocessed data
+    return format_roadmap(roadmap, encoding, token_budget)
 
 
 # Example usage
@@ -0,0 +1,389 @@
+"""Retrieve SSA rules from a local corpus so the report cites them instead of recalling them.
+
+The corpus is markdown under src/rules/corpus: one file per topic, one `##`
+section per rule, each ending with its source. An offline build step chunks the
+sections, embeds them with a sentence-transformers model and writes an Annoy
+index plus a json file of the passages. Embeddings are cached by content hash
+(src/embedding_cache.py), so a rebuild only embeds passages that are new or
+changed:
+
+    python -m src.rules_retrieval build --corpus src/rules/corpus --output cache/rules/rules.ann
+    python -m src.rules_retrieval query "spousal benefits before full retirement age"
+
+At serve time the index is memory-mapped read-only, so every gunicorn worker
+shares one copy of its pages. Queries are a few fixed topic phrases picked from
+the export, so their embeddings are cached and a lookup is just Annoy searches;
+the embedding model is only loaded, once per process, for a phrase not seen yet.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+from annoy import AnnoyIndex
+
+from src.embedding_cache import EmbeddingCache, content_hash
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_CORPUS = "src/rules/corpus"
+DEFAULT_INDEX_PATH = "cache/rules/rules.ann"
+# vectors are normalized, so angular distance ranks the same as cosine similarity
+METRIC = "angular"
+EMBED_GROUP_BATCHES = 16
+
+_SECTION_RE = re.compile(r"^## +(.+)$", re.MULTILINE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+
+
+def _metadata_path(index_path: str) -> str:
+    return os.path.splitext(index_path)[0] + ".json"
+
+
+def _split_words(text: str, max_words: int) -> list:
+    # long sections are split on sentence boundaries into pieces of at most
+    # max_words, so one passage never crowds out the rest of the context
+    pieces = []
+    current = []
+    count = 0
+    for sentence in _SENTENCE_RE.split(text):
+        words = len(sentence.split())
+        if current and count + words > max_words:
+            pieces.append(" ".join(current))
+            current, count = [], 0
+        current.append(sentence)
+        count += words
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_document(name: str, text: str, max_words: int = 150) -> list:
+    """Passages for one corpus file: one per `##` section, split if it is long."""
+    title_match = re.search(r"^# +(.+)$", text, re.MULTILINE)
+    title = title_match.group(1).strip() if title_match else name
+    sections = _SECTION_RE.split(text)
+    passages = []
+    # split() gives [preamble, heading, body, heading, body, ...]
+    for heading, body in zip(sections[1::2], sections[2::2]):
+        body = " ".join(body.split())
+        if not body:
+            continue
+        for text_piece in _split_words(body, max_words):
+            passages.append(
+                {
+                    "source": name,
+                    "heading": f"{title}: {heading.strip()}",
+                    "text": text_piece,
+                }
+            )
+    return passages
+
+
+def chunk_corpus(corpus_dir: str, max_words: int = 150) -> list:
+    passages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.endswith(".md"):
+            continue
+        with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+            passages += chunk_document(name, f.read(), max_words)
+    return passages
+
+
+_encoders = {}
+_encoder_lock = threading.Lock()
+
+
+def get_encoder(model_name: str = DEFAULT_MODEL):
+    """The sentence-transformers model, loaded on first use and then kept for the process."""
+    with _encoder_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            # imported here so serving without retrieval never pays for torch
+            from sentence_transformers import SentenceTransformer
+
+            started = time.perf_counter()
+            encoder = SentenceTransformer(model_name, device="cpu")
+            logger.info(
+                f"Loaded embedding model {model_name} in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+            _encoders[model_name] = encoder
+        return encoder
+
+
+def embed_texts(
+    texts: list, model_name: str = DEFAULT_MODEL, batch_size: int = 64
+) -> np.ndarray:
+    return get_encoder(model_name).encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _query_vector(model_name: str, text: str) -> tuple:
+    return tuple(embed_texts([text], model_name)[0].tolist())
+
+
+class StageTimer:
+    """Wall-clock seconds per named stage, summed over repeats."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+
+    def summary(self) -> dict:
+        return {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+
+
+def build_index(
+    corpus_dir: str = DEFAULT_CORPUS,
+    index_path: str = DEFAULT_INDEX_PATH,
+    model_name: str = DEFAULT_MODEL,
+    n_trees: int = 20,
+    max_words: int = 150,
+    cache_dir: str | None = None,
+    batch_size: int = 64,
+) -> dict:
+    """Chunk, embed and index the corpus; returns counts and seconds per stage.
+
+    Embeddings are cached by content hash under cache_dir (next to the index by
+    default), so only new or changed passages are embedded and the index is
+    rebuilt from cached vectors.
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    with timer.stage("chunk"):
+        passages = chunk_corpus(corpus_dir, max_words)
+    if not passages:
+        raise ValueError(f"No passages found in {corpus_dir}")
+
+    with timer.stage("hash"):
+        texts = [f"{passage['heading']}. {passage['text']}" for passage in passages]
+        hashes = [content_hash(text) for text in texts]
+        for passage, text_hash in zip(passages, hashes):
+            passage["hash"] = text_hash
+
+    with timer.stage("cache_lookup"):
+        cache = EmbeddingCache(
+            cache_dir or os.path.join(os.path.dirname(index_path), "embeddings"),
+            model_name,
+        )
+        missing = cache.missing(hashes)
+    text_by_hash = dict(zip(hashes, texts))
+    # written to the cache every EMBED_GROUP_BATCHES batches, so an interrupted
+    # build keeps what it has embedded so far
+    group_size = batch_size * EMBED_GROUP_BATCHES
+    for offset in range(0, len(missing), group_size):
+        group = missing[offset : offset + group_size]
+        with timer.stage("embed"):
+            vectors = embed_texts(
+                [text_by_hash[text_hash] for text_hash in group], model_name, batch_size
+            )
+        with timer.stage("cache_write"):
+            cache.add(group, vectors)
+
+    removed = 0
+    if len(cache) > 2 * len(text_by_hash):
+        # mostly vectors for passages that no longer exist, rewrite without them
+        with timer.stage("cache_prune"):
+            removed = cache.prune(hashes)
+
+    with timer.stage("load_vectors"):
+        vectors = cache.get(hashes)
+    with timer.stage("index_build"):
+        index = AnnoyIndex(vectors.shape[1], METRIC)
+        for item, vector in enumerate(vectors):
+            index.add_item(item, vector)
+        index.build(n_trees)
+    with timer.stage("save"):
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        index.save(index_path)
+        with open(_metadata_path(index_path), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "model": model_name,
+                    "dimension": int(vectors.shape[1]),
+                    "metric": METRIC,
+                    "passages": passages,
+                },
+                f,
+            )
+
+    summary = {
+        "passages": len(passages),
+        "embedded": len(missing),
+        "reused": len(text_by_hash) - len(missing),
+        "pruned": removed,
+        "dimension": int(vectors.shape[1]),
+        "stage_seconds": timer.summary(),
+        "total_seconds": round(time.perf_counter() - started, 4),
+    }
+    logger.info(f"Built rules index {index_path}: {summary}")
+    return summary
+
+
+class RulesIndex:
+    """A built rules index, memory-mapped read-only."""
+
+    def __init__(self, index_path: str, prefault: bool = False):
+        with open(_metadata_path(index_path), encoding="utf-8") as f:
+            metadata = json.load(f)
+        self.model_name = metadata["model"]
+        self.passages = metadata["passages"]
+        self.index = AnnoyIndex(metadata["dimension"], metadata["metric"])
+        # Annoy mmaps the file, so the pages live once in the page cache however
+        # many worker processes load it; prefault reads them all in up front
+        self.index.load(index_path, prefault=prefault)
+
+    def search(self, queries: list, top_k: int = 4, search_k: int = -1) -> list:
+        """The top_k passages closest to any of the queries, closest first."""
+        best = {}
+        for query in queries:
+            items, distances = self.index.get_nns_by_vector(
+                _query_vector(self.model_name, query),
+                top_k,
+                search_k,
+                include_distances=True,
+            )
+            for item, distance in zip(items, distances):
+                if distance < best.get(item, float("inf")):
+                    best[item] = distance
+        ranked = sorted(best.items(), key=lambda pair: pair[1])[:top_k]
+        return [
+            {**self.passages[item], "distance": round(distance, 4)}
+            for item, distance in ranked
+        ]
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def get_rules_index(index_path: str = DEFAULT_INDEX_PATH) -> RulesIndex | None:
+    """The index at index_path, loaded once per process; None if it hasn't been built."""
+    with _index_lock:
+        if index_path not in _indexes:
+            try:
+                _indexes[index_path] = RulesIndex(index_path)
+            except FileNotFoundError:
+                logger.warning(
+                    f"Rules index {index_path} not found, reports go without "
+                    "retrieved rules; build it with python -m src.rules_retrieval build"
+                )
+                _indexes[index_path] = None
+        return _indexes[index_path]
+
+
+def rule_queries(roadmap: dict) -> list:
+    """Topic phrases to retrieve rules for, from the facts of an export."""
+    primary = roadmap["primary"]
+    spouse = roadmap["spouse"]
+    people = [primary] + ([spouse] if spouse is not None else [])
+    queries = [
+        "full retirement age, early retirement reduction and delayed retirement credits"
+    ]
+    if spouse is not None and roadmap["marital_status"] == 2:
+        queries.append("spousal benefits and deemed filing for a married couple")
+        queries.append("survivor benefits for a widow or widower")
+    if roadmap["children"]:
+        queries.append("benefits for children and dependents and the family maximum")
+    if roadmap["pensions"] or any(person["has_pension"] for person in people):
+        queries.append("pension from non-covered work, windfall elimination provision")
+    if any(person["is_disabled"] or person["blind"] for person in people):
+        queries.append("disability benefits and conversion at full retirement age")
+    if any(person["is_collecting_benefits"] for person in people):
+        queries.append("already receiving benefits, voluntary suspension")
+    if any(
+        not person["is_collecting_benefits"] and person["annual_earning_rate"]
+        for person in people
+    ):
+        queries.append("working while receiving benefits, retirement earnings test")
+    return queries
+
+
+def retrieve_rules(roadmap: dict, rules_config: dict) -> list:
+    index = get_rules_index(rules_config.get("index_path", DEFAULT_INDEX_PATH))
+    if index is None:
+        return []
+    return index.search(
+        rule_queries(roadmap),
+        rules_config.get("top_k", 4),
+        rules_config.get("search_k", -1),
+    )
+
+
+def format_rules(passages: list) -> str:
+    lines = [
+        "Relevant Social Security rules (retrieved from the local rules corpus; "
+        "cite these sources rather than recalling rules from memory):"
+    ]
+    lines += [f"- {passage['heading']}: {passage['text']}" for passage in passages]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="chunk, embed and index the corpus")
+    build.add_argument("--corpus", default=DEFAULT_CORPUS)
+    build.add_argument("--output", default=DEFAULT_INDEX_PATH)
+    build.add_argument("--model", default=DEFAULT_MODEL)
+    build.add_argument("--trees", type=int, default=20)
+    build.add_argument("--max-words", type=int, default=150)
+    build.add_argument(
+        "--cache-dir", help="embedding cache (default: embeddings/ next to the index)"
+    )
+    build.add_argument("--batch-size", type=int, default=64)
+
+    query = commands.add_parser("query", help="search a built index")
+    query.add_argument("text", nargs="+")
+    query.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    query.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        summary = build_index(
+            args.corpus,
+            args.output,
+            args.model,
+            args.trees,
+            args.max_words,
+            args.cache_dir,
+            args.batch_size,
+        )
+        print(json.dumps(summary))
+        return
+
+    index = RulesIndex(args.index)
+    started = time.perf_counter()
+    passages = index.search([" ".join(args.text)], args.k)
+    elapsed = time.perf_counter() - started
+    for passage in passages:
+        print(f"{passage['distance']:.3f}  {passage['heading']}")
+    print(f"{elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""gunicorn settings for serving src.main:app with the app preloaded.
+
+    gunicorn -c src/run/gunicorn.conf.py --workers 4 src.main:app
+
+The master imports the app (config, logging, the configured provider SDKs) once
+and forks the workers from it, so a new worker only pays for its own client and
+connection, in post_fork, before it accepts requests.
+
+Each worker writes its Prometheus metrics under PROMETHEUS_MULTIPROC_DIR, and
+/metrics adds up every worker's files, whichever worker serves it.
+"""
+
+import os
+import shutil
+
+# src.main checks this to leave per-worker startup to post_fork
+os.environ["PRELOAD_APP"] = "1"
+# must be set before prometheus_client is imported, i.e. before the app is loaded
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "cache/prometheus")
+
+preload_app = True
+
+
+def on_starting(server):
+    # values left by a previous run would be added to this one's
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_fork(server, worker):
+    from src.main import start_worker
+
+    start_worker()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -44,6 +44,430 @@ def check_img_alt_text(soup):
 CheckFunction = Callable[[BeautifulSoup], tuple[bool, str]]
 
 
+# Single-pass validator: one regex tokenizer scan with an open-element stack and
+# no tree. It reports the same things as the html5lib checks above: html/body
+# structure, elements left without any content once the implied end tags html5lib
+# would add are applied, and img tags with a missing or empty alt.
+
+_TOKEN_RE = re.compile(
+    r"<!--.*?(?:-->|\Z)"
+    r"|<[!?][^>]*>"
+    r"|</([A-Za-z][^\s/>]*)[^>]*>"
+    r"|<([A-Za-z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.DOTALL,
+)
+_ALT_RE = re.compile(
+    r"""(?:^|[\s/])alt(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?(?=[\s/]|$)""",
+    re.IGNORECASE,
+)
+_VOID_TAGS = frozenset(
+    "area base basefont bgsound br col embed hr img input keygen link meta param "
+    "source track wbr".split()
+)
+# contents are raw text up to the matching end tag, never markup
+_RAW_TEXT_TAGS = frozenset(
+    "script style textarea title xmp iframe noembed noframes".split()
+)
+_RAW_TEXT_END_RE = {
+    name: re.compile(rf"</{name}[\s/>]", re.IGNORECASE) for name in _RAW_TEXT_TAGS
+}
+_ALLOWED_EMPTY_TAGS = frozenset("html head body br hr img input meta link".split())
+_CLOSES_P = frozenset(
+    "address article aside blockquote center details dialog dir div dl fieldset "
+    "figcaption figure footer form h1 h2 h3 h4 h5 h6 header hgroup hr main menu "
+    "nav ol p pre section summary table ul li dd dt".split()
+)
+_HEADINGS = frozenset("h1 h2 h3 h4 h5 h6".split())
+# table parts outside a table are dropped by html5lib
+_TABLE_PARTS = frozenset("caption col colgroup tbody td tfoot th thead tr".split())
+_TABLE_END_BOUNDARY = frozenset({"html", "table"})
+_TABLE_CONTEXT_TAGS = frozenset("table tbody tfoot thead tr".split())
+_CELL_TAGS = frozenset("td th caption".split())
+_UNFOSTERED_TAGS = _TABLE_PARTS | {"table", "script", "style", "template", "form"}
+_FORMATTING_TAGS = frozenset(
+    "a b big code em font i nobr s small strike strong tt u".split()
+)
+# html5lib's "special" elements (its list predates main, summary and friends); a
+# formatting end tag with one of these open inside it is handled by the adoption
+# agency instead of popping the block
+_SPECIAL_TAGS = frozenset(
+    "address applet area article aside base basefont bgsound blockquote body br "
+    "button caption center col colgroup command dd details dir div dl dt embed "
+    "fieldset figure footer form frame frameset h1 h2 h3 h4 h5 h6 head header hr "
+    "html iframe image img input isindex li link listing marquee menu meta nav "
+    "noembed noframes noscript object ol p param plaintext pre script section "
+    "select style table tbody td textarea tfoot th thead title tr ul wbr xmp".split()
+)
+# anything else ends the head, as if by </head>
+_HEAD_TAGS = frozenset(
+    "base basefont bgsound head link meta noframes noscript script style template "
+    "title".split()
+)
+# markers in html5lib's list of active formatting elements; an open <a> from before
+# one of these is out of reach of a new <a>
+_FORMATTING_MARKERS = frozenset(
+    "html td th caption marquee object applet template".split()
+)
+_SCOPE_BOUNDARY = frozenset(
+    "html table td th caption button marquee object applet template".split()
+)
+# start tag -> (elements it implicitly closes, elements that stop the search)
+_IMPLIED_CLOSES = {
+    "li": ({"li"}, _SCOPE_BOUNDARY | {"ul", "ol"}),
+    "dd": ({"dd", "dt"}, _SCOPE_BOUNDARY | {"dl"}),
+    "dt": ({"dd", "dt"}, _SCOPE_BOUNDARY | {"dl"}),
+    "td": ({"td", "th"}, {"html", "table", "tr"}),
+    "th": ({"td", "th"}, {"html", "table", "tr"}),
+    "tr": ({"tr", "td", "th"}, {"html", "table", "thead", "tbody", "tfoot"}),
+    "thead": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"html", "table"}),
+    "tbody": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"html", "table"}),
+    "tfoot": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"html", "table"}),
+    "option": ({"option"}, {"html", "select", "datalist"}),
+}
+
+
+class _ElementStack:
+    """Open elements as [name, sort key, has content, had content before its open child]."""
+
+    def __init__(self):
+        self.open = []
+        self.empty = []
+        # open element counts by name, so most scope searches can be skipped
+        self.counts = {}
+
+    def mark_content(self):
+        if self.open:
+            self.open[-1][2] = True
+
+    def in_table_context(self) -> bool:
+        return (
+            bool(self.counts.get("table")) and self.open[-1][0] in _TABLE_CONTEXT_TAGS
+        )
+
+    def key(self, offset, foster=False):
+        """Sort key giving an element's position in the parsed document.
+
+        html5lib moves ("foster parents") content found directly inside a table to
+        just before the table, so fostered elements sort ahead of it.
+        """
+        if foster:
+            table = self.open[self.find({"table"}, ())]
+            return table[1][:-1] + (table[1][-1] - 0.5, offset)
+        if self.open:
+            return self.open[-1][1][:-1] + (offset,)
+        return (offset,)
+
+    def push(self, name, offset, foster=False):
+        key = self.key(offset, foster)
+        if not foster:
+            if self.open:
+                self.open[-1][3] = self.open[-1][2]
+            self.mark_content()
+        self.open.append([name, key, False, False])
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def record_empty(self, name, offset, foster=False):
+        self.empty.append((self.key(offset, foster), name))
+
+    def _close(self, element, has_content):
+        self.counts[element[0]] -= 1
+        if not has_content and element[0] not in _ALLOWED_EMPTY_TAGS:
+            self.empty.append((element[1], element[0]))
+
+    def pop_through(self, index):
+        while len(self.open) > index:
+            element = self.open.pop()
+            self._close(element, element[2])
+
+    def adopt(self, index) -> bool:
+        """Close a formatting element that has a block open inside it, the way the
+        adoption agency does: each block open inside it moves out and gets a copy of
+        the formatting element around the content it had before its next block, while
+        other elements stay where they were, closed."""
+        blocks = [
+            position
+            for position in range(index + 1, len(self.open))
+            if self.open[position][0] in _SPECIAL_TAGS
+        ]
+        if not blocks:
+            return False
+        element = self.open[index]
+        name = element[0]
+        self._close(element, element[3] or blocks[0] > index + 1)
+        for between in self.open[index + 1 : blocks[0]]:
+            self._close(between, between[3])
+        start = blocks[0]
+        for position in blocks[1:] + [len(self.open)]:
+            block = self.open[start]
+            last = position == len(self.open)
+            for between in self.open[start + 1 : position]:
+                self._close(between, between[2] if last else between[3])
+            # the copy comes first among the block's children
+            copy_has_content = block[2] if last else block[3] or position > start + 1
+            if not copy_has_content:
+                self.empty.append((block[1] + (0,), name))
+            block[2] = block[3] = True
+            start = position
+        self.open[index:] = [self.open[position] for position in blocks]
+        return True
+
+    def remove(self, index):
+        """Take an element off the stack, leaving the elements opened inside it open."""
+        element = self.open.pop(index)
+        self._close(element, element[2])
+
+    def find(self, names, boundary):
+        for index in range(len(self.open) - 1, -1, -1):
+            name = self.open[index][0]
+            if name in names:
+                return index
+            if name in boundary:
+                return None
+        return None
+
+
+def _check_structure(html_string):
+    # plain substring searches with the same result as the check_basic_structure regexes
+    lowered = html_string.lower()
+    for tag, message in (
+        ("html", "Missing <html> tags"),
+        ("body", "Missing <body> tags"),
+    ):
+        start = lowered.find(f"<{tag}")
+        if start == -1:
+            return message
+        open_end = lowered.find(">", start)
+        if open_end == -1 or lowered.rfind(f"</{tag}>") <= open_end:
+            return message
+    return ""
+
+
+# a "<" that failed to tokenize but could still become a tag once more text arrives
+_PENDING_TAG_RE = re.compile(r"<(?:[A-Za-z!?/]|\Z)")
+
+
+class _HTMLScanner:
+    """Tokenizer state for the single-pass validator; can be fed text in chunks."""
+
+    def __init__(self):
+        self.stack = _ElementStack()
+        self.imgs_without_alt = 0
+        self._buffer = ""
+        # offset of the start of _buffer within the whole document
+        self._offset = 0
+
+    def unclosed_tags(self) -> list:
+        """Names of elements found empty so far, in document order."""
+        return [name for _, name in sorted(self.stack.empty)]
+
+    def feed(self, text: str, final: bool = False):
+        """Tokenize as much as can be decided; a partial tag at the end waits for more."""
+        html_string = self._buffer + text
+        stack = self.stack
+        pos = 0
+        length = len(html_string)
+
+        while pos < length:
+            match = _TOKEN_RE.search(html_string, pos)
+            end = match.start() if match else length
+            if not final:
+                pending = _PENDING_TAG_RE.search(html_string, pos, end)
+                if match is None or pending:
+                    # the text run may continue, or a tag may still be arriving
+                    break
+                if match.group().startswith("<!--") and not match.group().endswith(
+                    "-->"
+                ):
+                    self._mark_text(html_string, pos, end)
+                    pos = end
+                    break
+            self._mark_text(html_string, pos, end)
+            if match is None:
+                pos = length
+                break
+            pos = match.end()
+            offset = self._offset + match.start()
+            end_name, start_name, attrs = match.group(1, 2, 3)
+
+            if end_name is not None:
+                self._end_tag(end_name.lower(), offset)
+                continue
+
+            if start_name is None:
+                # comments (and bogus comments) are child nodes too, the doctype isn't
+                if match.group()[:9].lower() != "<!doctype":
+                    stack.mark_content()
+                continue
+
+            name = start_name.lower()
+            if name in _RAW_TEXT_TAGS:
+                close = _RAW_TEXT_END_RE[name].search(html_string, pos)
+                if close is None and not final:
+                    pos = match.start()
+                    break
+            if not self._start_tag(name, attrs, offset):
+                continue
+            if name in _RAW_TEXT_TAGS:
+                text_end = close.start() if close else length
+                if text_end > pos:
+                    stack.mark_content()
+                stack.pop_through(len(stack.open) - 1)
+                pos = close.end() if close else length
+
+        self._buffer = html_string[pos:]
+        self._offset += pos
+        if final:
+            stack.pop_through(0)
+
+    def _mark_text(self, html_string, start, end):
+        # text directly inside a table is fostered out of it, unless it is whitespace
+        if end > start and (
+            not self.stack.in_table_context() or html_string[start:end].isspace()
+        ):
+            self.stack.mark_content()
+
+    def _end_tag(self, name, offset):
+        stack = self.stack
+        if name in ("html", "body"):
+            return
+        if stack.open and stack.open[-1][0] == name:
+            # the common well-formed case, closing the current element
+            stack.pop_through(len(stack.open) - 1)
+            return
+        if not stack.counts.get(name):
+            if name == "p" and (
+                stack.counts.get("body")
+                or (stack.open and stack.open[-1][0] not in ("html", "head"))
+            ):
+                self._empty_p(offset)
+            return
+        boundary = (
+            _TABLE_END_BOUNDARY
+            if name in _TABLE_PARTS or name == "table"
+            else _SCOPE_BOUNDARY
+        )
+        index = stack.find({name}, boundary - {name})
+        if index is not None:
+            if name not in _FORMATTING_TAGS or not stack.adopt(index):
+                stack.pop_through(index)
+        elif name == "p":
+            self._empty_p(offset)
+
+    def _empty_p(self, offset):
+        # html5lib turns a stray </p> into an empty <p></p>
+        foster = self.stack.in_table_context()
+        if not foster:
+            self.stack.mark_content()
+        self.stack.record_empty("p", offset, foster)
+
+    def _start_tag(self, name, attrs, offset) -> bool:
+        """Handle a start tag; return True if it opened an element."""
+        stack = self.stack
+        if name in ("html", "body") and stack.counts.get(name):
+            return False
+        if name == "body" and stack.open and stack.open[-1][0] not in ("html", "head"):
+            # content before it already implied the body, html5lib ignores the tag
+            return False
+        if stack.counts.get("head") and name not in _HEAD_TAGS:
+            stack.pop_through(stack.find({"head"}, ()))
+        if name == "a" and stack.counts.get("a"):
+            # html5lib ends an <a> that is still open as if by </a>, then takes it
+            # off the stack even when that end tag couldn't reach it
+            if stack.find({"a"}, _FORMATTING_MARKERS) is not None:
+                self._end_tag("a", offset)
+                index = stack.find({"a"}, _FORMATTING_MARKERS)
+                if index is not None:
+                    stack.remove(index)
+        if name in _TABLE_PARTS:
+            if not stack.counts.get("table"):
+                return False
+            table_index = stack.find(_TABLE_CONTEXT_TAGS | _CELL_TAGS, ())
+            if stack.open[table_index][0] in _TABLE_CONTEXT_TAGS:
+                # drop anything fostered since, back to the table context
+                stack.pop_through(table_index + 1)
+        if name == "table" and stack.in_table_context():
+            # a table can't start directly inside another, html5lib closes the first
+            stack.pop_through(stack.find({"table"}, ()))
+        if name in _CLOSES_P and stack.counts.get("p"):
+            index = stack.find({"p"}, _SCOPE_BOUNDARY)
+            if index is not None:
+                stack.pop_through(index)
+        if name in _HEADINGS and stack.open and stack.open[-1][0] in _HEADINGS:
+            stack.pop_through(len(stack.open) - 1)
+        if name in _IMPLIED_CLOSES:
+            closes, boundary = _IMPLIED_CLOSES[name]
+            if any(stack.counts.get(close) for close in closes):
+                index = stack.find(closes, boundary)
+                if index is not None:
+                    stack.pop_through(index)
+        foster = stack.in_table_context() and name not in _UNFOSTERED_TAGS
+
+        if name in _VOID_TAGS:
+            if not foster:
+                stack.mark_content()
+            if name not in _ALLOWED_EMPTY_TAGS:
+                stack.record_empty(name, offset, foster)
+            if name == "img":
+                alt = _ALT_RE.search(attrs)
+                if alt is None or not any(alt.groups()):
+                    self.imgs_without_alt += 1
+            return False
+
+        stack.push(name, offset, foster)
+        return True
+
+
+def _check_results(unclosed_tags, imgs_without_alt):
+    if unclosed_tags:
+        raise NotValidHTMLException(f"Unclosed tags detected: {unclosed_tags}")
+    if imgs_without_alt:
+        raise NotValidHTMLException("Images missing alt text")
+
+
+def validate_llm_html_fast(html_string):
+    """Same checks and results as validate_llm_html, in one pass without building a tree."""
+    structure_msg = _check_structure(html_string)
+    if structure_msg:
+        return False, structure_msg
+    scanner = _HTMLScanner()
+    scanner.feed(html_string, final=True)
+    _check_results(scanner.unclosed_tags(), scanner.imgs_without_alt)
+    return True, "HTML is valid."
+
+
+class StreamingHTMLValidator:
+    """validate_llm_html_fast for HTML that arrives in chunks.
+
+    feed() returns a failure message as soon as a check is certain to fail, so a
+    bad generation can be cut off early; close() gives the same result as
+    validate_llm_html_fast on the whole document.
+    """
+
+    def __init__(self):
+        self._scanner = _HTMLScanner()
+        self._chunks = []
+
+    def feed(self, chunk: str) -> str | None:
+        self._chunks.append(chunk)
+        self._scanner.feed(chunk)
+        try:
+            _check_results(
+                self._scanner.unclosed_tags(), self._scanner.imgs_without_alt
+            )
+        except NotValidHTMLException as e:
+            return str(e)
+        return None
+
+    def close(self):
+        html_string = "".join(self._chunks)
+        self._scanner.feed("", final=True)
+        structure_msg = _check_structure(html_string)
+        if structure_msg:
+            return False, structure_msg
+        _check_results(self._scanner.unclosed_tags(), self._scanner.imgs_without_alt)
+        return True, "HTML is valid."
+
+
 def validate_llm_html(html_string):
     # Step 1: Check basic structure
     structure_valid, structure_msg = check_basic_structure(html_string)
@@ -71,6 +495,20 @@ def validate_llm_html(html_string):
     return True, "HTML is valid."
 
 
+VALIDATORS = {
+    "html5lib": validate_llm_html,
+    "fast": validate_llm_html_fast,
+}
+
+
+def get_validator(name: str = "html5lib"):
+    if name not in VALIDATORS:
+        raise ValueError(
+            f"Unknown HTML validator: {name}. Expected one of {sorted(VALIDATORS)}"
+        )
+    return VALIDATORS[name]
+
+
 # Example usage
 
 if __name__ == "__main__":
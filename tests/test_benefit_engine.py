@@ -0,0 +1,118 @@
+"""Benefit figures pinned against SSA's published formulas and examples.
+
+Bend points: https://www.ssa.gov/oact/cola/bendpoints.html
+Early reduction and delayed credits: https://www.ssa.gov/benefits/retirement/planner/agereduction.html
+Spousal benefits: https://www.ssa.gov/benefits/retirement/planner/applying7.html
+"""
+
+from datetime import date
+
+import pytest
+
+from src.benefit_engine import (
+    AWI,
+    AWI_FIRST_YEAR,
+    CLAIM_AGES,
+    compute_aime_pia,
+    compute_benefit_figures,
+)
+
+
+def earnings_for_aime(aime: int, birth_year: int) -> dict:
+    """35 years of earnings that index to the given AIME for someone born in birth_year."""
+    index_awi = AWI[birth_year + 60 - AWI_FIRST_YEAR]
+    # half a dollar over the AIME, so float rounding can't move it
+    indexed = (aime * 12 * 35 + 210) / 35
+    return {
+        year: indexed * AWI[year - AWI_FIRST_YEAR] / index_awi
+        for year in range(1986, 2021)
+    }
+
+
+def roadmap(primary: dict, spouse: dict | None = None, earnings: dict | None = None):
+    return {
+        "primary": primary,
+        "spouse": spouse,
+        "marital_status": 2 if spouse is not None else 1,
+        "primary_earnings": earnings or {},
+        "spouse_earnings": {},
+    }
+
+
+def person(birth_date: date, pia: float) -> dict:
+    return {"birth_date": birth_date, "pia": pia}
+
+
+def at_age(figures: list, age: int) -> float:
+    return figures[CLAIM_AGES.tolist().index(age)]
+
+
+@pytest.mark.parametrize(
+    "birth_year, aime, pia",
+    [
+        # first eligible in 2024: bend points $1,174 and $7,078
+        (1962, 1000, 900.0),
+        (1962, 5000, 2280.9),
+        (1962, 9000, 3234.1),
+        # first eligible in 2025: bend points $1,226 and $7,391
+        (1963, 1226, 1103.4),
+        (1963, 9000, 3317.5),
+    ],
+)
+def test_pia_uses_the_published_bend_points(birth_year, aime, pia):
+    earnings = earnings_for_aime(aime, birth_year)
+    assert compute_aime_pia(earnings, date(birth_year, 6, 15)) == (aime, pia)
+
+    figures = compute_benefit_figures(
+        roadmap(person(date(birth_year, 6, 15), None), earnings=earnings)
+    )["primary"]
+    assert (figures["aime"], figures["computed_pia"], figures["pia"]) == (
+        aime,
+        pia,
+        pia,
+    )
+    assert figures["years_worked"] == 35
+
+
+@pytest.mark.parametrize(
+    "birth_date, at_62, at_70",
+    [
+        # FRA 66: 25% off at 62, 8% a year of credits to 70
+        (date(1950, 6, 15), 750, 1320),
+        # FRA 66 and 6 months: 27.5% off at 62
+        (date(1957, 6, 15), 725, 1280),
+        # FRA 67: 30% off at 62, 24% more at 70
+        (date(1962, 6, 15), 700, 1240),
+    ],
+)
+def test_own_benefit_at_62_and_70(birth_date, at_62, at_70):
+    figures = compute_benefit_figures(roadmap(person(birth_date, 1000.0)))["primary"]
+    assert at_age(figures["own_benefit"], 62) == at_62
+    assert at_age(figures["own_benefit"], 70) == at_70
+    assert figures["spousal_benefit"] == [0.0] * len(CLAIM_AGES)
+
+
+def test_spousal_benefit_with_no_own_record():
+    # a spouse with FRA 67 gets 32.5% of the worker's PIA at 62 and 50% from FRA,
+    # with no credits for waiting past it
+    figures = compute_benefit_figures(
+        roadmap(person(date(1960, 6, 15), 1000.0), person(date(1962, 6, 15), 0.0))
+    )["spouse"]
+    assert at_age(figures["spousal_benefit"], 62) == 325
+    assert at_age(figures["spousal_benefit"], 67) == 500
+    assert at_age(figures["spousal_benefit"], 70) == 500
+
+
+def test_spousal_top_up_over_own_benefit():
+    figures = compute_benefit_figures(
+        roadmap(person(date(1960, 6, 15), 1000.0), person(date(1962, 6, 15), 400.0))
+    )
+    spouse = figures["spouse"]
+    # the top-up is half the worker's PIA less the spouse's own PIA
+    assert at_age(spouse["own_benefit"], 67) == 400
+    assert at_age(spouse["spousal_benefit"], 67) == 100
+    # both parts are reduced when claimed at 62: 30% and 35%
+    assert at_age(spouse["own_benefit"], 62) == 280
+    assert at_age(spouse["spousal_benefit"], 62) == 65
+    # the worker's own PIA is over half the spouse's, so no top-up the other way
+    assert figures["primary"]["spousal_benefit"] == [0.0] * len(CLAIM_AGES)
@@ -0,0 +1,57 @@
+"""Reading export dumps record by record."""
+
+import io
+import json
+
+import pytest
+
+from src.bulk_ingest import MalformedRecord, iter_json_records, preprocess_records
+
+RECORDS = [{"id": index, "data": {"name": "x" * 50}} for index in range(20)]
+
+
+def read(text: str, **kwargs) -> list:
+    return list(iter_json_records(io.StringIO(text), chunk_size=64, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "\n".join(json.dumps(record) for record in RECORDS),
+        "".join(json.dumps(record, indent=2) for record in RECORDS),
+        json.dumps(RECORDS, indent=2),
+    ],
+    ids=["jsonl", "pretty", "array"],
+)
+def test_reads_every_layout(text):
+    assert read(text) == RECORDS
+
+
+def test_bad_line_is_reported_and_skipped():
+    lines = [json.dumps(record) for record in RECORDS]
+    lines[5] = lines[5][:-10]
+    records = read("\n".join(lines) + "\n")
+
+    assert len(records) == len(RECORDS)
+    assert isinstance(records[5], MalformedRecord)
+    assert records[:5] + records[6:] == RECORDS[:5] + RECORDS[6:]
+    assert preprocess_records([(5, records[5])])[0]["status"] == "error"
+
+
+def test_bad_first_line_is_reported_and_skipped():
+    lines = [json.dumps(record) for record in RECORDS]
+    lines[0] = "{not json"
+    records = read("\n".join(lines))
+    assert isinstance(records[0], MalformedRecord)
+    assert records[1:] == RECORDS[1:]
+
+
+def test_bad_record_does_not_read_the_rest_of_the_dump():
+    text = '{"id": 0, "data": [1, 2,, 3]}' + "".join(
+        json.dumps(record, indent=2) for record in RECORDS * 50
+    )
+    fp = io.StringIO(text)
+    records = iter_json_records(fp, chunk_size=64, max_record_chars=640)
+    with pytest.raises(ValueError, match="within 640 characters"):
+        next(records)
+    assert fp.tell() < 64 * 12
@@ -0,0 +1,49 @@
+"""Which provider errors count against a circuit breaker."""
+
+import pytest
+
+from src.health_monitor import CLOSED, OPEN, CircuitBreaker
+
+
+class APIStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        TimeoutError("timed out"),
+        ConnectionResetError("reset by peer"),
+        APITimeoutError("Request timed out."),
+        APIStatusError(500),
+        APIStatusError(503),
+        APIStatusError(429),
+        APIStatusError(401),
+    ],
+)
+def test_provider_failures_open_the_circuit(error):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(False, error)
+    breaker.record(False, error)
+    assert breaker.state == OPEN
+    assert breaker.last_error == str(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [APIStatusError(400), APIStatusError(422), ValueError("bad JSON")],
+)
+def test_rejected_requests_do_not_count(error):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(False, TimeoutError("timed out"))
+    for _ in range(3):
+        breaker.record(False, error)
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.stats()["failures"] == 1
@@ -0,0 +1,121 @@
+"""JobStore and JobWorkerPool against a temporary sqlite file."""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobStore, JobWorkerPool
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_enqueue_claim_complete(store):
+    job_id = store.enqueue({"client": 1})
+    assert store.get(job_id)["status"] == QUEUED
+
+    assert store.claim("worker-a") == (job_id, {"client": 1})
+    job = store.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["attempts"] == 1
+
+    store.complete(job_id, {"html_report": "<html></html>"}, 200)
+    job = store.get(job_id)
+    assert job["status"] == SUCCEEDED
+    assert job["http_status"] == 200
+    assert job["result"] == {"html_report": "<html></html>"}
+
+
+def test_running_job_is_not_claimed_twice(store):
+    store.enqueue({"client": 1})
+    assert store.claim("worker-a") is not None
+    assert store.claim("worker-b") is None
+
+
+def test_fail_requeues_until_max_attempts(store):
+    job_id = store.enqueue({"client": 1})
+    store.claim("worker-a")
+    store.fail(job_id, "provider timed out", max_attempts=2)
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["error"] == "provider timed out"
+
+    assert store.claim("worker-a") == (job_id, {"client": 1})
+    store.fail(job_id, "provider timed out", max_attempts=2)
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert store.claim("worker-a") is None
+
+
+def test_failed_job_waits_for_its_backoff(store):
+    job_id = store.enqueue({"client": 1})
+    store.claim("worker-a")
+    store.fail(job_id, "provider timed out", max_attempts=3, retry_backoff=60)
+    assert store.get(job_id)["status"] == QUEUED
+    assert store.claim("worker-a") is None
+
+    # a due job behind it is still served
+    other_id = store.enqueue({"client": 2})
+    assert store.claim("worker-a") == (other_id, {"client": 2})
+
+
+def test_requeue_stale_releases_expired_leases(store):
+    job_id = store.enqueue({"client": 1})
+    store.claim("worker-a")
+    assert store.requeue_stale(lease_seconds=600, max_attempts=3) == 0
+
+    time.sleep(0.01)
+    assert store.requeue_stale(lease_seconds=0, max_attempts=3) == 1
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["error"] == "lease expired"
+
+    store.claim("worker-a")
+    time.sleep(0.01)
+    assert store.requeue_stale(lease_seconds=0, max_attempts=2) == 1
+    assert store.get(job_id)["status"] == FAILED
+
+
+class LockedOnceStore(JobStore):
+    """Raises "database is locked" the first time a result is stored."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.locked = True
+
+    def complete(self, job_id, result, http_status):
+        if self.locked:
+            self.locked = False
+            raise sqlite3.OperationalError("database is locked")
+        super().complete(job_id, result, http_status)
+
+
+def test_worker_survives_sqlite_errors(tmp_path):
+    store = LockedOnceStore(str(tmp_path / "jobs.sqlite3"))
+    done = threading.Event()
+
+    def handler(payload):
+        if payload["client"] == 2:
+            done.set()
+        return {"client": payload["client"]}, 200
+
+    pool = JobWorkerPool(store, handler, num_workers=1, poll_interval=0.01)
+    pool.start()
+    try:
+        first_id = store.enqueue({"client": 1})
+        second_id = store.enqueue({"client": 2})
+        pool.notify()
+        assert done.wait(5)
+        deadline = time.monotonic() + 5
+        while store.get(second_id)["status"] != SUCCEEDED:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        pool.stop()
+    # its result was lost to the lock, so it stays running until its lease expires
+    assert store.get(first_id)["status"] == RUNNING
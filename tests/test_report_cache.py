@@ -0,0 +1,127 @@
+"""Report cache tiers, the bypass header and what complete_report stores."""
+
+import time
+
+import pytest
+
+from src.llm_interface import BaseAIProvider
+from src.report_cache import MemoryLRUTier, ReportCache, SQLiteTier
+from src.report_pipeline import complete_report, lookup_cached_report
+
+REPORT = (
+    "<!DOCTYPE html><html><head><title>Analysis</title></head>"
+    "<body><main><p>Claim at 70.</p></main></body></html>"
+)
+
+
+class FakeConfig:
+    llm_provider_name = "fake"
+    model = "main-model"
+    output_config = {}
+    validation_config = {"validator": "html5lib"}
+    context_config = {}
+    health_config = {}
+
+    def __init__(self, hedging_config=None):
+        self.hedging_config = hedging_config or {}
+
+    def get_api_key(self, llm_provider):
+        return "key"
+
+    def get_llm_config(self, llm_provider):
+        return {"model": self.model}
+
+
+class FakeProvider(BaseAIProvider):
+    """Answers at once on the hedge model and slowly on the main one."""
+
+    def _create_client(self):
+        return object()
+
+    def _send_request(self, messages):
+        if self.model == "main-model":
+            time.sleep(0.2)
+        return REPORT
+
+    def _stream_request(self, messages):
+        yield REPORT
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReportCache(
+        MemoryLRUTier(max_entries=8, ttl_seconds=60),
+        SQLiteTier(str(tmp_path / "cache.sqlite3"), ttl_seconds=60),
+    )
+
+
+def pending_report(cache_key="key") -> dict:
+    return {
+        "token_counts": {},
+        "cache_key": cache_key,
+        "cache_status": "miss",
+        "reuse_info": {"status": "disabled"},
+        "draft": None,
+        "vector": None,
+        "names": None,
+        "structured": False,
+    }
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    memory = MemoryLRUTier(max_entries=8, ttl_seconds=0.01)
+    disk = SQLiteTier(str(tmp_path / "cache.sqlite3"), ttl_seconds=0.01)
+    for tier in (memory, disk):
+        tier.set("key", {"html_report": REPORT})
+        assert tier.get("key") == {"html_report": REPORT}
+    time.sleep(0.02)
+    assert memory.get("key") is None
+    assert disk.get("key") is None
+
+
+def test_disk_hit_refills_the_memory_tier(cache):
+    cache.disk_tier.set("key", {"html_report": REPORT})
+    assert cache.get("key") == ({"html_report": REPORT}, "hit-disk")
+    assert cache.get("key") == ({"html_report": REPORT}, "hit-memory")
+
+
+@pytest.mark.parametrize(
+    "headers", [{"X-Cache-Bypass": "1"}, {"Cache-Control": "no-cache"}]
+)
+def test_bypass_header_skips_a_cached_report(cache, headers):
+    cache.set("key", {"html_report": REPORT})
+    assert lookup_cached_report(cache, "key", headers) == (None, "bypass")
+    assert lookup_cached_report(cache, "key", {})[1] == "hit-memory"
+    assert cache.stats()["bypasses"] == 1
+
+
+def test_report_from_the_configured_model_is_cached(cache):
+    llm = FakeProvider(FakeConfig())
+    analysis = llm.analyze("query", "context")
+    payload, status = complete_report(
+        pending_report(), analysis, llm, {}, FakeConfig(), cache
+    )
+    assert status == 200
+    assert cache.get("key")[0]["model"] == "main-model"
+
+
+def test_report_from_the_hedge_model_is_not_cached(cache):
+    config = FakeConfig(
+        {
+            "enabled": True,
+            "min_samples": 1,
+            "max_hedge_rate": 1.0,
+            "models": {"fake": "hedge-model"},
+        }
+    )
+    llm = FakeProvider(config)
+    llm.hedge_policy.record_latency(0.01)
+    analysis = llm.analyze("query", "context")
+    assert llm.served_by() == ("fake", "hedge-model")
+
+    payload, status = complete_report(
+        pending_report(), analysis, llm, {}, config, cache
+    )
+    assert status == 200
+    assert payload["model"] == "hedge-model"
+    assert cache.get("key") == (None, "miss")
@@ -0,0 +1,23 @@
+"""Building the LLM context for an export."""
+
+import json
+import logging
+
+from src.report_pipeline import build_report_context
+
+EXPORT = "src/client-exports/daniels_uphill.json"
+
+
+def test_extras_over_the_token_budget_leave_no_negative_budget(caplog):
+    with open(EXPORT, "r") as f:
+        user_data = json.load(f)
+    with caplog.at_level(logging.WARNING):
+        context, token_counts = build_report_context(
+            user_data, {"encoding": "compact", "token_budget": 300}
+        )
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("of the 300 token budget" in message for message in messages)
+    # the client data gets what is left of the budget, never less than nothing
+    assert any("over its 0 token budget" in message for message in messages)
+    assert "Computed Social Security figures" in context
+    assert token_counts["context_after"] < token_counts["context_before"]
@@ -0,0 +1,116 @@
+"""Reusing a stored report as a draft, and rejecting one that keeps its names."""
+
+import json
+import sqlite3
+
+import pytest
+
+from src.report_pipeline import process_report
+from src.report_reuse import (
+    ADAPT_REPORT_QUERY,
+    Draft,
+    ReportReuseIndex,
+    household_names,
+    leaked_names,
+    profile_features,
+)
+from src.roadmap_output_ingestor import parse_roadmap_output
+
+EXPORT = "src/client-exports/daniels_uphill.json"
+RENAMED = {"Daniels": "Okafor", "Uphill": "Lindqvist", "Steve": "Mara"}
+REPORT = (
+    "<!DOCTYPE html><html><head><title>Analysis</title></head>"
+    "<body><main><p>{names} should claim at 70.</p></main></body></html>"
+)
+
+
+class FakeConfig:
+    llm_provider_name = "fake"
+    model = "main-model"
+    output_config = {}
+    validation_config = {"validator": "html5lib"}
+    context_config = {"claiming_strategies": 0}
+
+
+class FakeLLM:
+    """Writes a report naming the given people, or echoes the draft when adapting."""
+
+    def __init__(self, names):
+        self.names = names
+        self.queries = []
+
+    def analyze(self, query, context, structured=False):
+        self.queries.append(query)
+        if query.startswith(ADAPT_REPORT_QUERY):
+            # a lazy adaptation that leaves the draft as it was
+            report = query[len(ADAPT_REPORT_QUERY) :]
+        else:
+            report = REPORT.format(names=" and ".join(self.names))
+        return report, len(query), len(report)
+
+    def served_by(self):
+        return "fake", "main-model"
+
+
+@pytest.fixture
+def exports():
+    with open(EXPORT, "r") as f:
+        text = f.read()
+    renamed = text
+    for old, new in RENAMED.items():
+        renamed = renamed.replace(old, new)
+    return json.loads(text), json.loads(renamed)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ReportReuseIndex(str(tmp_path / "reuse.sqlite3"), refresh_seconds=0)
+
+
+def test_names_are_stored_with_the_draft(index, exports):
+    roadmap = parse_roadmap_output(exports[0])
+    vector = profile_features(roadmap)
+    index.add(vector, "<html></html>", household_names(roadmap))
+    draft, distance = index.find(vector)
+    assert draft == Draft("<html></html>", ["Daniels", "Steve", "Uphill"])
+    assert distance == 0
+
+
+def test_rows_stored_before_names_are_still_found(tmp_path, exports):
+    path = str(tmp_path / "reuse.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE profiles ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, output_format TEXT NOT NULL, "
+            "vector BLOB NOT NULL, draft TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+    vector = profile_features(parse_roadmap_output(exports[0]))
+    index = ReportReuseIndex(path, refresh_seconds=0)
+    index.add(vector, "<html></html>")
+    assert index.find(vector)[0] == Draft("<html></html>", [])
+
+
+def test_shared_names_are_not_leaks():
+    draft = Draft("", ["Daniels", "Steve"])
+    assert leaked_names(draft, ["Steve", "Okafor"], "Steve and STEVEN") == []
+    assert leaked_names(draft, ["Steve", "Okafor"], "Mr. daniels, Steve") == ["daniels"]
+
+
+def test_adapted_report_naming_the_draft_household_is_regenerated(index, exports):
+    original, renamed = exports
+    first = FakeLLM(["Steve Daniels"])
+    payload, status = process_report(original, first, FakeConfig(), None, {}, index)
+    assert status == 200
+    assert payload["reuse"]["status"] == "miss"
+
+    llm = FakeLLM(["Mara Okafor"])
+    payload, status = process_report(renamed, llm, FakeConfig(), None, {}, index)
+    assert status == 200
+    assert len(llm.queries) == 2
+    assert llm.queries[0].startswith(ADAPT_REPORT_QUERY)
+    assert payload["reuse"]["status"] == "rejected"
+    assert "Daniels" not in payload["html_report"]
+    assert "Mara Okafor" in payload["html_report"]
+    assert index.stats()["rejected"] == 1
+    # the full generation is stored as a draft in its own right
+    assert index.stats()["stores"] == 2
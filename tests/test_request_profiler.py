@@ -0,0 +1,36 @@
+"""Profiling the thread work of an async request."""
+
+import asyncio
+
+from src.request_profiler import RequestProfiler
+
+
+def preprocess():
+    return sum(index * index for index in range(200_000))
+
+
+async def other_request():
+    for _ in range(20):
+        sum(index for index in range(20_000))
+        await asyncio.sleep(0)
+
+
+def test_only_calls_run_in_threads_are_profiled(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), top_n=50)
+
+    async def request(calls):
+        await asyncio.gather(asyncio.to_thread(calls.run, preprocess), other_request())
+        await asyncio.to_thread(calls.run, preprocess)
+
+    with profiler.profile_calls("inline") as calls:
+        asyncio.run(request(calls))
+
+    functions = [row["function"] for row in calls.result["hot_functions"]]
+    assert any("preprocess" in function for function in functions)
+    assert not any("other_request" in function for function in functions)
+    assert calls.calls == 2
+    assert calls.result["seconds"] > 0
+    # one request at a time: a second one isn't profiled while this one is
+    with profiler.profile_calls("inline"):
+        with profiler.profile_calls("inline") as second:
+            assert second is None
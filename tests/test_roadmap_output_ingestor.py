@@ -0,0 +1,65 @@
+"""Validation of the export fields the claiming optimizer does arithmetic on."""
+
+import copy
+import json
+from datetime import date, datetime
+
+import pytest
+
+from src.benefit_engine import MAX_CLAIM_MONTHS, MIN_CLAIM_MONTHS
+from src.claiming_optimizer import household_inputs
+from src.report_pipeline import score_exports
+from src.roadmap_output_ingestor import RoadmapValidationError, parse_roadmap_output
+
+# a married couple, so the optimizer uses both people's fields
+EXPORT = "src/client-exports/daniels_uphill.json"
+
+
+@pytest.fixture
+def raw_data():
+    with open(EXPORT, "r") as f:
+        return json.load(f)
+
+
+def test_benefits_start_date_is_parsed(raw_data):
+    ss_data = raw_data["data"]["SSCalData"]
+    ss_data["Spouse_IsCollectingBenefits"] = True
+    ss_data["Spouse_BenefitsStartDate"] = "2019-04-04T04:00:00"
+
+    roadmap = parse_roadmap_output(raw_data)
+    assert roadmap["primary"]["benefits_start_date"] is None
+    assert roadmap["spouse"]["benefits_start_date"] == datetime(2019, 4, 4, 4, 0)
+    # the claim month is fixed at the age the spouse started collecting
+    birth_date = roadmap["spouse"]["birth_date"]
+    claimed_at = (2019 - birth_date.year) * 12 + 4 - birth_date.month
+    claimed_at -= 4 < birth_date.day
+    claimed_at = min(max(claimed_at, MIN_CLAIM_MONTHS), MAX_CLAIM_MONTHS)
+    inputs = household_inputs(roadmap, as_of=date(2024, 1, 1))
+    assert inputs["claims_s"] == (claimed_at, claimed_at)
+
+
+@pytest.mark.parametrize(
+    "section, key, value",
+    [
+        ("ss", "Primary_LifeExpectancy", None),
+        ("ss", "Spouse_LifeExpectancy", "85"),
+        ("ss", "Spouse_BenefitsStartDate", "04/04/2019"),
+        ("settings", "COLA", None),
+        ("settings", "NominalRateOfReturn", "3.75"),
+    ],
+)
+def test_bad_optimizer_inputs_are_rejected(raw_data, section, key, value):
+    bad = copy.deepcopy(raw_data)
+    fields = {"ss": bad["data"]["SSCalData"], "settings": bad["data"]["Settings"]}
+    fields[section][key] = value
+
+    with pytest.raises(RoadmapValidationError) as excinfo:
+        parse_roadmap_output(bad)
+    assert len(excinfo.value.errors) == 1
+    assert key in excinfo.value.errors[0]
+
+    # one bad export in a portfolio fails on its own instead of failing the batch
+    results = score_exports([raw_data, bad])
+    assert results[0]["status"] == "success"
+    assert results[1]["status"] == "error"
+    assert results[1]["message"] == "Invalid roadmap export"
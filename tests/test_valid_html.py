@@ -0,0 +1,137 @@
+"""Parity of the single-pass validators with the html5lib one over damaged reports."""
+
+import random
+import re
+
+import pytest
+
+from src.valid_html import (
+    NotValidHTMLException,
+    StreamingHTMLValidator,
+    validate_llm_html,
+    validate_llm_html_fast,
+)
+
+SECTION = (
+    "<section><h2>{number}. Estimated Social Security Benefits</h2>"
+    "<p>At their full retirement age of 67 the estimated benefit is "
+    "<strong>$390.60</strong>, based on the "
+    '<a href="https://www.ssa.gov/oact/cola/piaformula.html">PIA formula</a>.</p>'
+    "<table><thead><tr><th>Claim age</th><th>Monthly benefit</th></tr></thead>"
+    "<tbody><tr><td>62</td><td>$1,260.00</td></tr>"
+    "<tr><td>67</td><td>$1,800.00</td></tr></tbody></table>"
+    "<ul><li><strong>Delay claiming:</strong> each year past FRA adds <em>8%</em>.</li>"
+    '<li>See <a href="https://www.ssa.gov/benefits/retirement/planner/delayret.html">'
+    "delayed credits</a>.</li></ul>"
+    '<img src="chart-{number}.png" alt="Benefit by claim age"></section>'
+)
+TAG_RE = re.compile(r"<(/?)([a-z0-9]+)([^>]*)>")
+
+
+def report(rng) -> str:
+    sections = "".join(
+        SECTION.format(number=number + 1) for number in range(rng.randint(1, 4))
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Analysis</title></head><body>"
+        "<header><h1>Social Security Analysis</h1></header><main>"
+        f"{sections}</main></body></html>"
+    )
+
+
+def mutate(html: str, rng) -> str:
+    """The report with one of the mistakes an LLM makes when writing HTML."""
+    tags = [
+        match
+        for match in TAG_RE.finditer(html)
+        if match.group(2) not in ("html", "head", "body")
+    ]
+    match = rng.choice(tags)
+    start, end = match.span()
+    is_end_tag = bool(match.group(1))
+    kind = rng.randrange(8)
+    if kind == 0 and is_end_tag:
+        return html[:start] + html[end:]
+    if kind == 1 and not is_end_tag:
+        return html[:end] + match.group() + html[end:]
+    if kind == 2 and not is_end_tag:
+        return html[:start] + html[end:]
+    if kind == 3:
+        name = rng.choice(["p", "span", "a", "li", "td", "strong", "div"])
+        return html[:start] + f"<{name}></{name}>" + html[start:]
+    if kind == 4:
+        name = rng.choice(["p", "a", "li", "td", "strong", "section", "ul"])
+        return html[:start] + f"</{name}>" + html[start:]
+    if kind == 5:
+        return html.replace(' alt="Benefit by claim age"', "", 1)
+    if kind == 6 and not is_end_tag:
+        name = rng.choice(["a", "p", "div", "em"])
+        return html[:start] + f"<{name}>" + html[end:]
+    # cut the text after this tag
+    next_tag = html.find("<", end)
+    return html[:end] + html[next_tag:] if next_tag != -1 else html
+
+
+def corpus(size: int, seed: int) -> list:
+    rng = random.Random(seed)
+    reports = []
+    for _ in range(size):
+        html = report(rng)
+        for _ in range(rng.randint(1, 3)):
+            html = mutate(html, rng)
+        reports.append(html)
+    return reports
+
+
+def result(validate, html: str):
+    try:
+        return validate(html)
+    except NotValidHTMLException as e:
+        return False, str(e)
+
+
+def stream(html: str, rng):
+    validator = StreamingHTMLValidator()
+    position = 0
+    while position < len(html):
+        size = rng.randint(1, 200)
+        validator.feed(html[position : position + size])
+        position += size
+    try:
+        return validator.close()
+    except NotValidHTMLException as e:
+        return False, str(e)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_fast_validator_matches_html5lib_on_damaged_reports(seed):
+    mismatches = [
+        (html, expected, actual)
+        for html in corpus(500, seed)
+        if (expected := result(validate_llm_html, html))
+        != (actual := result(validate_llm_html_fast, html))
+    ]
+    assert mismatches == []
+
+
+def test_streaming_validator_matches_fast_validator():
+    rng = random.Random(0)
+    for html in corpus(300, seed=3):
+        assert stream(html, rng) == result(validate_llm_html_fast, html)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        '<a class="x"><a class="x">\n',
+        '<p><a href="u">one <a href="v">two</a></p>',
+        "<a><main><section><p>text <a>link</a></p></section></main></a>",
+        "<a><div><div><p>text <a>link</a></p></div></div></a>",
+        "<em><div><p>text</em></p></div>",
+        "<table><tr><td><a>cell</td></tr></table><a>after</a>",
+        "</p><a></p></a>",
+    ],
+)
+def test_fast_validator_matches_html5lib_on_nested_formatting(body):
+    html = f"<html><body>{body}</body></html>"
+    assert result(validate_llm_html_fast, html) == result(validate_llm_html, html)